@@ -1,12 +1,27 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import joblib
-from pathlib import Path
 import os
 import warnings
-import base64
-from PIL import Image
+from contextlib import nullcontext
+
+from gembaguard.features import verificar_colunas_necessarias, montar_matriz_features
+from gembaguard.esquema import carregar_esquema
+from gembaguard.predicao import prever_probabilidade_target, prever_matriz, preencher_nulos, escalonar
+from gembaguard.deduplicacao import CacheResultados, chaves_leituras
+from gembaguard.aquecimento import EXEMPLO_DADOS, ESTADO as ESTADO_AQUECIMENTO
+from gembaguard.replica import carregar_artefatos as carregar_artefatos_replica, carregar_servico
+from gembaguard.explicacoes import explicar_predicoes, principais_contribuicoes
+from gembaguard.rastreamento import span, rastrear, iniciar_coleta, encerrar_coleta, spans_coletados
+from gembaguard.deriva import LIMITE_PSI_ALTO
+from gembaguard.alertas import top_alertas
+from gembaguard.registro import RegistroModelos
+from gembaguard.sombra import ComparadorSombra, carregar_artefatos, resumir_log
+from gembaguard.maquinas import fila_manutencao
+from gembaguard.exportacao import FORMATOS, montar_resultado, mascara_alertas, exportar_bytes
+from gembaguard.metricas import (
+    TEMPO_FEATURES, LATENCIA_PREDICAO, registrar_features_padrao, registrar_alertas, registrar_deduplicacao
+)
 
 warnings.filterwarnings('ignore')
 
@@ -18,6 +33,16 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- MODO DEBUG ---
+# Os controles ficam na sidebar, desenhada no fim do script; os valores vêm do session_state
+show_debug = st.session_state.get('modo_debug', False)
+k_alertas = st.session_state.get('k_alertas', 5)
+dedup_maquina = st.session_state.get('dedup_maquina', True)
+if show_debug:
+    iniciar_coleta()
+else:
+    encerrar_coleta()
+
 # --- CSS CUSTOMIZADO ---
 st.markdown("""
 <style>
@@ -162,21 +187,15 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- FUNÇÕES DE CARREGAMENTO E PREPARAÇÃO ---
+# Id da réplica no arquivo de prontidão: a porta do Streamlit, se não veio do ambiente
+os.environ.setdefault('GEMBAGUARD_REPLICA', str(st.get_option('server.port')))
+
 @st.cache_resource
+@rastrear('carregar_artefatos')
 def load_artifacts():
+    # Carga e warm-up uma vez por processo; com `python -m gembaguard.replica` já aconteceram na inicialização
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(script_dir, "3_modelos_treinados.pkl")
-        scaler_path = os.path.join(script_dir, "3_standard_scaler.pkl")
-
-        models_and_data = joblib.load(model_path)
-        scaler = joblib.load(scaler_path)
-        
-        models = models_and_data['modelos']
-        features = models_and_data['features']
-        targets = models_and_data['targets']
-
-        return models, scaler, features, targets
+        return carregar_artefatos_replica(os.path.dirname(os.path.abspath(__file__)))
     except FileNotFoundError:
         st.error("Erro: Arquivos de modelo não encontrados. Execute as etapas 1, 2 e 3.")
         return None, None, None, None
@@ -184,124 +203,59 @@ def load_artifacts():
         st.error(f"Erro ao carregar artefatos do modelo: {e}")
         return None, None, None, None
 
-def verificar_colunas_necessarias(df):
-    """Verifica quais colunas básicas estão disponíveis no dataset."""
-    colunas_basicas = [
-        'temperatura_ar', 'temperatura_processo', 'umidade_relativa', 
-        'velocidade_rotacional', 'torque', 'desgaste_da_ferramenta', 'tipo'
-    ]
-    
-    colunas_presentes = []
-    colunas_faltando = []
-    
-    for col in colunas_basicas:
-        if col in df.columns:
-            colunas_presentes.append(col)
-        else:
-            colunas_faltando.append(col)
-    
-    return colunas_presentes, colunas_faltando
+@st.cache_resource
+@rastrear('carregar_registro')
+def load_servico_modelos(caminho_registro):
+    """
+    Versão promovida do registro de modelos (GEMBAGUARD_REGISTRO). Uma thread
+    observa o registro e troca de versão em segundo plano, já aquecida.
+    """
+    return carregar_servico(caminho_registro, float(os.environ.get('GEMBAGUARD_REGISTRO_INTERVALO', '10')))
 
-def criar_features_avancadas_robusta(df):
-    """Versão robusta da criação de features que lida com colunas ausentes."""
-    print("--- INICIANDO ENGENHARIA DE FEATURES ROBUSTA ---")
-    df_features = df.copy()
-    
-    # Verificar colunas disponíveis
-    colunas_presentes, colunas_faltando = verificar_colunas_necessarias(df)
-    
-    if colunas_faltando:
-        print(f"⚠️ Colunas não encontradas: {colunas_faltando}")
-        st.warning(f"⚠️ Algumas colunas não foram encontradas: {', '.join(colunas_faltando)}")
-    
-    def divisao_segura(numerador, denominador, default=0.001):
-        denominador_safe = np.where(denominador == 0, default, denominador)
-        return numerador / denominador_safe
+@st.cache_resource
+@rastrear('carregar_sombra')
+def load_comparador_sombra(origem, caminho_registro, caminho_log):
+    """
+    Versão pontuada em sombra (GEMBAGUARD_SOMBRA): uma versão do registro ou,
+    sem registro, um diretório de artefatos. Pontua cada arquivo enviado em
+    uma thread própria e grava a comparação com a versão servida no log.
+    """
+    if caminho_registro:
+        versao = RegistroModelos(caminho_registro).carregar(origem)
+    else:
+        versao = carregar_artefatos(origem)
+    print(f"🌗 Versão '{versao['versao']}' em sombra (comparações em '{caminho_log}')")
+    return ComparadorSombra(versao, caminho_log=caminho_log, dtype=DTYPE_FEATURES)
 
-    try:
-        # Features que dependem de múltiplas colunas
-        if 'torque' in df_features.columns and 'velocidade_rotacional' in df_features.columns:
-            df_features['potencia_estimada'] = df_features['torque'] * df_features['velocidade_rotacional']
-            df_features['stress_mecanico'] = divisao_segura(df_features['torque'], df_features['velocidade_rotacional']) * 1000
-        
-        if 'temperatura_processo' in df_features.columns and 'temperatura_ar' in df_features.columns:
-            df_features['delta_temperatura'] = df_features['temperatura_processo'] - df_features['temperatura_ar']
-            
-            # Densidade de potência (se potência foi calculada)
-            if 'potencia_estimada' in df_features.columns:
-                df_features['densidade_potencia'] = divisao_segura(df_features['potencia_estimada'], df_features['temperatura_ar'])
-        
-        if 'desgaste_da_ferramenta' in df_features.columns:
-            df_features['fadiga_ferramenta'] = np.power(df_features['desgaste_da_ferramenta'] + 1, 1.2)
-            
-            if 'velocidade_rotacional' in df_features.columns:
-                df_features['taxa_desgaste'] = divisao_segura(df_features['desgaste_da_ferramenta'], df_features['velocidade_rotacional'])
-        
-        if 'delta_temperatura' in df_features.columns and 'umidade_relativa' in df_features.columns:
-            df_features['indice_calor'] = df_features['delta_temperatura'] * (1 + df_features['umidade_relativa'] / 100)
+@st.cache_resource
+def load_monitor_deriva():
+    """Referência de deriva salva no treino e um monitor acumulado por processo."""
+    import joblib
 
-        # Z-scores apenas para colunas que existem e se 'tipo' existe
-        if 'tipo' in df_features.columns:
-            features_base = ['temperatura_ar', 'temperatura_processo', 'umidade_relativa', 
-                           'velocidade_rotacional', 'torque', 'desgaste_da_ferramenta']
-            
-            zscore_cols = []
-            for feature in features_base:
-                if feature in df_features.columns:
-                    try:
-                        media_por_tipo = df_features.groupby('tipo')[feature].transform('mean')
-                        std_por_tipo = df_features.groupby('tipo')[feature].transform('std')
-                        std_por_tipo = np.where(std_por_tipo == 0, 1, std_por_tipo)
-                        zscore_col = f'{feature}_zscore'
-                        df_features[zscore_col] = ((df_features[feature] - media_por_tipo) / std_por_tipo)
-                        zscore_cols.append(zscore_col)
-                    except Exception as e:
-                        print(f"Erro ao calcular z-score para {feature}: {e}")
-            
-            # Índice de anomalia baseado nos z-scores calculados
-            if zscore_cols:
-                df_features['indice_anomalia'] = np.sqrt((df_features[zscore_cols] ** 2).sum(axis=1) / len(zscore_cols))
-        else:
-            st.warning("⚠️ Coluna 'tipo' não encontrada. Z-scores e índice de anomalia não serão calculados.")
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), "3_referencia_deriva.pkl")
+    if not os.path.exists(caminho):
+        return None, None
+    referencia = joblib.load(caminho)
+    return referencia, referencia.novo_monitor()
 
-        print(f"✅ Engenharia de features concluída. Total de colunas: {df_features.shape[1]}")
-        print(f"Novas features criadas: {df_features.shape[1] - df.shape[1]}")
-        
-    except Exception as e:
-        print(f"❌ Erro durante a engenharia de features: {e}")
-        st.error(f"Erro na engenharia de features: {e}")
-    
-    return df_features
+# GEMBAGUARD_FLOAT32=1: leitura, features e normalização em float32 (metade da memória por lote)
+MODO_FLOAT32 = os.environ.get('GEMBAGUARD_FLOAT32') == '1'
+DTYPE_FEATURES = np.float32 if MODO_FLOAT32 else np.float64
 
-def preencher_features_faltando(df, features_necessarias):
-    """Preenche features que não puderam ser criadas com valores padrão."""
-    df_completo = df.copy()
-    
-    for feature in features_necessarias:
-        if feature not in df_completo.columns:
-            # Valores padrão baseados no tipo da feature
-            if 'zscore' in feature:
-                df_completo[feature] = 0.0  # Z-score neutro
-            elif feature == 'indice_anomalia':
-                df_completo[feature] = 0.5  # Valor médio de anomalia
-            elif 'potencia' in feature:
-                df_completo[feature] = 1000.0  # Potência padrão
-            elif 'temperatura' in feature:
-                df_completo[feature] = 0.0  # Delta padrão
-            elif 'taxa' in feature or 'densidade' in feature:
-                df_completo[feature] = 1.0  # Razão padrão
-            elif 'fadiga' in feature:
-                df_completo[feature] = 1.0  # Fadiga mínima
-            elif 'stress' in feature:
-                df_completo[feature] = 100.0  # Stress padrão
-            elif 'indice_calor' in feature:
-                df_completo[feature] = 0.0  # Índice neutro
-            else:
-                df_completo[feature] = 0.0  # Valor padrão genérico
-            
-            st.warning(f"⚠️ Feature '{feature}' foi preenchida com valor padrão devido à ausência de dados necessários.")
-    
-    return df_completo
+@st.cache_resource
+def load_cache_resultados(versao):
+    """
+    Cache de resultados por versão de modelo (GEMBAGUARD_CACHE_RESULTADOS
+    linhas, padrão 100000; 0 desativa). O script roda de novo a cada
+    interação; com o mesmo arquivo, as leituras já pontuadas vêm do cache.
+    """
+    max_linhas = int(os.environ.get('GEMBAGUARD_CACHE_RESULTADOS', '100000'))
+    return CacheResultados(max_linhas) if max_linhas > 0 else None
+
+@st.cache_resource
+def load_esquema_entrada():
+    """Esquema de entrada (GEMBAGUARD_ESQUEMA_ENTRADA), compilado uma vez por processo."""
+    return carregar_esquema(os.environ.get('GEMBAGUARD_ESQUEMA_ENTRADA'))
 
 # --- CABEÇALHO PRINCIPAL COM IMAGEM ---
 st.markdown(
@@ -355,7 +309,36 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- CARREGAR ARTEFATOS E DEFINIR VARIÁVEIS ---
-models, scaler, features, targets = load_artifacts()
+servico_modelos = None
+if os.environ.get('GEMBAGUARD_REGISTRO'):
+    try:
+        servico_modelos = load_servico_modelos(os.environ['GEMBAGUARD_REGISTRO'])
+    except Exception as e:
+        st.error(f"Erro ao carregar a versão do registro de modelos: {e}")
+
+if servico_modelos is not None:
+    # A versão é lida uma vez por execução: uma troca a quente não afeta uma análise em andamento
+    versao_servida = servico_modelos.atual()
+    models, scaler, features, targets = (versao_servida[k] for k in ('modelos', 'scaler', 'features', 'targets'))
+    referencia_deriva, monitor_deriva = versao_servida['referencia'], versao_servida['monitor']
+elif os.environ.get('GEMBAGUARD_REGISTRO'):
+    models, scaler, features, targets = None, None, None, None
+    referencia_deriva, monitor_deriva = None, None
+else:
+    models, scaler, features, targets = load_artifacts()
+    referencia_deriva, monitor_deriva = load_monitor_deriva()
+
+# GEMBAGUARD_SOMBRA: versão candidata pontuando o mesmo tráfego sem afetar a resposta
+comparador_sombra = None
+if models and os.environ.get('GEMBAGUARD_SOMBRA'):
+    caminho_registro = os.environ.get('GEMBAGUARD_REGISTRO')
+    caminho_log_sombra = os.environ.get('GEMBAGUARD_SOMBRA_LOG') or os.path.join(
+        caminho_registro or os.path.dirname(os.path.abspath(__file__)), "sombra.jsonl"
+    )
+    try:
+        comparador_sombra = load_comparador_sombra(os.environ['GEMBAGUARD_SOMBRA'], caminho_registro, caminho_log_sombra)
+    except Exception as e:
+        st.warning(f"⚠️ Versão em sombra não carregada: {e}")
 
 if models:
     # --- SEÇÃO DE FEATURES ESPERADAS ---
@@ -391,20 +374,19 @@ if models:
     
     # Exemplo de formato esperado
     with st.expander("📋 **Exemplo de Formato de Dados**"):
-        exemplo_df = pd.DataFrame({
-            'temperatura_ar': [295.3, 298.1, 296.7],
-            'temperatura_processo': [308.6, 312.4, 310.1], 
-            'umidade_relativa': [38.4, 40.2, 39.1],
-            'velocidade_rotacional': [1551, 1602, 1578],
-            'torque': [42.8, 45.1, 43.9],
-            'desgaste_da_ferramenta': [108, 115, 112],
-            'tipo': ['M', 'M', 'H']
-        })
+        exemplo_df = pd.DataFrame(EXEMPLO_DADOS)
         st.dataframe(exemplo_df, use_container_width=True)
 
     if uploaded_file:
+        # O script roda de novo a cada interação (K, debug, formato, download) com o mesmo
+        # arquivo: métricas, deriva acumulada e sombra só contam a primeira execução de cada envio
+        envio = (uploaded_file.file_id, versao_servida['versao'] if servico_modelos is not None else None)
+        envio_novo = st.session_state.get('envio_registrado') != envio
+        st.session_state['envio_registrado'] = envio
         try:
-            df = pd.read_csv(uploaded_file)
+            with span('leitura_csv') as span_leitura:
+                df = load_esquema_entrada().ler_csv(uploaded_file, dtype_float=np.float32 if MODO_FLOAT32 else None)
+                span_leitura.definir(linhas=len(df))
             
             # Sucesso estilizado
             st.markdown(f"""
@@ -432,6 +414,11 @@ if models:
                     with cols_display[i % 4]:
                         st.markdown(f"• `{col}`")
 
+                mapeamento = df.attrs.get('mapeamento_entrada')
+                if mapeamento:
+                    st.markdown("**🔀 Colunas Mapeadas pelo Esquema de Entrada**")
+                    st.markdown("\n".join(f"• {linha}" for linha in mapeamento))
+
             # Verificar colunas disponíveis
             colunas_presentes, colunas_faltando = verificar_colunas_necessarias(df)
             
@@ -450,24 +437,49 @@ if models:
                 </div>
                 """, unsafe_allow_html=True)
 
+            # A sombra pontua o mesmo DataFrame em paralelo (ele não é alterado daqui em diante)
+            futuro_sombra = comparador_sombra.pontuar(df) if comparador_sombra is not None and envio_novo else None
+
             # Barra de progresso para o processamento
             progress_bar = st.progress(0)
             status_text = st.empty()
             
-            # 1. Feature Engineering
+            # 1. Feature Engineering: features e valores padrão escritos direto
+            # na matriz do modelo (o DataFrame enviado não é copiado)
             status_text.text("🔧 Aplicando engenharia de features...")
             progress_bar.progress(25)
-            df_with_features = criar_features_avancadas_robusta(df.copy())
+            try:
+                with span('montar_matriz_features', linhas=len(df)), TEMPO_FEATURES.medir() if envio_novo else nullcontext():
+                    X, features_padrao = montar_matriz_features(
+                        df, features, avisar=st.warning, erro=st.error, dtype=DTYPE_FEATURES
+                    )
+            except (ValueError, TypeError) as e:
+                st.markdown(f"""
+                <div class="custom-error">
+                    <strong>❌ Erro na leitura das colunas numéricas:</strong> {e}
+                </div>
+                """, unsafe_allow_html=True)
+                st.stop()
+            if envio_novo:
+                registrar_features_padrao(features, features_padrao)
+            df_features = pd.DataFrame(X, columns=features, index=df.index, copy=False)
             
-            # 2. Preenchimento de dados
-            status_text.text("📊 Preenchendo dados faltantes...")
+            # 2. Deriva: compara o lote (já com os valores padrão injetados) com a referência de treino
+            status_text.text("📊 Comparando com os dados de treino...")
             progress_bar.progress(50)
-            df_completo = preencher_features_faltando(df_with_features, features)
+            relatorio_deriva = None
+            if referencia_deriva is not None:
+                with span('monitor_deriva', linhas=len(df_features)):
+                    monitor_lote = referencia_deriva.novo_monitor()
+                    monitor_lote.atualizar(df_features, df.get(referencia_deriva.coluna_grupo))
+                    if envio_novo:
+                        monitor_deriva.atualizar(df_features, df.get(referencia_deriva.coluna_grupo))
+                    relatorio_deriva = monitor_lote.comparar(referencia_deriva)
             
-            # 3. Verificação final
+            # 3. Verificação final: uma feature sem nenhum valor não tem média para preencher
             status_text.text("🔍 Verificando compatibilidade...")
             progress_bar.progress(75)
-            features_ainda_faltando = [f for f in features if f not in df_completo.columns]
+            features_ainda_faltando = [f for f, vazia in zip(features, np.isnan(X).all(axis=0)) if vazia]
             
             if features_ainda_faltando:
                 st.markdown(f"""
@@ -482,23 +494,18 @@ if models:
                 status_text.text("🤖 Gerando predições...")
                 progress_bar.progress(90)
                 
-                df_to_predict = df_completo[features]
-                
-                # Verificar valores nulos
-                if df_to_predict.isnull().any().any():
+                # Verificar valores nulos (preenchidos com a média, na própria matriz)
+                if preencher_nulos(X):
                     st.markdown("""
                     <div class="custom-warning">
-                        <strong>🔧 Valores nulos detectados.</strong> Preenchendo automaticamente...
+                        <strong>🔧 Valores nulos detectados.</strong> Preenchidos automaticamente.
                     </div>
                     """, unsafe_allow_html=True)
-                    df_to_predict = df_to_predict.fillna(df_to_predict.mean())
                 
-                # Escalar dados
+                # Escalar dados (no mesmo buffer; df_features deixa de valer a partir daqui)
                 try:
-                    df_scaled = pd.DataFrame(
-                        scaler.transform(df_to_predict),
-                        columns=df_to_predict.columns
-                    )
+                    with span('escalonamento', linhas=len(X)):
+                        df_scaled = pd.DataFrame(escalonar(scaler, X), columns=features, copy=False)
                 except Exception as e:
                     st.markdown(f"""
                     <div class="custom-error">
@@ -507,19 +514,62 @@ if models:
                     """, unsafe_allow_html=True)
                     st.stop()
 
-                # Fazer predições
-                predictions = {}
-                for target, model in models.items():
+                # Fazer predições: cada leitura repetida no lote passa uma vez pelos
+                # modelos e as já pontuadas em execuções anteriores vêm do cache
+                def prever_target(target, model, X_unicas, cache_multilabel):
                     try:
-                        if hasattr(model, 'predict_proba'):
-                            predictions[target] = model.predict_proba(df_scaled)[:, 1]
-                        else:
-                            predictions[target] = model.predict(df_scaled)
+                        medir_latencia = LATENCIA_PREDICAO.medir(target=target) if envio_novo else nullcontext()
+                        with span('predict_proba', target=target, linhas=len(X_unicas)), medir_latencia:
+                            return prever_probabilidade_target(model, X_unicas, cache_multilabel)
                     except Exception as e:
                         st.error(f"Erro na predição para {target}: {e}")
-                        predictions[target] = np.zeros(len(df))
-                
-                df_predictions = pd.DataFrame(predictions, index=df.index)
+                        return None  # zeros no resultado, e o lote não vai para o cache
+
+                cache_resultados = load_cache_resultados(
+                    versao_servida['versao'] if servico_modelos is not None else 'artefatos'
+                )
+                estatisticas_predicao = {}
+                with span('deduplicacao', linhas=len(df)):
+                    chaves = chaves_leituras(df, features)
+                predicoes = prever_matriz(
+                    df_scaled.to_numpy(), models, features, chaves=chaves, cache=cache_resultados,
+                    estatisticas=estatisticas_predicao, prever=prever_target
+                )
+                if envio_novo:
+                    registrar_deduplicacao(estatisticas_predicao)
+                if show_debug:
+                    st.caption(f"🔁 {estatisticas_predicao['unicas']:,} leituras únicas em {estatisticas_predicao['linhas']:,} linhas • "
+                               f"{estatisticas_predicao['do_cache']:,} respondidas pelo cache")
+
+                df_predictions = pd.DataFrame(predicoes, columns=list(models), index=df.index)
+                if envio_novo:
+                    registrar_alertas(df_predictions)
+                if futuro_sombra is not None:
+                    # Não espera a sombra: o registro é gravado quando ela terminar
+                    comparador_sombra.comparar(
+                        futuro_sombra, df_predictions, lote=uploaded_file.name,
+                        versao_primaria=versao_servida['versao'] if servico_modelos is not None else None
+                    )
+
+                # Explicações (principais fatores) apenas para as linhas em alerta
+                status_text.text("🔍 Explicando alertas...")
+                explicacoes = {}
+                for target, model in models.items():
+                    mascara_alerta = df_predictions[target].to_numpy() > 0.5
+                    if not mascara_alerta.any():
+                        continue
+                    try:
+                        with span('explicacoes', target=target, linhas=int(mascara_alerta.sum())):
+                            resultado = explicar_predicoes(model, df_scaled.to_numpy()[mascara_alerta])
+                    except Exception as e:
+                        st.warning(f"⚠️ Não foi possível explicar os alertas de {target}: {e}")
+                        continue
+                    if resultado is not None:
+                        _, contribuicoes = resultado
+                        explicacoes[target] = pd.Series(
+                            principais_contribuicoes(contribuicoes, features),
+                            index=df.index[mascara_alerta]
+                        )
                 
                 # Finalizar progresso
                 progress_bar.progress(100)
@@ -594,102 +644,152 @@ if models:
                 
                 st.bar_chart(chart_data, use_container_width=True)
 
-                # Alertas críticos
-                alertas_criticos = []
-                for target in targets:
-                    indices_alta_prob = df_predictions[df_predictions[target] > 0.7].index
-                    if len(indices_alta_prob) > 0:
-                        alertas_criticos.extend([(idx, target, df_predictions.loc[idx, target]) for idx in indices_alta_prob])
+                # Alertas críticos: os K mais graves entre todos os targets (um por máquina, se configurado)
+                ids_maquina = df['id_produto'] if dedup_maquina and 'id_produto' in df.columns else None
+                alertas_criticos = top_alertas(df_predictions[targets], k=k_alertas, limite=0.7, ids_maquina=ids_maquina)
                 
-                if alertas_criticos:
+                if len(alertas_criticos) > 0:
                     st.markdown("### 🚨 **Alertas Críticos (>70% probabilidade)**")
-                    for idx, target, prob in alertas_criticos[:5]:  # Mostrar apenas os 5 primeiros
+                    for idx, target, prob, id_produto in alertas_criticos.itertuples(index=False):
+                        fatores = explicacoes[target].get(idx, '') if target in explicacoes else ''
+                        linha_fatores = f"<br>🔍 Principais fatores: {fatores}" if fatores else ""
+                        maquina = f" • Máquina <strong>{id_produto}</strong>" if id_produto is not None else ""
                         st.markdown(f"""
                         <div class="custom-error">
                             <strong>⚠️ ATENÇÃO IMEDIATA:</strong> 
-                            Amostra #{idx} • <strong>{target.replace('_', ' ').title()}</strong> • 
-                            Probabilidade: <strong>{prob:.1%}</strong>
+                            Amostra #{idx}{maquina} • <strong>{target.replace('_', ' ').title()}</strong> • 
+                            Probabilidade: <strong>{prob:.1%}</strong>{linha_fatores}
                         </div>
                         """, unsafe_allow_html=True)
 
+                # Fila de manutenção: risco agregado por máquina
+                fila_maquinas = None
+                if 'id_produto' in df.columns:
+                    with span('fila_manutencao', linhas=len(df)):
+                        fila_maquinas = fila_manutencao(df, df_predictions[targets])
+                    st.markdown("### 🛠️ **Fila de Manutenção por Máquina**")
+                    st.caption(f"{len(fila_maquinas):,} máquinas • ordenadas pela maior probabilidade de falha, "
+                               f"depois pelo número de leituras em alerta e pelo desgaste atual")
+                    colunas_fila = ['prioridade', 'id_produto', 'tipo', 'risco', 'falha_provavel', 'alertas', 'leituras', 'desgaste_atual']
+                    st.dataframe(
+                        fila_maquinas[colunas_fila].head(20).style.format({'risco': '{:.1%}', 'desgaste_atual': '{:.0f}'}),
+                        use_container_width=True, hide_index=True
+                    )
+
+                # Deriva dos dados em relação ao treino
+                if relatorio_deriva is not None and len(relatorio_deriva) > 0:
+                    deriva_alta = relatorio_deriva[relatorio_deriva['deriva'] == 'alta']
+                    titulo_deriva = (f"📉 **Monitor de Deriva** • ⚠️ {deriva_alta['feature'].nunique()} feature(s) com deriva alta"
+                                     if len(deriva_alta) else "📉 **Monitor de Deriva** • ✅ distribuições estáveis")
+                    with st.expander(titulo_deriva):
+                        st.caption(f"PSI ≥ {LIMITE_PSI_ALTO} indica deriva alta em relação aos dados de treino. "
+                                   f"Features preenchidas com valores padrão aparecem aqui como deriva.")
+                        st.dataframe(
+                            relatorio_deriva.head(20).style.format({'psi': '{:.3f}', 'ks': '{:.3f}', 'nulos_pct': '{:.1f}%'}),
+                            use_container_width=True, hide_index=True
+                        )
+                        relatorio_acumulado = monitor_deriva.comparar(referencia_deriva)
+                        st.caption(f"Acumulado desde o início do processo: {monitor_deriva.linhas:,} linhas • "
+                                   f"{int((relatorio_acumulado['deriva'] == 'alta').sum())} combinação(ões) (tipo, feature) com deriva alta")
+
                 # Tabela de resultados estilizada
                 st.markdown("### 📋 **Relatório Detalhado**")
                 
-                df_results = df.copy()
-                for target in targets:
-                    df_results[f'🎯 Prob_{target}'] = df_predictions[target].apply(lambda x: f"{x:.1%}")
-                    df_results[f'🚨 Alert_{target}'] = df_predictions[target].apply(
-                        lambda x: "🚨 ALERTA" if x > 0.5 else "✅ OK"
-                    )
-                
                 # Selecionar colunas importantes para exibição
                 cols_to_display = []
-                if 'id' in df_results.columns:
+                if 'id' in df.columns:
                     cols_to_display.append('id')
-                if 'id_produto' in df_results.columns:
+                if 'id_produto' in df.columns:
                     cols_to_display.append('id_produto')
                 
                 # Colunas técnicas importantes
                 important_cols = ['tipo', 'temperatura_processo', 'torque', 'desgaste_da_ferramenta']
                 for col in important_cols:
-                    if col in df_results.columns and col not in cols_to_display:
+                    if col in df.columns and col not in cols_to_display:
                         cols_to_display.append(col)
                 
-                # Adicionar colunas de análise
+                # Colunas de análise: valores brutos (float/bool); o texto só existe na renderização
+                colunas_analise = {}
                 for target in targets:
-                    cols_to_display.extend([f'🎯 Prob_{target}', f'🚨 Alert_{target}'])
+                    colunas_analise[f'🎯 Prob_{target}'] = df_predictions[target]
+                    colunas_analise[f'🚨 Alert_{target}'] = df_predictions[target] > 0.5
+                df_results = pd.concat([df[cols_to_display], pd.DataFrame(colunas_analise)], axis=1)
+                colunas_prob = [col for col in colunas_analise if col.startswith('🎯 Prob_')]
+                colunas_alerta = [col for col in colunas_analise if col.startswith('🚨 Alert_')]
                 
-                # Destacar linhas com alertas
-                def highlight_alerts(row):
-                    colors = []
-                    for col in row.index:
-                        if '🚨 Alert_' in col and row[col] == "🚨 ALERTA":
-                            colors.append('background-color: #fee2e2; font-weight: bold;')
-                        elif '🚨 Alert_' in col and row[col] == "✅ OK":
-                            colors.append('background-color: #dcfce7;')
-                        else:
-                            colors.append('')
-                    return colors
+                # Destacar alertas
+                def highlight_alerts(alerta):
+                    return 'background-color: #fee2e2; font-weight: bold;' if alerta else 'background-color: #dcfce7;'
                 
                 st.dataframe(
-                    df_results[cols_to_display].style.apply(highlight_alerts, axis=1),
+                    df_results.style
+                        .format('{:.1%}', subset=colunas_prob)
+                        .format(lambda alerta: "🚨 ALERTA" if alerta else "✅ OK", subset=colunas_alerta)
+                        .map(highlight_alerts, subset=colunas_alerta),
                     use_container_width=True,
                     height=400
                 )
 
                 # Seção de download e ações
                 st.markdown("### 💾 **Exportar Resultados**")
+
+                # Exportação com valores brutos (probabilidade float32, alerta booleano);
+                # a formatação em texto fica apenas na tabela acima
+                nomes_formatos = {'parquet': 'Parquet', 'csv': 'CSV', 'csv.gz': 'CSV (gzip)', 'csv.zst': 'CSV (zstd)'}
+                formato_exportacao = st.selectbox(
+                    "Formato do arquivo", list(FORMATOS), format_func=nomes_formatos.get, key='formato_exportacao'
+                )
+                df_exportacao = montar_resultado(
+                    df, df_predictions,
+                    extras={f'fatores_{target}': explicacoes[target].reindex(df.index).fillna('') for target in explicacoes}
+                )
+                nome_base = os.path.splitext(uploaded_file.name)[0]
                 
-                col1, col2, col3 = st.columns(3)
+                col1, col2, col3, col4 = st.columns(4)
                 
                 with col1:
-                    # CSV completo
-                    csv = df_results.to_csv(index=False)
+                    # Resultado completo
+                    with span('exportacao_completa', linhas=len(df_exportacao), formato=formato_exportacao):
+                        dados_completos, extensao, mime = exportar_bytes(df_exportacao, formato_exportacao)
                     st.download_button(
-                        label="📥 Download CSV Completo",
-                        data=csv,
-                        file_name=f"analise_preditiva_{uploaded_file.name}",
-                        mime="text/csv",
+                        label="📥 Download Completo",
+                        data=dados_completos,
+                        file_name=f"analise_preditiva_{nome_base}{extensao}",
+                        mime=mime,
                         use_container_width=True
                     )
                 
                 with col2:
                     # Apenas alertas
-                    df_alertas = df_results[df_results[[col for col in df_results.columns if '🚨 Alert_' in col]].apply(
-                        lambda row: any("ALERTA" in str(val) for val in row), axis=1
-                    )]
+                    df_alertas = df_exportacao[mascara_alertas(df_exportacao)]
                     if len(df_alertas) > 0:
-                        csv_alertas = df_alertas.to_csv(index=False)
+                        with span('exportacao_alertas', linhas=len(df_alertas), formato=formato_exportacao):
+                            dados_alertas, extensao, mime = exportar_bytes(df_alertas, formato_exportacao)
                         st.download_button(
                             label="🚨 Download Apenas Alertas",
-                            data=csv_alertas,
-                            file_name=f"alertas_{uploaded_file.name}",
-                            mime="text/csv",
+                            data=dados_alertas,
+                            file_name=f"alertas_{nome_base}{extensao}",
+                            mime=mime,
                             use_container_width=True
                         )
                     else:
                         st.info("Nenhum alerta para exportar")
                 
+                with col4:
+                    # Fila de manutenção por máquina
+                    if fila_maquinas is not None:
+                        with span('exportacao_fila', linhas=len(fila_maquinas), formato=formato_exportacao):
+                            dados_fila, extensao, mime = exportar_bytes(fila_maquinas, formato_exportacao)
+                        st.download_button(
+                            label="🛠️ Download Fila por Máquina",
+                            data=dados_fila,
+                            file_name=f"fila_manutencao_{nome_base}{extensao}",
+                            mime=mime,
+                            use_container_width=True
+                        )
+                    else:
+                        st.info("Sem coluna id_produto para agrupar por máquina")
+                
                 with col3:
                     # Relatório resumido
                     resumo = f"""
@@ -823,9 +923,46 @@ with st.sidebar:
         threshold = st.slider("Limite de Alerta", 0.0, 1.0, 0.5, 0.05)
         st.caption(f"Atual: {threshold:.0%} - Probabilidades acima deste valor geram alertas")
         
-        show_debug = st.checkbox("Modo Debug", value=False)
+        st.number_input("Alertas críticos exibidos", min_value=1, max_value=50, value=5, key='k_alertas')
+        st.checkbox("Um alerta crítico por máquina (id_produto)", value=True, key='dedup_maquina')
+        show_debug = st.checkbox("Modo Debug", value=False, key='modo_debug')
         st.caption("Exibe informações técnicas detalhadas")
 
+        if ESTADO_AQUECIMENTO['pronto']:
+            st.caption(f"🟢 Modelo pronto • latência fria {ESTADO_AQUECIMENTO['latencia_fria_ms']:.0f} ms, "
+                       f"quente {ESTADO_AQUECIMENTO['latencia_quente_ms']:.0f} ms")
+        else:
+            st.caption("🔴 Modelo não aquecido")
+
+        if servico_modelos is not None:
+            st.caption(f"📦 Versão servida: `{versao_servida['versao']}`")
+            if st.button("↩️ Reverter para a versão anterior"):
+                try:
+                    st.success(f"Revertido para `{servico_modelos.reverter()}`. Vale a partir da próxima análise.")
+                except ValueError as e:
+                    st.warning(str(e))
+
+        if comparador_sombra is not None:
+            st.caption(f"🌗 Em sombra: `{comparador_sombra.sombra['versao']}`")
+
+    if show_debug:
+        st.markdown("### 🐞 **Tempos por Etapa**")
+        spans = spans_coletados()
+        if spans:
+            df_spans = pd.DataFrame(spans)
+            colunas_spans = [c for c in ['span', 'target', 'duracao_ms', 'linhas', 'delta_rss_mb', 'erro'] if c in df_spans.columns]
+            st.dataframe(df_spans[colunas_spans], use_container_width=True, hide_index=True)
+            st.caption(f"Total: {df_spans['duracao_ms'].sum():.0f} ms • os spans também são emitidos como JSON no stderr")
+        else:
+            st.caption("Carregue um arquivo para ver os tempos de cada etapa.")
+
+        if comparador_sombra is not None and os.path.exists(comparador_sombra.caminho_log):
+            st.markdown("### 🌗 **Comparação em Sombra**")
+            resumo_sombra = resumir_log(comparador_sombra.caminho_log)
+            if len(resumo_sombra):
+                st.dataframe(resumo_sombra, use_container_width=True, hide_index=True)
+                st.caption(f"Acumulado em '{comparador_sombra.caminho_log}' • `python -m gembaguard.sombra` gera o mesmo resumo")
+
 # --- FOOTER ESTILIZADO COM SEU LOGO ---
 st.markdown("<br><br>", unsafe_allow_html=True)
 st.markdown("""
@@ -0,0 +1,91 @@
+"""
+Gerador de dados sintéticos com o schema de `data/bootcamp_train.csv`.
+
+As distribuições imitam o dataset real: leituras quantizadas (temperaturas
+e torque com uma casa decimal, velocidade e desgaste inteiros, umidade quase
+sempre 90.0), ~2% de valores ausentes, ~9% de valores sentinela negativos
+(ex.: temperatura_ar = -36) e falhas raras com rótulos em texto.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+COLUNAS_FALHA = {
+    'FDF (Falha Desgaste Ferramenta)': 0.002,
+    'FDC (Falha Dissipacao Calor)': 0.006,
+    'FP (Falha Potencia)': 0.0035,
+    'FTE (Falha Tensao Excessiva)': 0.005,
+    'FA (Falha Aleatoria)': 0.002,
+}
+
+# coluna: (média, desvio, casas decimais, valor sentinela)
+SENSORES = {
+    'temperatura_ar': (300.0, 2.0, 1, -36.0),
+    'temperatura_processo': (310.0, 1.5, 1, -38.0),
+    'velocidade_rotacional': (1520.0, 170.0, 0, -161.0),
+    'torque': (40.0, 9.5, 1, None),
+    'desgaste_da_ferramenta': (105.0, 62.0, 0, -202.0),
+}
+
+
+def gerar_frota(n_maquinas, seed=42):
+    """Sorteia o tipo e o número de cada máquina (id_produto = tipo + número)."""
+    rng = np.random.default_rng(seed)
+    tipos_maquina = rng.choice(np.array(['L', 'M', 'H']), size=n_maquinas, p=[0.68, 0.25, 0.07])
+    numeros_maquina = rng.choice(np.arange(10_000, 100_000), size=n_maquinas, replace=False)
+    return tipos_maquina, numeros_maquina
+
+
+def gerar_dados(n_linhas, seed=42, n_maquinas=None, id_inicial=0, seed_frota=None):
+    """Gera um DataFrame com `n_linhas` leituras no formato do CSV de treino."""
+    rng = np.random.default_rng(seed)
+    n_maquinas = n_maquinas or max(10, min(50_000, n_linhas // 4))
+    tipos_maquina, numeros_maquina = gerar_frota(n_maquinas, seed if seed_frota is None else seed_frota)
+
+    maquina = rng.integers(0, n_maquinas, size=n_linhas)
+    tipo = tipos_maquina[maquina]
+
+    df = pd.DataFrame({
+        'id': np.arange(id_inicial, id_inicial + n_linhas),
+        'id_produto': pd.Series(tipo).str.cat(numeros_maquina[maquina].astype(str)),
+        'tipo': tipo,
+    })
+
+    for coluna, (media, desvio, casas, sentinela) in SENSORES.items():
+        valores = rng.normal(media, desvio, size=n_linhas)
+        if coluna == 'desgaste_da_ferramenta':
+            valores = np.clip(valores, 0, 253)
+        valores = np.round(valores, casas)
+        if sentinela is not None:
+            valores[rng.random(n_linhas) < 0.09] = sentinela
+        valores[rng.random(n_linhas) < 0.02] = np.nan
+        df[coluna] = valores
+
+    umidade = np.full(n_linhas, 90.0)
+    outliers = rng.random(n_linhas) < 0.001
+    umidade[outliers] = rng.uniform(80, 95, size=outliers.sum())
+    df.insert(5, 'umidade_relativa', umidade)
+
+    falha_qualquer = np.zeros(n_linhas, dtype=bool)
+    for coluna, taxa in COLUNAS_FALHA.items():
+        falhas = rng.random(n_linhas) < taxa
+        falha_qualquer |= falhas
+        df[coluna] = np.where(falhas, 'True', 'False')
+    df.insert(9, 'falha_maquina', np.where(falha_qualquer, 'Sim', 'Não'))
+    return df
+
+
+def gerar_csv(caminho, n_linhas, seed=42, tamanho_bloco=1_000_000):
+    """Escreve o CSV em blocos, para gerar 10M+ linhas sem manter tudo em memória."""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    n_maquinas = max(10, min(50_000, n_linhas // 4))
+    for i, inicio in enumerate(range(0, n_linhas, tamanho_bloco)):
+        bloco = gerar_dados(
+            min(tamanho_bloco, n_linhas - inicio), seed=seed + i, n_maquinas=n_maquinas,
+            id_inicial=inicio, seed_frota=seed
+        )
+        bloco.to_csv(caminho, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    return caminho
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Ganho da deduplicação de leituras e do cache de resultados.
+
+Para cada CSV (padrão: as exportações em `data/`), pontua o arquivo com os
+mesmos artefatos de três formas: sem deduplicação, com deduplicação (cada
+leitura repetida no lote passa uma vez pelos modelos) e uma segunda vez com
+o cache de resultados já preenchido pela primeira (o que acontece no app a
+cada interação com o mesmo arquivo). Reporta a fração de leituras únicas,
+os tempos (melhor de `--repeticoes`) e o speedup. As probabilidades têm
+que ser idênticas nos três caminhos.
+
+    python benchmarks/deduplicacao.py
+    python benchmarks/deduplicacao.py --csv turnos/*.csv --artefatos notebooks
+
+Sai com código 1 se alguma probabilidade mudar.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from gembaguard.deduplicacao import CacheResultados  # noqa: E402
+from gembaguard.esquema import carregar_esquema  # noqa: E402
+from gembaguard.predicao import pontuar_dataframe  # noqa: E402
+
+
+def cronometrar(df, bundle, scaler, repeticoes, **kwargs):
+    """Melhor tempo de `pontuar_dataframe`. Retorna (probabilidades, segundos, estatísticas)."""
+    melhor = None
+    for _ in range(repeticoes):
+        estatisticas = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            probabilidades = pontuar_dataframe(df, bundle['modelos'], scaler, bundle['features'],
+                                               avisar=lambda *_: None, estatisticas=estatisticas, **kwargs)
+            segundos = time.perf_counter() - inicio
+        melhor = segundos if melhor is None else min(melhor, segundos)
+    return probabilidades, melhor, estatisticas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicação de leituras e cache de resultados: proporção e speedup.")
+    parser.add_argument('--csv', nargs='+', type=Path,
+                        default=[RAIZ / 'data' / 'bootcamp_test.csv', RAIZ / 'data' / 'bootcamp_train.csv'])
+    parser.add_argument('--artefatos', type=Path, default=RAIZ,
+                        help="Diretório com 3_modelos_treinados.pkl e 3_standard_scaler.pkl.")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    import joblib
+
+    print("--- DEDUPLICAÇÃO DE LEITURAS ---")
+    bundle = joblib.load(args.artefatos / '3_modelos_treinados.pkl')
+    scaler = joblib.load(args.artefatos / '3_standard_scaler.pkl')
+    esquema = carregar_esquema()
+
+    linhas, divergentes = [], []
+    for caminho in args.csv:
+        df = esquema.ler_csv(caminho)
+        cronometrar(df, bundle, scaler, 1)  # aquecimento: a primeira medição não paga as cargas preguiçosas
+        base, s_base, _ = cronometrar(df, bundle, scaler, args.repeticoes, deduplicar=False)
+        dedup, s_dedup, estatisticas = cronometrar(df, bundle, scaler, args.repeticoes)
+        cache = CacheResultados(max(len(df), 1))
+        cronometrar(df, bundle, scaler, 1, cache=cache)
+        repetido, s_cache, estatisticas_cache = cronometrar(df, bundle, scaler, args.repeticoes, cache=cache)
+
+        for nome, probabilidades in [('deduplicação', dedup), ('cache', repetido)]:
+            if not np.array_equal(base.to_numpy(), probabilidades.to_numpy()):
+                divergentes.append(f"{caminho.name} ({nome})")
+        linhas.append({
+            'arquivo': caminho.name,
+            'linhas': len(df),
+            'unicas': estatisticas['unicas'],
+            'frac_unicas': estatisticas['unicas'] / max(len(df), 1),
+            's_sem_dedup': s_base,
+            's_dedup': s_dedup,
+            'speedup_dedup': s_base / s_dedup,
+            'do_cache': estatisticas_cache['do_cache'],
+            's_com_cache': s_cache,
+            'speedup_cache': s_base / s_cache,
+        })
+
+    print(pd.DataFrame(linhas).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    if divergentes:
+        print(f"\n❌ Probabilidades diferentes do caminho sem deduplicação em: {', '.join(divergentes)}")
+        sys.exit(1)
+    print("\n✅ Probabilidades idênticas com e sem deduplicação/cache.")
+
+
+if __name__ == "__main__":
+    main()
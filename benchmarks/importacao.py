@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Mede o tempo de importação (cold start) do app e de cada etapa do pipeline
+com `python -X importtime`.
+
+Cada alvo roda em um processo novo. Os scripts do pipeline são carregados
+com runpy sem `__name__ == "__main__"`, então apenas os imports e as
+definições de função são executados. O app é executado por inteiro em modo
+"bare" do Streamlit, o que inclui o carregamento e o warm-up do modelo
+quando os artefatos estão presentes.
+
+    python benchmarks/importacao.py
+    python benchmarks/importacao.py --orcamento benchmarks/orcamento_importacao.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+ALVOS = {
+    'app': RAIZ / 'app.py',
+    '1_entendimento': RAIZ / 'notebooks' / '1_entendimento.py',
+    '2_preparacao': RAIZ / 'notebooks' / '2_preparacao.py',
+    '3_modelagem': RAIZ / 'notebooks' / '3_modelagem.py',
+    '4_avaliacao': RAIZ / 'notebooks' / '4_avaliacao.py',
+    '5_deploy': RAIZ / 'notebooks' / '5_deploy.py',
+}
+
+
+def medir_importacao(caminho):
+    """Roda o alvo com -X importtime e retorna (tempo total de import em ms, módulos mais pesados, wall em ms)."""
+    codigo = f"import runpy; runpy.run_path({str(caminho)!r}, run_name='importtime')"
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONWARNINGS='ignore')
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=caminho.parent, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - inicio) * 1000
+
+    total_us = 0
+    modulos = []
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        # Formato: "import time: <próprio us> | <cumulativo us> | <2 espaços por nível><módulo>"
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        if len(nome) - len(nome.lstrip(' ')) == 1:
+            # Imports de primeiro nível: a soma dos cumulativos é o custo total
+            total_us += int(cumulativo)
+            modulos.append((nome.strip(), int(cumulativo) / 1000))
+
+    modulos.sort(key=lambda item: item[1], reverse=True)
+    return {
+        'import_ms': total_us / 1000,
+        'wall_ms': wall_ms,
+        'codigo_saida': processo.returncode,
+        'mais_pesados': modulos[:10],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de tempo de importação do GembaGuard.")
+    parser.add_argument('alvos', nargs='*', default=list(ALVOS), help="Alvos a medir (padrão: todos).")
+    parser.add_argument('--orcamento', type=Path, help="JSON {alvo: ms}; sai com código 1 se algum alvo estourar.")
+    parser.add_argument('--saida', type=Path, default=RAIZ / 'benchmarks' / 'resultados' / 'importacao.json')
+    args = parser.parse_args()
+
+    print("--- BENCHMARK DE TEMPO DE IMPORTAÇÃO ---")
+    resultados = {}
+    for alvo in args.alvos:
+        resultados[alvo] = medir_importacao(ALVOS[alvo])
+        r = resultados[alvo]
+        print(f"\n{alvo}: imports {r['import_ms']:.0f} ms (processo {r['wall_ms']:.0f} ms, saída {r['codigo_saida']})")
+        for nome, ms in r['mais_pesados'][:5]:
+            print(f"   -> {nome:<30} {ms:8.1f} ms")
+
+    args.saida.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.saida, 'w') as f:
+        json.dump({'python': sys.version.split()[0], 'resultados': resultados}, f, indent=2)
+    print(f"\nResultados salvos em '{args.saida}'")
+
+    if args.orcamento:
+        with open(args.orcamento) as f:
+            orcamento = json.load(f)
+        estouros = {alvo: r['import_ms'] for alvo, r in resultados.items()
+                    if alvo in orcamento and r['import_ms'] > orcamento[alvo]}
+        for alvo, ms in estouros.items():
+            print(f"❌ {alvo}: {ms:.0f} ms acima do orçamento de {orcamento[alvo]} ms")
+        if estouros:
+            sys.exit(1)
+        print("✅ Todos os alvos dentro do orçamento.")
+
+
+if __name__ == "__main__":
+    main()
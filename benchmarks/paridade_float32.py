@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Paridade numérica do modo float32 com o caminho float64.
+
+Pontua o mesmo CSV (padrão: `data/bootcamp_test.csv`) duas vezes com os
+mesmos artefatos: leitura, features e normalização em float64 (caminho
+padrão) e em float32 (`GEMBAGUARD_FLOAT32=1` no app, `--float32` na etapa
+5). Para cada target reporta a maior e a média das diferenças absolutas
+de probabilidade e quantas linhas mudam de lado no limite de alerta. Também
+compara o status de deriva por feature e a memória da matriz de features.
+
+As árvores já comparam as features em float32 nos dois caminhos; o que muda
+é o arredondamento da leitura e das features derivadas (1 ulp). Em poucas
+linhas que caem exatamente sobre um limiar isso troca o voto de algumas
+árvores (1/n_arvores cada), então a diferença máxima é da ordem de 1e-2 e
+a média fica perto de 1e-4. O critério é a diferença média e os alertas.
+
+    python benchmarks/paridade_float32.py
+    python benchmarks/paridade_float32.py --tolerancia 0.0005
+
+Sai com código 1 se a diferença média de algum target passar da tolerância,
+algum alerta mudar ou o status de deriva de alguma feature mudar.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from gembaguard.esquema import carregar_esquema  # noqa: E402
+from gembaguard.features import montar_matriz_features  # noqa: E402
+from gembaguard.predicao import escalonar, preencher_nulos, prever_probabilidade_target  # noqa: E402
+
+
+def pontuar(caminho_csv, bundle, scaler, referencia, dtype):
+    """Caminho do app com o dtype dado. Retorna (probabilidades, status de deriva, MB da matriz, segundos)."""
+    inicio = time.perf_counter()
+    df = carregar_esquema().ler_csv(caminho_csv, dtype_float=np.float32 if dtype == np.float32 else None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, _ = montar_matriz_features(df, bundle['features'], avisar=lambda *_: None, erro=print, dtype=dtype)
+    mb = X.nbytes / 1024 ** 2
+
+    deriva = None
+    if referencia is not None:
+        monitor = referencia.novo_monitor()
+        monitor.atualizar(pd.DataFrame(X, columns=bundle['features'], copy=False), df.get(referencia.coluna_grupo))
+        deriva = monitor.comparar(referencia)
+
+    preencher_nulos(X)
+    X_scaled = pd.DataFrame(escalonar(scaler, X), columns=bundle['features'], copy=False)
+    cache = {}
+    probabilidades = pd.DataFrame({
+        target: prever_probabilidade_target(modelo, X_scaled, cache) for target, modelo in bundle['modelos'].items()
+    })
+    return probabilidades, deriva, mb, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridade das probabilidades float32 vs float64.")
+    parser.add_argument('--csv', type=Path, default=RAIZ / 'data' / 'bootcamp_test.csv')
+    parser.add_argument('--artefatos', type=Path, default=RAIZ,
+                        help="Diretório com 3_modelos_treinados.pkl, 3_standard_scaler.pkl e (opcional) 3_referencia_deriva.pkl.")
+    parser.add_argument('--tolerancia', type=float, default=1e-3,
+                        help="Maior diferença absoluta média de probabilidade aceita por target (padrão: 0.001).")
+    parser.add_argument('--limite-alerta', type=float, default=0.5)
+    args = parser.parse_args()
+
+    import joblib
+
+    print("--- PARIDADE FLOAT32 x FLOAT64 ---")
+    bundle = joblib.load(args.artefatos / '3_modelos_treinados.pkl')
+    scaler = joblib.load(args.artefatos / '3_standard_scaler.pkl')
+    caminho_referencia = args.artefatos / '3_referencia_deriva.pkl'
+    referencia = joblib.load(caminho_referencia) if caminho_referencia.exists() else None
+
+    p64, deriva64, mb64, s64 = pontuar(args.csv, bundle, scaler, referencia, np.float64)
+    p32, deriva32, mb32, s32 = pontuar(args.csv, bundle, scaler, referencia, np.float32)
+    print(f"{len(p64):,} linhas de '{args.csv.name}'")
+    print(f"Matriz de features: {mb64:.1f} MB (float64) -> {mb32:.1f} MB (float32); "
+          f"tempo {s64:.2f} s -> {s32:.2f} s")
+
+    diferenca = (p64 - p32).abs()
+    alertas_trocados = (p64 > args.limite_alerta) != (p32 > args.limite_alerta)
+    relatorio = pd.DataFrame({
+        'diferenca_max': diferenca.max(),
+        'diferenca_media': diferenca.mean(),
+        'alertas_float64': (p64 > args.limite_alerta).sum(),
+        'alertas_trocados': alertas_trocados.sum(),
+    })
+    print(relatorio.to_string(float_format=lambda x: f"{x:.2e}"))
+
+    falhas = []
+    if (relatorio['diferenca_media'] > args.tolerancia).any():
+        falhas.append(f"diferença média acima de {args.tolerancia}")
+    if relatorio['alertas_trocados'].any():
+        falhas.append(f"{int(relatorio['alertas_trocados'].sum())} alerta(s) trocado(s)")
+
+    if deriva64 is not None:
+        chaves = ['grupo', 'feature']
+        status = deriva64[chaves + ['deriva']].merge(
+            deriva32[chaves + ['deriva']], on=chaves, suffixes=('_float64', '_float32')
+        )
+        trocados = status[status['deriva_float64'] != status['deriva_float32']]
+        print(f"Deriva: {len(status) - len(trocados)}/{len(status)} (grupo, feature) com o mesmo status")
+        if len(trocados):
+            print(trocados.to_string(index=False))
+            falhas.append(f"status de deriva diferente em {len(trocados)} feature(s)")
+
+    if falhas:
+        print(f"\n❌ Paridade falhou: {'; '.join(falhas)}.")
+        sys.exit(1)
+    print("\n✅ Probabilidades e alertas do modo float32 batem com o float64.")
+
+
+if __name__ == "__main__":
+    main()
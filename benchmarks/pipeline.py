@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Benchmark ponta a ponta do pipeline do GembaGuard.
+
+Gera dados sintéticos com o schema de `bootcamp_train.csv` (ver
+dados_sinteticos.py) e cronometra cada etapa separadamente: leitura do CSV,
+`limpar_dados`, `criar_features_avancadas` (treino) e
+`montar_matriz_features` (app: features e preenchimento direto na
+matriz do modelo), normalização,
+`predict_proba` de cada target, explicações dos alertas, agregação do
+dashboard e exportação (CSV ou Parquet). Cada tamanho roda em um processo
+novo, então o pico de RSS reportado é o daquele tamanho. No Linux, cada
+etapa também tem o seu pico; `pico_app_sobre_entrada` é o maior pico das
+etapas do caminho do app, acima do RSS antes da leitura, dividido pelo
+tamanho do DataFrame de entrada.
+
+    python benchmarks/pipeline.py --tamanhos 10000 100000
+    python benchmarks/pipeline.py --comparar-com benchmarks/resultados/pipeline_anterior.json
+
+Sem `--artefatos`, usa os modelos ao lado do app.py; se não existirem,
+treina um conjunto de modelos substitutos nos dados sintéticos (marcado
+como `modelos_sinteticos` no resultado).
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from dados_sinteticos import gerar_csv, gerar_dados  # noqa: E402
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def rss_mb():
+    """RSS atual do processo (Linux); None em outras plataformas."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def pico_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+
+def zerar_pico_rss():
+    """Zera o pico de RSS do processo (Linux: /proc/self/clear_refs), para medir o pico de uma etapa."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def pico_rss_desde_zerar_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Cronometro:
+    """Registra tempo, vazão, RSS e pico de RSS de cada etapa."""
+
+    def __init__(self, n_linhas):
+        self.n_linhas = n_linhas
+        self.etapas = {}
+        self.pico_mb = 0.0
+
+    @contextlib.contextmanager
+    def etapa(self, nome, n_linhas=None):
+        # O pico do processo é guardado antes de zerar; cada etapa mede o seu
+        self.pico_mb = max(self.pico_mb, pico_rss_mb() or 0)
+        pico_por_etapa = zerar_pico_rss()
+        rss_antes = rss_mb()
+        inicio = time.perf_counter()
+        yield
+        segundos = time.perf_counter() - inicio
+        rss_depois = rss_mb()
+        n = self.n_linhas if n_linhas is None else n_linhas
+        self.etapas[nome] = {
+            'segundos': segundos,
+            'linhas_por_s': n / segundos if segundos > 0 else None,
+            'rss_mb': rss_depois,
+            'delta_rss_mb': None if rss_antes is None else rss_depois - rss_antes,
+            'pico_rss_mb': pico_rss_desde_zerar_mb() if pico_por_etapa else None,
+        }
+        self.pico_mb = max(self.pico_mb, self.etapas[nome]['pico_rss_mb'] or 0)
+        print(f"   -> {nome:<40} {segundos:9.3f} s")
+
+
+def carregar_modulo_pipeline(nome_arquivo):
+    """Importa um script do pipeline (os nomes começam com dígito)."""
+    spec = importlib.util.spec_from_file_location(
+        nome_arquivo.replace('.py', ''), RAIZ / 'notebooks' / nome_arquivo
+    )
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def treinar_modelos_substitutos(caminho):
+    """Treina modelos pequenos nos dados sintéticos quando não há artefatos reais."""
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    preparacao = carregar_modulo_pipeline('2_preparacao.py')
+    df = gerar_dados(50_000, seed=7)
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = preparacao.criar_features_avancadas(preparacao.limpar_dados(df))
+
+    colunas_falha = {col: col.split(' ')[0] for col in df.columns if '(' in col}
+    df = df.rename(columns=colunas_falha)
+    targets = list(colunas_falha.values())
+    features = [col for col in df.columns if col not in targets + ['id', 'id_produto', 'falha_maquina', 'tipo']]
+
+    X = df[features].fillna(df[features].median())
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    modelos = {}
+    for target in targets:
+        y = (df[target] == 'True').astype(int)
+        modelos[target] = RandomForestClassifier(
+            n_estimators=100, max_depth=10, class_weight='balanced', random_state=42, n_jobs=-1
+        ).fit(X_scaled, y)
+
+    joblib.dump({'modelos': modelos, 'features': features, 'targets': targets}, caminho / '3_modelos_treinados.pkl')
+    joblib.dump(scaler, caminho / '3_standard_scaler.pkl')
+
+
+def agregar_dashboard(df_predictions, targets, ids_maquina=None):
+    """Mesma agregação do dashboard do app (resumo por target e alertas críticos)."""
+    from gembaguard.alertas import top_alertas
+
+    resumo = {
+        target: {
+            'falhas': int((df_predictions[target] > 0.5).sum()),
+            'prob_media': float(df_predictions[target].mean()),
+            'prob_max': float(df_predictions[target].max()),
+        }
+        for target in targets
+    }
+    alertas_criticos = top_alertas(df_predictions[targets], k=5, limite=0.7, ids_maquina=ids_maquina)
+    return resumo, alertas_criticos
+
+
+def exportar_resultados(df, df_predictions, formato='csv'):
+    """Mesma exportação do app: resultado completo + só alertas, com valores brutos."""
+    from gembaguard.exportacao import montar_resultado, mascara_alertas, exportar_bytes
+
+    df_exportacao = montar_resultado(df, df_predictions)
+    dados_completos, _, _ = exportar_bytes(df_exportacao, formato)
+    dados_alertas, _, _ = exportar_bytes(df_exportacao[mascara_alertas(df_exportacao)], formato)
+    return len(dados_completos) + len(dados_alertas)
+
+
+def executar_tamanho(caminho_csv, n_linhas, dir_artefatos, formato_exportacao='csv'):
+    """Roda todas as etapas para um CSV e retorna o dicionário de resultados."""
+    import joblib
+    from gembaguard.esquema import carregar_esquema
+    from gembaguard.features import montar_matriz_features
+    from gembaguard.predicao import prever_probabilidade_target, preencher_nulos, escalonar
+    from gembaguard.explicacoes import explicar_predicoes
+
+    preparacao = carregar_modulo_pipeline('2_preparacao.py')
+    silencioso = lambda *args, **kwargs: None
+    cronometro = Cronometro(n_linhas)
+    print(f"\n--- {n_linhas:,} LINHAS ---")
+
+    with cronometro.etapa('carregar_artefatos', n_linhas=0):
+        bundle = joblib.load(dir_artefatos / '3_modelos_treinados.pkl')
+        scaler = joblib.load(dir_artefatos / '3_standard_scaler.pkl')
+    modelos, features, targets = bundle['modelos'], bundle['features'], bundle['targets']
+
+    rss_base = rss_mb()
+    with cronometro.etapa('leitura_csv'):
+        df = carregar_esquema().ler_csv(caminho_csv)
+    entrada_mb = df.memory_usage(deep=True).sum() / 2 ** 20
+
+    # Os scripts do pipeline imprimem o progresso; o print fica fora da medição
+    silenciar = lambda: contextlib.redirect_stdout(io.StringIO())
+    with cronometro.etapa('limpar_dados'), silenciar():
+        df_limpo = preparacao.limpar_dados(df)
+    with cronometro.etapa('criar_features_avancadas'), silenciar():
+        preparacao.criar_features_avancadas(df_limpo)
+    del df_limpo
+
+    with cronometro.etapa('montar_matriz_features'), silenciar():
+        X, _ = montar_matriz_features(df, features, avisar=silencioso, erro=silencioso)
+
+    with cronometro.etapa('escalonamento'):
+        preencher_nulos(X)
+        df_scaled = pd.DataFrame(escalonar(scaler, X), columns=features, copy=False)
+
+    predictions = {}
+    cache_multilabel = {}
+    for target, modelo in modelos.items():
+        with cronometro.etapa(f'predict_proba_{target}'):
+            predictions[target] = prever_probabilidade_target(modelo, df_scaled, cache_multilabel)
+    df_predictions = pd.DataFrame(predictions, index=df.index)
+
+    n_alertas = int((df_predictions > 0.5).any(axis=1).sum())
+    with cronometro.etapa('explicacoes_alertas', n_linhas=n_alertas):
+        X_scaled = df_scaled.to_numpy()
+        for target, modelo in modelos.items():
+            mascara = df_predictions[target].to_numpy() > 0.5
+            if mascara.any():
+                explicar_predicoes(modelo, X_scaled[mascara])
+    del df_scaled
+
+    with cronometro.etapa('agregacao_dashboard'):
+        agregar_dashboard(df_predictions, targets, df.get('id_produto'))
+
+    n_maquinas = None
+    if 'id_produto' in df.columns:
+        from gembaguard.maquinas import fila_manutencao
+        with cronometro.etapa('agregacao_maquinas'):
+            n_maquinas = len(fila_manutencao(df, df_predictions[targets]))
+
+    with cronometro.etapa(f'exportacao_{formato_exportacao}'):
+        bytes_exportados = exportar_resultados(df, df_predictions, formato_exportacao)
+
+    etapas_treino = {'carregar_artefatos', 'limpar_dados', 'criar_features_avancadas'}
+    picos_app = [
+        etapa['pico_rss_mb'] for nome, etapa in cronometro.etapas.items()
+        if nome not in etapas_treino and etapa['pico_rss_mb'] is not None
+    ]
+    pico_app_sobre_entrada = (max(picos_app) - rss_base) / entrada_mb if picos_app and rss_base else None
+
+    return {
+        'linhas': n_linhas,
+        'alertas': n_alertas,
+        'maquinas': n_maquinas,
+        'bytes_exportados': bytes_exportados,
+        'pico_rss_mb': max(cronometro.pico_mb, pico_rss_mb() or 0),
+        'entrada_mb': entrada_mb,
+        'pico_app_sobre_entrada': pico_app_sobre_entrada,
+        'etapas': cronometro.etapas,
+    }
+
+
+def versao_git():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(resultados, caminho_anterior, tolerancia):
+    """Compara com uma execução anterior e retorna as etapas que ficaram mais lentas que a tolerância."""
+    with open(caminho_anterior) as f:
+        anterior = json.load(f)
+    regressoes = []
+    print(f"\n--- COMPARAÇÃO COM '{caminho_anterior}' (versão {anterior.get('versao')}) ---")
+    for tamanho, atual in resultados.items():
+        antigo = anterior['resultados'].get(tamanho)
+        if not antigo:
+            continue
+        for etapa, medida in atual['etapas'].items():
+            referencia = antigo['etapas'].get(etapa)
+            if not referencia or referencia['segundos'] < 0.01:
+                continue
+            razao = medida['segundos'] / referencia['segundos']
+            marcador = '❌' if razao > 1 + tolerancia else '  '
+            print(f"{marcador} {tamanho:>10} {etapa:<40} {referencia['segundos']:8.3f}s -> {medida['segundos']:8.3f}s ({razao:.2f}x)")
+            if razao > 1 + tolerancia:
+                regressoes.append((tamanho, etapa, razao))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta do pipeline do GembaGuard.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    parser.add_argument('--artefatos', type=Path, default=RAIZ,
+                        help="Diretório com 3_modelos_treinados.pkl e 3_standard_scaler.pkl.")
+    parser.add_argument('--dir-dados', type=Path, default=Path(tempfile.gettempdir()) / 'gembaguard_benchmark',
+                        help="Onde os CSVs sintéticos são gerados (e reaproveitados entre execuções).")
+    parser.add_argument('--saida', type=Path, default=RAIZ / 'benchmarks' / 'resultados' / 'pipeline.json')
+    parser.add_argument('--comparar-com', type=Path, help="Resultado anterior para detectar regressões.")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="Aumento relativo de tempo considerado regressão (padrão: 20%%).")
+    parser.add_argument('--formato-exportacao', choices=['parquet', 'csv', 'csv.gz', 'csv.zst'], default='csv')
+    parser.add_argument('--executar-tamanho', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--saida-tamanho', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Modo filho: roda um único tamanho e grava o resultado
+    if args.executar_tamanho:
+        caminho_csv = args.dir_dados / f'sintetico_{args.executar_tamanho}.csv'
+        resultado = executar_tamanho(caminho_csv, args.executar_tamanho, args.artefatos, args.formato_exportacao)
+        with open(args.saida_tamanho, 'w') as f:
+            json.dump(resultado, f)
+        return
+
+    print("--- BENCHMARK DO PIPELINE GEMBAGUARD ---")
+    args.dir_dados.mkdir(parents=True, exist_ok=True)
+
+    modelos_sinteticos = not (args.artefatos / '3_modelos_treinados.pkl').exists()
+    if modelos_sinteticos:
+        args.artefatos = args.dir_dados / 'artefatos'
+        if not (args.artefatos / '3_modelos_treinados.pkl').exists():
+            print("Artefatos não encontrados. Treinando modelos substitutos nos dados sintéticos...")
+            args.artefatos.mkdir(parents=True, exist_ok=True)
+            treinar_modelos_substitutos(args.artefatos)
+
+    resultados = {}
+    for tamanho in args.tamanhos:
+        caminho_csv = args.dir_dados / f'sintetico_{tamanho}.csv'
+        if not caminho_csv.exists():
+            print(f"Gerando {tamanho:,} linhas sintéticas em '{caminho_csv}'...")
+            gerar_csv(caminho_csv, tamanho)
+
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            saida_tamanho = Path(tmp.name)
+        subprocess.run([
+            sys.executable, __file__, '--executar-tamanho', str(tamanho),
+            '--dir-dados', str(args.dir_dados), '--artefatos', str(args.artefatos),
+            '--saida-tamanho', str(saida_tamanho), '--formato-exportacao', args.formato_exportacao,
+        ], check=True)
+        with open(saida_tamanho) as f:
+            resultados[str(tamanho)] = json.load(f)
+        saida_tamanho.unlink()
+        resultado = resultados[str(tamanho)]
+        print(f"   -> pico de RSS: {resultado['pico_rss_mb']:.0f} MB "
+              f"(entrada: {resultado['entrada_mb']:.0f} MB, pico do app/entrada: {resultado['pico_app_sobre_entrada'] or 0:.1f}x)")
+
+    args.saida.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.saida, 'w') as f:
+        json.dump({
+            'versao': versao_git(),
+            'data': pd.Timestamp.now().isoformat(),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'modelos_sinteticos': modelos_sinteticos,
+            'resultados': resultados,
+        }, f, indent=2)
+    print(f"\nResultados salvos em '{args.saida}'")
+
+    if args.comparar_com:
+        regressoes = comparar(resultados, args.comparar_com, args.tolerancia)
+        if regressoes:
+            print(f"\n❌ {len(regressoes)} etapa(s) mais lenta(s) que a tolerância de {args.tolerancia:.0%}.")
+            sys.exit(1)
+        print("\n✅ Nenhuma regressão acima da tolerância.")
+
+
+if __name__ == "__main__":
+    main()
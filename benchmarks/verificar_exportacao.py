@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Verificação da exportação com colunas de texto.
+
+Monta um resultado como o do app e do modo lote (`montar_resultado`, com
+`tipo`, `id_produto` e colunas `fatores_<target>`) em duas versões: texto
+como dtype object (padrão do pandas 2) e como dtype `str`. Inclui uma coluna
+de texto que só tem nulos no primeiro bloco. Exporta cada versão em todos
+os formatos, em vários blocos, relê o arquivo e confere linhas, colunas e
+valores.
+
+    python benchmarks/verificar_exportacao.py
+
+Sai com código 1 se algum formato falhar ou não reler o que foi escrito.
+"""
+
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from gembaguard.exportacao import FORMATOS, exportar_bytes, montar_resultado  # noqa: E402
+
+TAMANHO_BLOCO = 1_000
+
+
+def montar_frame(n_linhas, dtype_texto, seed=42):
+    """Resultado com colunas de texto no dtype pedido (object ou 'str')."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'tipo': pd.Series(rng.choice(['L', 'M', 'H'], n_linhas), dtype=dtype_texto),
+        'id_produto': pd.Series([f'L{50000 + i}' for i in range(n_linhas)], dtype=dtype_texto),
+        'torque': rng.normal(40, 10, n_linhas),
+    })
+    probabilidades = pd.DataFrame({'FDF': rng.random(n_linhas), 'FTE': rng.random(n_linhas)})
+    # Fatores só existem nas linhas em alerta: o primeiro bloco inteiro fica nulo
+    fatores = pd.Series([None] * n_linhas, dtype=object)
+    fatores.iloc[TAMANHO_BLOCO + 1::7] = 'torque (+0.31), desgaste_da_ferramenta (+0.12)'
+    return montar_resultado(df, probabilidades, extras={'fatores_FDF': fatores.astype(dtype_texto)})
+
+
+def reler(conteudo, formato):
+    """Relê com o pyarrow (o zstd do pandas depende do pacote `zstandard`)."""
+    import pyarrow as pa
+    if formato == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(io.BytesIO(conteudo)).to_pandas()
+    import pyarrow.csv as pacsv
+    compressao = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}[formato]
+    fluxo = pa.input_stream(pa.BufferReader(conteudo), compression=compressao)
+    opcoes = pacsv.ConvertOptions(column_types={'tipo': pa.string(), 'id_produto': pa.string()},
+                                  strings_can_be_null=True)
+    return pacsv.read_csv(fluxo, convert_options=opcoes).to_pandas()
+
+
+def main():
+    print("--- EXPORTAÇÃO COM COLUNAS DE TEXTO ---")
+    falhas = []
+    for dtype_texto in [object, 'str']:
+        df = montar_frame(3 * TAMANHO_BLOCO + 17, dtype_texto)
+        for formato in FORMATOS:
+            rotulo = f"{formato} (texto {'object' if dtype_texto is object else dtype_texto})"
+            try:
+                conteudo, _, _ = exportar_bytes(df, formato, tamanho_bloco=TAMANHO_BLOCO)
+                relido = reler(conteudo, formato)
+            except Exception as e:
+                falhas.append(f"{rotulo}: {type(e).__name__}: {e}")
+                continue
+            problemas = []
+            if relido.shape != df.shape or list(relido.columns) != list(df.columns):
+                problemas.append(f"formato {relido.shape} != {df.shape}")
+            else:
+                for coluna in ['tipo', 'id_produto', 'fatores_FDF']:
+                    esperado = df[coluna].astype(object).where(df[coluna].notna(), None).tolist()
+                    obtido = relido[coluna].astype(object).where(relido[coluna].notna(), None).tolist()
+                    if esperado != obtido:
+                        problemas.append(f"valores de '{coluna}' diferentes")
+                if not np.allclose(relido['prob_FDF'], df['prob_FDF']):
+                    problemas.append("probabilidades diferentes")
+            print(f"   -> {rotulo}: {'❌ ' + '; '.join(problemas) if problemas else '✅'}")
+            falhas.extend(f"{rotulo}: {p}" for p in problemas)
+
+    if falhas:
+        print(f"\n❌ Exportação falhou:\n" + "\n".join(falhas))
+        sys.exit(1)
+    print("\n✅ Todos os formatos exportam e releem colunas de texto object e str.")
+
+
+if __name__ == "__main__":
+    main()
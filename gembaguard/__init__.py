@@ -0,0 +1 @@
+"""Componentes compartilhados entre os scripts do pipeline e o app Streamlit."""
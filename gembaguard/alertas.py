@@ -0,0 +1,134 @@
+"""
+Seleção dos K alertas mais severos entre todos os targets.
+
+Em vez de materializar uma tupla por leitura acima do limite, a matriz de
+probabilidades (linhas x targets) é reduzida com `np.argpartition`, que
+custa O(n) e não ordena tudo. Com deduplicação por máquina (`id_produto`),
+cada máquina aparece uma única vez, com a sua leitura mais grave. Leituras
+sem `id_produto` (None/NaN) não são agrupadas: cada uma conta como uma
+máquina própria, porque nada indica que venham da mesma máquina.
+
+Para dados que chegam em lotes, `TopKAlertas` mantém um heap limitado a K
+máquinas/alertas e é atualizado lote a lote.
+"""
+
+import heapq
+
+import numpy as np
+import pandas as pd
+
+COLUNAS = ['indice', 'target', 'probabilidade', 'id_produto']
+
+
+def _top_indices(valores, k):
+    """Índices dos k maiores valores, em ordem decrescente."""
+    if len(valores) > k:
+        candidatos = np.argpartition(-valores, k - 1)[:k]
+    else:
+        candidatos = np.arange(len(valores))
+    return candidatos[np.argsort(-valores[candidatos], kind='stable')]
+
+
+def _primeiro_por_maquina(ids):
+    """
+    Posições da primeira ocorrência de cada id. Ids de tipos misturados
+    (str e int) são comparados por valor via `pd.factorize`; ids ausentes
+    recebem um código próprio cada (não são deduplicados).
+    """
+    codigos, _ = pd.factorize(ids, sort=False)
+    ausentes = codigos < 0
+    if ausentes.any():
+        codigos[ausentes] = codigos.max(initial=-1) + 1 + np.arange(np.count_nonzero(ausentes))
+    _, primeiros = np.unique(codigos, return_index=True)
+    return primeiros
+
+
+def top_alertas(df_predictions, k=5, limite=0.7, ids_maquina=None):
+    """
+    Retorna um DataFrame com os K alertas de maior probabilidade acima de
+    `limite` (colunas: indice, target, probabilidade, id_produto). Com
+    `ids_maquina` (Series alinhada ao índice), mantém só o pior alerta de
+    cada máquina (leituras sem id não são agrupadas).
+    """
+    probabilidades = df_predictions.to_numpy(dtype=np.float32)
+    targets = np.asarray(df_predictions.columns)
+    if k <= 0 or probabilidades.size == 0:
+        return pd.DataFrame(columns=COLUNAS)
+
+    if ids_maquina is None:
+        # Top-K sobre a matriz achatada: cada (linha, target) é um candidato
+        achatado = probabilidades.ravel()
+        selecionados = _top_indices(achatado, k)
+        selecionados = selecionados[achatado[selecionados] > limite]
+        linhas, colunas = np.divmod(selecionados, probabilidades.shape[1])
+        maquinas = np.full(len(linhas), None)
+    else:
+        # Pior target de cada linha; depois a pior linha de cada máquina
+        colunas_max = probabilidades.argmax(axis=1)
+        maximo_linha = probabilidades[np.arange(len(probabilidades)), colunas_max]
+        acima = np.flatnonzero(maximo_linha > limite)
+        ids = np.asarray(ids_maquina)[acima]
+        valores = maximo_linha[acima]
+
+        # Amplia o conjunto de candidatos até ter K máquinas distintas (ou esgotar)
+        m = k
+        while True:
+            candidatos = _top_indices(valores, min(m, len(valores)))
+            primeiros = _primeiro_por_maquina(ids[candidatos])
+            if len(primeiros) >= k or len(candidatos) == len(valores):
+                break
+            m *= 4
+        candidatos = candidatos[np.sort(primeiros)][:k]
+        linhas = acima[candidatos]
+        colunas = colunas_max[linhas]
+        maquinas = ids[candidatos]
+
+    return pd.DataFrame({
+        'indice': df_predictions.index[linhas],
+        'target': targets[colunas],
+        'probabilidade': probabilidades[linhas, colunas],
+        'id_produto': maquinas,
+    }, columns=COLUNAS)
+
+
+class TopKAlertas:
+    """
+    Top-K incremental (modo streaming): memória O(K) independente do número
+    de lotes. Com `deduplicar=True`, guarda o pior alerta de cada máquina.
+    """
+
+    def __init__(self, k=5, limite=0.7, deduplicar=True):
+        self.k = k
+        self.limite = limite
+        self.deduplicar = deduplicar
+        self._heap = []       # (probabilidade, sequência, chave, alerta) — o menos grave no topo
+        self._por_chave = {}  # chave -> probabilidade no heap
+        self._sequencia = 0
+
+    def atualizar(self, df_predictions, ids_maquina=None):
+        ids = ids_maquina if self.deduplicar else None
+        # Reduz o lote ao seu próprio top-K antes de tocar no heap
+        for alerta in top_alertas(df_predictions, self.k, self.limite, ids).itertuples(index=False):
+            # Sem id, a leitura não é agrupada com nenhuma outra
+            agrupar = self.deduplicar and not pd.isna(alerta.id_produto)
+            chave = alerta.id_produto if agrupar else (alerta.indice, alerta.target)
+            atual = self._por_chave.get(chave)
+            if atual is not None:
+                if atual >= alerta.probabilidade:
+                    continue
+                # Máquina já no heap com um alerta menos grave: substitui (O(K))
+                self._heap = [entrada for entrada in self._heap if entrada[2] != chave]
+                heapq.heapify(self._heap)
+            elif len(self._heap) >= self.k and alerta.probabilidade <= self._heap[0][0]:
+                continue
+
+            self._sequencia += 1
+            self._por_chave[chave] = alerta.probabilidade
+            heapq.heappush(self._heap, (alerta.probabilidade, -self._sequencia, chave, alerta._asdict()))
+            if len(self._heap) > self.k:
+                _, _, removida, _ = heapq.heappop(self._heap)
+                del self._por_chave[removida]
+
+    def resultado(self):
+        ordenado = sorted(self._heap, key=lambda entrada: (-entrada[0], -entrada[1]))
+        return pd.DataFrame([entrada[3] for entrada in ordenado], columns=COLUNAS)
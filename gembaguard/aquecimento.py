@@ -0,0 +1,158 @@
+"""
+Warm-up do modelo e sinal de prontidão (readiness) da réplica.
+
+O primeiro predict_proba de cada modelo paga custos de inicialização
+(validação do scikit-learn, setup do booster do LightGBM, páginas do pickle
+ainda fora do cache). O warm-up passa um lote sintético pelo caminho
+completo de predição logo após o carregamento, mede a latência fria e a
+quente, e grava um arquivo de prontidão que pode ser checado por um probe:
+
+    python -m gembaguard.aquecimento                 # sai com 0 se a réplica está pronta
+    python -m gembaguard.aquecimento --replica 8502
+
+O arquivo é um por réplica (ver `arquivo_pronto`): réplicas no mesmo host
+não podem marcar umas às outras como prontas.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from gembaguard.predicao import pontuar_dataframe
+
+# Mesmo formato do exemplo exibido no app
+EXEMPLO_DADOS = {
+    'temperatura_ar': [295.3, 298.1, 296.7],
+    'temperatura_processo': [308.6, 312.4, 310.1],
+    'umidade_relativa': [38.4, 40.2, 39.1],
+    'velocidade_rotacional': [1551, 1602, 1578],
+    'torque': [42.8, 45.1, 43.9],
+    'desgaste_da_ferramenta': [108, 115, 112],
+    'tipo': ['M', 'M', 'H']
+}
+
+
+ESTADO = {
+    'pronto': False,
+    'latencia_fria_ms': None,
+    'latencia_quente_ms': None,
+    'linhas_aquecimento': 0,
+    'erro': None,
+}
+
+
+def gerar_lote_sintetico(n_linhas=256, seed=42):
+    """Gera um lote com o schema de EXEMPLO_DADOS, com ruído e os três tipos de máquina."""
+    rng = np.random.default_rng(seed)
+    exemplo = pd.DataFrame(EXEMPLO_DADOS)
+    lote = exemplo.iloc[np.arange(n_linhas) % len(exemplo)].reset_index(drop=True)
+
+    numericas = [col for col in lote.columns if col != 'tipo']
+    ruido = rng.normal(0, 0.02, size=(n_linhas, len(numericas)))
+    lote[numericas] = lote[numericas].to_numpy(dtype=float) * (1 + ruido)
+    lote['tipo'] = np.array(['L', 'M', 'H'])[np.arange(n_linhas) % 3]
+    return lote
+
+
+def arquivo_pronto(replica=None):
+    """
+    Caminho do arquivo de prontidão: GEMBAGUARD_ARQUIVO_PRONTO ou, sem ele,
+    `gembaguard_pronto_<réplica>.json` no diretório temporário. A réplica é
+    `replica`, GEMBAGUARD_REPLICA ou a porta do Streamlit
+    (STREAMLIT_SERVER_PORT, padrão 8501).
+    """
+    if os.environ.get('GEMBAGUARD_ARQUIVO_PRONTO'):
+        return os.environ['GEMBAGUARD_ARQUIVO_PRONTO']
+    replica = replica or os.environ.get('GEMBAGUARD_REPLICA') or os.environ.get('STREAMLIT_SERVER_PORT') or '8501'
+    return os.path.join(tempfile.gettempdir(), f'gembaguard_pronto_{replica}.json')
+
+
+def marcar_pronto(estado, caminho=None):
+    """Grava o arquivo de prontidão de forma atômica (nunca fica meio escrito)."""
+    caminho = caminho or arquivo_pronto()
+    conteudo = dict(estado, pid=os.getpid(), timestamp=time.time())
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w') as f:
+        json.dump(conteudo, f)
+    os.replace(temporario, caminho)
+
+
+def desmarcar_pronto(caminho=None):
+    ESTADO['pronto'] = False
+    try:
+        os.remove(caminho or arquivo_pronto())
+    except FileNotFoundError:
+        pass
+
+
+def aquecer_modelo(modelos, scaler, features, n_linhas=256, repeticoes=3):
+    """
+    Roda o lote sintético uma vez a frio e `repeticoes` vezes a quente.
+    Atualiza ESTADO, grava o arquivo de prontidão e retorna uma cópia do estado.
+    """
+    desmarcar_pronto()
+    lote = gerar_lote_sintetico(n_linhas)
+    silencioso = lambda *args, **kwargs: None
+
+    try:
+        inicio = time.perf_counter()
+        pontuar_dataframe(lote, modelos, scaler, features, avisar=silencioso)
+        latencia_fria = (time.perf_counter() - inicio) * 1000
+
+        latencias_quentes = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            pontuar_dataframe(lote, modelos, scaler, features, avisar=silencioso)
+            latencias_quentes.append((time.perf_counter() - inicio) * 1000)
+    except Exception as e:
+        ESTADO.update(pronto=False, erro=str(e))
+        return dict(ESTADO)
+
+    ESTADO.update(
+        pronto=True,
+        latencia_fria_ms=latencia_fria,
+        latencia_quente_ms=min(latencias_quentes),
+        linhas_aquecimento=n_linhas,
+        erro=None,
+    )
+    marcar_pronto(ESTADO)
+    return dict(ESTADO)
+
+
+def verificar_pronto(caminho=None):
+    """Lê o arquivo de prontidão e confirma que o processo que o gravou ainda existe."""
+    caminho = caminho or arquivo_pronto()
+    try:
+        with open(caminho) as f:
+            estado = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False, None
+
+    if os.name == 'posix':
+        # Um arquivo deixado por um processo que morreu não indica prontidão
+        try:
+            os.kill(estado['pid'], 0)
+        except (OSError, KeyError):
+            return False, estado
+    return bool(estado.get('pronto')), estado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Readiness probe: sai com 0 se a réplica está aquecida.")
+    parser.add_argument('--replica', help="Id da réplica (padrão: GEMBAGUARD_REPLICA ou a porta do Streamlit).")
+    parser.add_argument('--arquivo', help="Caminho do arquivo de prontidão (padrão: ver `arquivo_pronto`).")
+    args = parser.parse_args()
+
+    pronto, estado = verificar_pronto(args.arquivo or arquivo_pronto(args.replica))
+    print(json.dumps(estado if estado else {'pronto': False}))
+    sys.exit(0 if pronto else 1)
+
+
+if __name__ == "__main__":
+    main()
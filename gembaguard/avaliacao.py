@@ -0,0 +1,321 @@
+"""
+Avaliação vetorizada dos modelos por tipo de falha (etapa 4 e CI).
+
+Rótulos e probabilidades chegam como matrizes (n_linhas, n_targets). As
+contagens de confusão de todos os targets saem de uma passada sobre as
+matrizes (`np.count_nonzero` por coluna); precisão, recall, F1, F1
+macro/micro e Hamming loss são derivados dessas contagens.
+
+As métricas de ranking (PR-AUC e ROC-AUC) e a busca de limiares precisam
+das probabilidades ordenadas: cada target é ordenado uma vez e, a partir
+da ordem, saem as curvas completas (somas acumuladas) e o F1 de toda a
+grade de limiares (`searchsorted`). Os targets são processados em threads
+(a ordenação do NumPy libera o GIL), então um holdout de 10M linhas é
+avaliado em segundos.
+
+O resultado é um dicionário com as métricas globais e um DataFrame por
+target (`resultado_para_json` o converte para JSON, ex.: para um gate de
+CI). Os gráficos são opcionais e ficam em funções separadas, que importam
+matplotlib só quando chamadas.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Mesma grade usada historicamente na etapa 4 (previsto = probabilidade > limiar)
+GRADE_LIMIARES = np.arange(0.01, 0.99, 0.01)
+
+
+def _como_matriz(valores, targets=None):
+    if isinstance(valores, pd.DataFrame):
+        valores = valores[targets] if targets is not None else valores
+    valores = np.asarray(valores)
+    return valores.reshape(-1, 1) if valores.ndim == 1 else valores
+
+
+def _dividir(numerador, denominador):
+    numerador = np.asarray(numerador, dtype=np.float64)
+    return np.divide(numerador, denominador, out=np.zeros_like(numerador), where=np.asarray(denominador) > 0)
+
+
+def contagens_confusao(Y, P):
+    """
+    Contagens (vp, fp, fn, vn) de cada coluna, em arrays de tamanho
+    n_targets. `Y` e `P` são matrizes (n_linhas, n_targets) de 0/1 ou bool.
+    """
+    Y = _como_matriz(Y).astype(bool, copy=False)
+    P = _como_matriz(P).astype(bool, copy=False)
+    vp = np.count_nonzero(Y & P, axis=0)
+    positivos = np.count_nonzero(Y, axis=0)
+    previstos = np.count_nonzero(P, axis=0)
+    fp = previstos - vp
+    fn = positivos - vp
+    vn = len(Y) - vp - fp - fn
+    return vp, fp, fn, vn
+
+
+def metricas_de_contagens(vp, fp, fn):
+    """Precisão, recall e F1 (0 quando indefinidos) a partir das contagens; funciona com arrays de qualquer forma."""
+    vp, fp, fn = (np.asarray(x, dtype=np.float64) for x in (vp, fp, fn))
+    return {
+        'precisao': _dividir(vp, vp + fp),
+        'recall': _dividir(vp, vp + fn),
+        'f1': _dividir(2 * vp, 2 * vp + fp + fn),
+    }
+
+
+def metricas_ranking(y, p, grade=GRADE_LIMIARES):
+    """
+    Métricas de um target a partir de uma única ordenação das probabilidades:
+    PR-AUC (average precision, como no scikit-learn), ROC-AUC e o F1 de cada
+    limiar da `grade`. AUCs são NaN quando só há uma classe.
+    """
+    y = np.asarray(y).astype(bool, copy=False)
+    p = np.asarray(p)
+    if not np.issubdtype(p.dtype, np.floating):
+        p = p.astype(np.float64)
+    # Empates são agrupados abaixo, então a ordenação não precisa ser estável
+    ordem = np.argsort(p)
+    p_ordenado = p[ordem]
+    positivos_acumulados = np.concatenate([[0], np.cumsum(y[ordem], dtype=np.int64)])
+    n, n_positivos = len(y), int(positivos_acumulados[-1])
+
+    # F1 da grade: previstos são as linhas com p > limiar (sufixo da ordem)
+    inicio = np.searchsorted(p_ordenado.astype(np.float64, copy=False), grade, side='right')
+    vp = n_positivos - positivos_acumulados[inicio]
+    fp = (n - inicio) - vp
+    f1_grade = metricas_de_contagens(vp, fp, n_positivos - vp)['f1']
+
+    if n_positivos in (0, n):
+        return {'pr_auc': np.nan, 'roc_auc': np.nan, 'f1_grade': f1_grade}
+
+    # Curvas em ordem decrescente de limiar, um ponto por valor distinto de probabilidade
+    fim_de_grupo = np.flatnonzero(np.diff(p_ordenado[::-1]))
+    cortes = np.concatenate([fim_de_grupo, [n - 1]])
+    vp_curva = n_positivos - positivos_acumulados[n - 1 - cortes]
+    fp_curva = (cortes + 1) - vp_curva
+
+    recall = vp_curva / n_positivos
+    precisao = vp_curva / (cortes + 1)
+    pr_auc = float(np.sum(np.diff(np.concatenate([[0.0], recall])) * precisao))
+
+    tpr = np.concatenate([[0.0], recall])
+    fpr = np.concatenate([[0.0], fp_curva / (n - n_positivos)])
+    roc_auc = float(np.trapezoid(tpr, fpr) if hasattr(np, 'trapezoid') else np.trapz(tpr, fpr))
+    return {'pr_auc': pr_auc, 'roc_auc': roc_auc, 'f1_grade': f1_grade}
+
+
+def avaliar_multilabel(Y, proba, targets, limiares=None, grade=GRADE_LIMIARES, n_jobs=None):
+    """
+    Avalia todos os targets. `limiares`: None (escolhe, por target, o limiar
+    da `grade` com maior F1; 0.5 se o target só tem uma classe), um número ou
+    um dicionário target -> limiar. Retorna um dicionário com 'n_linhas',
+    'f1_macro', 'f1_micro', 'hamming_loss' e 'por_target' (DataFrame indexado
+    pelo target com limiar, contagens, precisão, recall, F1, PR-AUC e ROC-AUC).
+    """
+    Y = _como_matriz(Y, targets)
+    proba = _como_matriz(proba, targets)
+    if Y.shape != proba.shape or Y.shape[1] != len(targets):
+        raise ValueError(f"Rótulos {Y.shape} e probabilidades {proba.shape} não batem com {len(targets)} targets")
+
+    with ThreadPoolExecutor(max_workers=n_jobs or len(targets) or 1) as executor:
+        ranking = list(executor.map(lambda j: metricas_ranking(Y[:, j], proba[:, j], grade), range(len(targets))))
+
+    if limiares is None:
+        vetor_limiares = np.array([
+            grade[np.argmax(r['f1_grade'])] if not np.isnan(r['roc_auc']) else 0.5 for r in ranking
+        ])
+    elif isinstance(limiares, dict):
+        vetor_limiares = np.array([limiares[target] for target in targets], dtype=np.float64)
+    else:
+        vetor_limiares = np.full(len(targets), float(limiares))
+
+    vp, fp, fn, vn = contagens_confusao(Y, proba > vetor_limiares)
+    metricas = metricas_de_contagens(vp, fp, fn)
+    por_target = pd.DataFrame({
+        'limiar': vetor_limiares,
+        'suporte': vp + fn,
+        'vp': vp, 'fp': fp, 'fn': fn, 'vn': vn,
+        **metricas,
+        'pr_auc': [r['pr_auc'] for r in ranking],
+        'roc_auc': [r['roc_auc'] for r in ranking],
+    }, index=pd.Index(targets, name='target'))
+
+    total = metricas_de_contagens(vp.sum(), fp.sum(), fn.sum())
+    return {
+        'n_linhas': len(Y),
+        'f1_macro': float(metricas['f1'].mean()) if len(targets) else 0.0,
+        'f1_micro': float(total['f1']),
+        'hamming_loss': float((fp.sum() + fn.sum()) / max(Y.size, 1)),
+        'por_target': por_target,
+    }
+
+
+def _contagens_por_amostra(codigos, n_codigos, indices):
+    """
+    Contagem de cada código (0..n_codigos-1) em cada reamostragem: um único
+    `bincount` sobre os códigos reamostrados, deslocados por reamostragem.
+    Retorna (n_amostras, n_codigos).
+    """
+    deslocados = codigos[indices]
+    deslocados += (n_codigos * np.arange(len(indices), dtype=np.int64))[:, None]
+    return np.bincount(deslocados.ravel(), minlength=len(indices) * n_codigos).reshape(len(indices), n_codigos)
+
+
+def intervalos_bootstrap(Y, proba, targets, limiares, n_amostras=1000, confianca=0.95, grade=GRADE_LIMIARES,
+                         random_state=42, linhas_por_bloco=20_000_000):
+    """
+    Intervalos de confiança bootstrap (percentil) de precisão, recall e F1
+    de cada target no `limiares` dado (número ou dicionário target -> limiar)
+    e do threshold otimizado (re-escolhido na `grade` em cada reamostragem)
+    com o F1 correspondente.
+
+    Todas as reamostragens usam a mesma matriz de índices (pareadas entre
+    targets). Cada linha vira um código (rótulo x posição na grade) e as
+    contagens de todas as reamostragens saem de um `bincount`; o F1 de toda
+    a grade vem de somas acumuladas dessas contagens. As reamostragens são
+    processadas em blocos de até `linhas_por_bloco` índices.
+
+    Retorna um DataFrame com target, metrica, estimativa (amostra original),
+    ic_inferior, ic_superior e desvio (desvio padrão das reamostragens).
+    """
+    Y = _como_matriz(Y, targets).astype(np.int64)
+    proba = _como_matriz(proba, targets)
+    n = len(Y)
+    if not isinstance(limiares, dict):
+        limiares = {target: float(limiares) for target in targets}
+
+    # Código de cada linha: (posição na grade * 2 + rótulo) e (previsto * 2 + rótulo) no limiar dado
+    n_grade = len(grade) + 1
+    codigos_grade = [
+        np.searchsorted(grade, proba[:, j].astype(np.float64), side='left') * 2 + Y[:, j] for j in range(len(targets))
+    ]
+    codigos_limiar = [(proba[:, j] > limiares[target]).astype(np.int64) * 2 + Y[:, j] for j, target in enumerate(targets)]
+
+    def metricas_amostras(contagens_limiar, contagens_grade):
+        vn, fn, fp, vp = contagens_limiar.T
+        metricas = metricas_de_contagens(vp, fp, fn)
+        # Previstos no limiar grade[k]: linhas com posição > k (soma acumulada da direita para a esquerda)
+        por_posicao = contagens_grade.reshape(len(contagens_grade), n_grade, 2)
+        acima = np.cumsum(por_posicao[:, ::-1], axis=1)[:, ::-1][:, 1:]
+        vp_grade, fp_grade = acima[..., 1], acima[..., 0]
+        fn_grade = por_posicao[:, :, 1].sum(axis=1, keepdims=True) - vp_grade
+        f1_grade = metricas_de_contagens(vp_grade, fp_grade, fn_grade)['f1']
+        melhor = np.argmax(f1_grade, axis=1)
+        sem_positivos = por_posicao[:, :, 1].sum(axis=1) == 0
+        metricas['limiar_otimo'] = np.where(sem_positivos, np.nan, grade[melhor])
+        metricas['f1_limiar_otimo'] = np.where(sem_positivos, np.nan, f1_grade[np.arange(len(melhor)), melhor])
+        return metricas
+
+    originais = {}
+    for j, target in enumerate(targets):
+        originais[target] = metricas_amostras(
+            np.bincount(codigos_limiar[j], minlength=4)[None, :],
+            np.bincount(codigos_grade[j], minlength=2 * n_grade)[None, :],
+        )
+
+    rng = np.random.default_rng(random_state)
+    por_bloco = max(1, linhas_por_bloco // max(n, 1))
+    amostras = {target: [] for target in targets}
+    for inicio in range(0, n_amostras, por_bloco):
+        indices = rng.integers(0, n, size=(min(por_bloco, n_amostras - inicio), n), dtype=np.int64)
+        for j, target in enumerate(targets):
+            amostras[target].append(metricas_amostras(
+                _contagens_por_amostra(codigos_limiar[j], 4, indices),
+                _contagens_por_amostra(codigos_grade[j], 2 * n_grade, indices),
+            ))
+
+    alfa = (1 - confianca) / 2
+    linhas = []
+    for target in targets:
+        for metrica, original in originais[target].items():
+            valores = np.concatenate([bloco[metrica] for bloco in amostras[target]])
+            validos = valores[~np.isnan(valores)]
+            inferior, superior = np.quantile(validos, [alfa, 1 - alfa]) if len(validos) else (np.nan, np.nan)
+            linhas.append({
+                'target': target, 'metrica': metrica, 'estimativa': float(original[0]),
+                'ic_inferior': float(inferior), 'ic_superior': float(superior),
+                'desvio': float(validos.std()) if len(validos) else np.nan,
+            })
+    return pd.DataFrame(linhas)
+
+
+def resultado_para_json(resultado):
+    """Resultado de `avaliar_multilabel` como dicionário serializável (NaN vira null)."""
+    def sem_nan(df):
+        return df.astype(object).where(df.notna(), None)
+
+    def python(valor):
+        return valor.item() if hasattr(valor, 'item') else valor
+
+    saida = {}
+    for chave, valor in resultado.items():
+        if chave == 'por_target':
+            saida[chave] = {
+                target: {coluna: python(v) for coluna, v in linha.items()} for target, linha in sem_nan(valor).iterrows()
+            }
+        elif isinstance(valor, pd.DataFrame):
+            saida[chave] = [{coluna: python(v) for coluna, v in linha.items()} for _, linha in sem_nan(valor).iterrows()]
+        else:
+            saida[chave] = valor
+    return saida
+
+
+def salvar_json(resultado, caminho):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(resultado_para_json(resultado), f, indent=2, ensure_ascii=False)
+
+
+def plotar_matrizes_confusao(resultado, caminho):
+    """Matrizes de confusão (a partir das contagens) de todos os targets em uma figura."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    por_target = resultado['por_target']
+    n_targets = len(por_target)
+    cols = max(1, min(3, n_targets))
+    rows = max(1, (n_targets + cols - 1) // cols)
+    fig, axes = plt.subplots(rows, cols, figsize=(15, 5 * rows), squeeze=False)
+    axes = axes.ravel()
+    for ax, (target, linha) in zip(axes, por_target.iterrows()):
+        ax.set_title(f'Matriz de Confusão - {target}')
+        if linha['suporte'] in (0, resultado['n_linhas']):
+            ax.text(0.5, 0.5, 'Dados sem falha', ha='center', va='center')
+            ax.set_xticks([])
+            ax.set_yticks([])
+            continue
+        cm = np.array([[linha['vn'], linha['fp']], [linha['fn'], linha['vp']]], dtype=np.int64)
+        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', xticklabels=['Não', 'Sim'], yticklabels=['Não', 'Sim'], ax=ax)
+        ax.set_xlabel('Predito')
+        ax.set_ylabel('Real')
+    for ax in axes[n_targets:]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    fig.savefig(caminho)
+    plt.close(fig)
+
+
+def plotar_metricas_por_falha(resultado, caminho):
+    """Barras de precisão, recall e F1 por tipo de falha."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    metricas_df = (
+        resultado['por_target'][['precisao', 'recall', 'f1']]
+        .rename(columns={'precisao': 'Precision', 'recall': 'Recall', 'f1': 'F1-Score'})
+        .reset_index()
+        .melt(id_vars='target', var_name='Métrica', value_name='Valor')
+        .rename(columns={'target': 'Falha'})
+    )
+    fig, ax = plt.subplots(figsize=(12, 8))
+    sns.barplot(x='Falha', y='Valor', hue='Métrica', data=metricas_df, ax=ax)
+    ax.set_title('Comparativo de Métricas por Tipo de Falha')
+    ax.set_xlabel('Tipo de Falha')
+    ax.set_ylabel('Valor da Métrica')
+    ax.set_ylim(0, 1.05)
+    fig.tight_layout()
+    fig.savefig(caminho)
+    plt.close(fig)
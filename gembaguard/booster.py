@@ -0,0 +1,26 @@
+"""Booster LightGBM treinado fora da memória na etapa 3 e carregado pelo app e pela etapa 5."""
+
+import numpy as np
+
+
+class ModeloBooster:
+    """
+    Envolve um `lightgbm.Booster` binário (treinado com `lgb.train`, sem o
+    wrapper do scikit-learn) com a interface dos modelos especializados
+    (predict_proba/predict/feature_importances_).
+    """
+
+    def __init__(self, booster):
+        self.booster = booster
+        self.classes_ = np.array([0, 1])
+
+    @property
+    def feature_importances_(self):
+        return self.booster.feature_importance(importance_type='split')
+
+    def predict_proba(self, X):
+        p = self.booster.predict(np.asarray(X))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
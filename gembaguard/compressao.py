@@ -0,0 +1,157 @@
+"""
+Compressão de florestas treinadas na etapa 3.
+
+Uma Random Forest com 300 árvores sem limite de profundidade gera um pickle
+grande e um `predict_proba` lento, mesmo quando metade das árvores não muda
+o resultado fora do treino. Aqui:
+
+- `curva_arvores` mede F1 e AUC de dados não vistos no treino para cada
+  prefixo de árvores (1..n). A probabilidade de cada árvore é calculada
+  uma vez e os prefixos saem de uma soma acumulada;
+- `podar_floresta` mantém as primeiras k árvores;
+- `FlorestaQuantizada` serializa as árvores em 32 bits (limiares, folhas
+  e impurezas em float32, índices em int32), menos da metade dos bytes do
+  formato do scikit-learn. Ao carregar, as árvores voltam a ser árvores do
+  scikit-learn, então a predição em lote continua no código compilado.
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+
+
+def _indice_positivo(floresta):
+    positivos = np.flatnonzero(np.asarray(floresta.classes_) == 1)
+    return positivos[0] if len(positivos) else None
+
+
+def probabilidades_por_arvore(floresta, X):
+    """Matriz (n_linhas, n_arvores) com a probabilidade positiva de cada árvore."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    indice = _indice_positivo(floresta)
+    if indice is None:
+        return np.zeros((len(X), len(floresta.estimators_)))
+    return np.column_stack([arvore.predict_proba(X)[:, indice] for arvore in floresta.estimators_])
+
+
+def curva_arvores(floresta, X, y, limite=0.5):
+    """F1 (no `limite`) e AUC em (X, y) para cada número de árvores (prefixos da floresta)."""
+    y = np.asarray(y).astype(bool)
+    n_arvores = np.arange(1, len(floresta.estimators_) + 1)
+    probabilidades = np.cumsum(probabilidades_por_arvore(floresta, X), axis=1) / n_arvores
+
+    previstos = probabilidades > limite
+    vp = (previstos & y[:, None]).sum(axis=0)
+    fp = (previstos & ~y[:, None]).sum(axis=0)
+    fn = y.sum() - vp
+    f1 = np.divide(2 * vp, 2 * vp + fp + fn, out=np.zeros(len(n_arvores)), where=(2 * vp + fp + fn) > 0)
+
+    if y.all() or not y.any():
+        auc = np.full(len(n_arvores), np.nan)
+    else:
+        auc = np.array([roc_auc_score(y, probabilidades[:, k]) for k in range(len(n_arvores))])
+    return pd.DataFrame({'n_arvores': n_arvores, 'f1': f1, 'auc': auc})
+
+
+def escolher_n_arvores(curva, tolerancia=0.01):
+    """Menor prefixo cujo F1 e AUC ficam a no máximo `tolerancia` da floresta completa."""
+    completa = curva.iloc[-1]
+    dentro = curva['f1'] >= completa['f1'] - tolerancia
+    if not np.isnan(completa['auc']):
+        dentro &= curva['auc'] >= completa['auc'] - tolerancia
+    return int(curva.loc[dentro, 'n_arvores'].iloc[0])
+
+
+def podar_floresta(floresta, n_arvores):
+    """Cópia da floresta só com as primeiras `n_arvores` árvores (as árvores não são copiadas)."""
+    podada = copy.copy(floresta)
+    podada.estimators_ = floresta.estimators_[:n_arvores]
+    podada.n_estimators = len(podada.estimators_)
+    return podada
+
+
+def _compactar_arvore(tree):
+    """Estado de uma árvore em 32 bits (limiares arredondados para baixo até o float32 mais próximo)."""
+    estado = tree.__getstate__()
+    nos = estado['nodes']
+    limiar = nos['threshold'].astype(np.float32)
+    # Maior float32 <= limiar: x <= limiar32 equivale a x <= limiar para x em float32
+    limiar = np.where(limiar > nos['threshold'], np.nextafter(limiar, np.float32(-np.inf)), limiar)
+    compacta = {
+        'construtor': tree.__reduce__()[1],
+        'max_depth': estado['max_depth'],
+        'threshold': limiar,
+        'values': estado['values'].astype(np.float32),
+    }
+    for campo in nos.dtype.names:
+        if campo == 'threshold':
+            continue
+        tipo = nos.dtype[campo]
+        compacta[campo] = nos[campo].astype(np.float32 if tipo.kind == 'f' else np.int32 if tipo.kind == 'i' else tipo)
+    return compacta
+
+
+def _expandir_arvore(compacta):
+    """Reconstrói a `Tree` do scikit-learn a partir do estado compacto."""
+    from sklearn.tree._tree import NODE_DTYPE, Tree
+
+    nos = np.zeros(len(compacta['threshold']), dtype=NODE_DTYPE)
+    for campo in NODE_DTYPE.names:
+        nos[campo] = compacta[campo]
+    tree = Tree(*compacta['construtor'])
+    tree.__setstate__({
+        'max_depth': compacta['max_depth'],
+        'node_count': len(nos),
+        'nodes': nos,
+        'values': compacta['values'].astype(np.float64),
+    })
+    return tree
+
+
+class FlorestaQuantizada(RandomForestClassifier):
+    """
+    Random Forest cujas árvores são serializadas em 32 bits: limiares,
+    valores das folhas e impurezas em float32, índices em int32. Em memória
+    continua sendo uma RandomForestClassifier comum (predict_proba do
+    scikit-learn, explicações por caminho de decisão); só o pickle muda. Os
+    limiares são arredondados para baixo, então os splits sobre X em float32
+    (o que o scikit-learn usa nas árvores) são exatamente os mesmos; as
+    probabilidades diferem só pelo arredondamento das folhas (~1e-7).
+    """
+
+    @classmethod
+    def de_floresta(cls, floresta):
+        """Quantiza uma floresta treinada (a original não é alterada)."""
+        quantizada = copy.copy(floresta)
+        quantizada.__class__ = cls
+        quantizada.__setstate__(quantizada.__getstate__())
+        return quantizada
+
+    def __getstate__(self):
+        # Fora do pacote sklearn, o BaseEstimator devolve o próprio __dict__
+        estado = dict(super().__getstate__())
+        estimadores = estado.pop('estimators_', None)
+        if estimadores is not None:
+            modelo = copy.copy(estimadores[0])
+            del modelo.tree_
+            estado['_arvores_compactas'] = {
+                'modelo': modelo,
+                'random_states': [arvore.random_state for arvore in estimadores],
+                'arvores': [_compactar_arvore(arvore.tree_) for arvore in estimadores],
+            }
+        return estado
+
+    def __setstate__(self, estado):
+        compactas = estado.pop('_arvores_compactas', None)
+        if compactas is not None:
+            estimadores = []
+            for random_state, compacta in zip(compactas['random_states'], compactas['arvores']):
+                arvore = copy.copy(compactas['modelo'])
+                arvore.random_state = random_state
+                arvore.tree_ = _expandir_arvore(compacta)
+                estimadores.append(arvore)
+            estado['estimators_'] = estimadores
+        super().__setstate__(estado)
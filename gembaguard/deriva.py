@@ -0,0 +1,210 @@
+"""
+Monitor de deriva (data drift) com esboços de memória constante.
+
+Cada feature de cada `tipo` de máquina é resumida por um histograma de bins
+fixos. As bordas vêm dos quantis do conjunto de treino (bins de massa igual
+na referência), então um esboço ocupa sempre o mesmo espaço, não importa
+quantas linhas já passaram por ele. A referência é salva no treino
+(`3_referencia_deriva.pkl`); em produção, cada lote pontuado atualiza um
+monitor com as mesmas bordas, e a comparação usa:
+
+- PSI (Population Stability Index) entre as proporções por bin;
+- KS aproximado: maior distância entre as CDFs nas bordas dos bins.
+
+Uso em streaming, lendo um CSV em blocos:
+    python -m gembaguard.deriva dados.csv --referencia 3_referencia_deriva.pkl
+"""
+
+import contextlib
+import io
+import threading
+
+import numpy as np
+import pandas as pd
+
+GRUPO_TODOS = '_todos'
+
+# Faixas usuais de leitura do PSI
+LIMITE_PSI_MODERADO = 0.1
+LIMITE_PSI_ALTO = 0.25
+
+
+class EsbocoHistograma:
+    """Contagens por bin (inclui underflow/overflow) e contagem de nulos."""
+
+    def __init__(self, bordas):
+        self.bordas = np.asarray(bordas, dtype=np.float64)
+        self.contagens = np.zeros(len(self.bordas) + 1, dtype=np.int64)
+        self.nulos = 0
+
+    @property
+    def n(self):
+        return int(self.contagens.sum())
+
+    def atualizar(self, valores):
+        valores = np.asarray(valores)
+        bordas = self.bordas
+        if valores.dtype == np.float32:
+            # Leituras em float32 são comparadas com as bordas em float32: 298.1
+            # lido como float32 vale 298.1000061 em float64 e mudaria de bin
+            bordas = bordas.astype(np.float32)
+        else:
+            valores = valores.astype(np.float64, copy=False)
+        validos = ~np.isnan(valores)
+        self.nulos += int(len(valores) - validos.sum())
+        indices = np.searchsorted(bordas, valores[validos], side='right')
+        self.contagens += np.bincount(indices, minlength=len(self.contagens))
+
+    def proporcoes(self):
+        total = self.contagens.sum()
+        return self.contagens / total if total else np.zeros(len(self.contagens))
+
+
+def calcular_psi(proporcoes_referencia, proporcoes_atual, epsilon=1e-4):
+    referencia = np.clip(proporcoes_referencia, epsilon, None)
+    atual = np.clip(proporcoes_atual, epsilon, None)
+    return float(np.sum((atual - referencia) * np.log(atual / referencia)))
+
+
+def calcular_ks(proporcoes_referencia, proporcoes_atual):
+    return float(np.max(np.abs(np.cumsum(proporcoes_referencia) - np.cumsum(proporcoes_atual))))
+
+
+class MonitorDeriva:
+    """
+    Conjunto de esboços (grupo, feature). O grupo é o valor de `coluna_grupo`
+    ou GRUPO_TODOS para o lote inteiro. Thread-safe para uso no app.
+    """
+
+    def __init__(self, bordas, coluna_grupo='tipo'):
+        self.bordas = {feature: np.asarray(b, dtype=np.float64) for feature, b in bordas.items()}
+        self.coluna_grupo = coluna_grupo
+        self.esbocos = {}
+        self.linhas = 0
+        self._lock = threading.Lock()
+
+    @property
+    def features(self):
+        return list(self.bordas)
+
+    @classmethod
+    def criar_referencia(cls, df, features, n_bins=20, coluna_grupo='tipo'):
+        """Define as bordas pelos quantis de `df` e já acumula `df` como referência."""
+        quantis = np.linspace(0, 1, n_bins + 1)[1:-1]
+        bordas = {}
+        for feature in features:
+            valores = pd.to_numeric(df[feature], errors='coerce').dropna().to_numpy(dtype=np.float64)
+            bordas[feature] = np.unique(np.quantile(valores, quantis)) if len(valores) else np.array([])
+        referencia = cls(bordas, coluna_grupo)
+        referencia.atualizar(df)
+        return referencia
+
+    def novo_monitor(self):
+        """Monitor vazio com as mesmas bordas (para acumular dados de produção)."""
+        return MonitorDeriva(self.bordas, self.coluna_grupo)
+
+    def _esboco(self, grupo, feature):
+        chave = (grupo, feature)
+        if chave not in self.esbocos:
+            self.esbocos[chave] = EsbocoHistograma(self.bordas[feature])
+        return self.esbocos[chave]
+
+    def atualizar(self, df, grupos_linhas=None):
+        """
+        Acumula um lote. Features ausentes no lote são ignoradas. Quando `df`
+        é só a matriz de features (sem a coluna de grupo), passe o grupo de
+        cada linha em `grupos_linhas`.
+        """
+        presentes = [f for f in self.bordas if f in df.columns]
+        valores = df[presentes].apply(pd.to_numeric, errors='coerce').to_numpy()
+        if valores.dtype != np.float32:
+            valores = valores.astype(np.float64, copy=False)
+
+        if grupos_linhas is None and self.coluna_grupo in df.columns:
+            grupos_linhas = df[self.coluna_grupo]
+        grupos = [(GRUPO_TODOS, slice(None))]
+        if grupos_linhas is not None:
+            coluna = pd.Series(grupos_linhas).astype(str).to_numpy()
+            grupos += [(grupo, coluna == grupo) for grupo in pd.unique(coluna)]
+
+        with self._lock:
+            self.linhas += len(df)
+            for grupo, linhas in grupos:
+                bloco = valores[linhas]
+                for j, feature in enumerate(presentes):
+                    self._esboco(grupo, feature).atualizar(bloco[:, j])
+
+    def comparar(self, referencia, min_linhas=30):
+        """
+        Compara com a referência. Retorna um DataFrame por (grupo, feature)
+        com n, PSI, KS, % de nulos e o nível de deriva, ordenado pelo PSI.
+        """
+        linhas = []
+        with self._lock:
+            esbocos = list(self.esbocos.items())
+        for (grupo, feature), esboco in esbocos:
+            esboco_referencia = referencia.esbocos.get((grupo, feature))
+            if esboco_referencia is None or esboco.n < min_linhas:
+                continue
+            p_ref, p_atual = esboco_referencia.proporcoes(), esboco.proporcoes()
+            psi = calcular_psi(p_ref, p_atual)
+            linhas.append({
+                'grupo': grupo,
+                'feature': feature,
+                'n': esboco.n,
+                'psi': psi,
+                'ks': calcular_ks(p_ref, p_atual),
+                'nulos_pct': esboco.nulos / (esboco.n + esboco.nulos) * 100,
+                'deriva': 'alta' if psi >= LIMITE_PSI_ALTO else 'moderada' if psi >= LIMITE_PSI_MODERADO else 'estável',
+            })
+        colunas = ['grupo', 'feature', 'n', 'psi', 'ks', 'nulos_pct', 'deriva']
+        if not linhas:
+            return pd.DataFrame(columns=colunas)
+        return pd.DataFrame(linhas, columns=colunas).sort_values('psi', ascending=False, ignore_index=True)
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        del estado['_lock']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+
+def main():
+    import argparse
+    import joblib
+    from gembaguard.esquema import carregar_esquema
+    from gembaguard.features import montar_matriz_features
+
+    parser = argparse.ArgumentParser(description="Verifica a deriva de um CSV em relação à referência de treino.")
+    parser.add_argument('arquivos', nargs='+', help="CSVs a verificar (lidos em blocos).")
+    parser.add_argument('--referencia', default='3_referencia_deriva.pkl')
+    parser.add_argument('--tamanho-bloco', type=int, default=100_000)
+    parser.add_argument('--esquema', help="Esquema de entrada (JSON) com aliases de colunas e unidades.")
+    parser.add_argument('--top', type=int, default=15, help="Quantas combinações (grupo, feature) mostrar.")
+    args = parser.parse_args()
+
+    referencia = joblib.load(args.referencia)
+    esquema = carregar_esquema(args.esquema)
+    monitor = referencia.novo_monitor()
+    silencioso = lambda *a, **k: None
+
+    print("--- MONITOR DE DERIVA ---")
+    for arquivo in args.arquivos:
+        for bloco in esquema.ler_csv(arquivo, tamanho_bloco=args.tamanho_bloco):
+            with contextlib.redirect_stdout(io.StringIO()):
+                X, _ = montar_matriz_features(bloco, referencia.features, avisar=silencioso, erro=silencioso)
+            monitor.atualizar(
+                pd.DataFrame(X, columns=referencia.features, copy=False), bloco.get(referencia.coluna_grupo)
+            )
+        print(f"   -> '{arquivo}' processado. Linhas acumuladas: {monitor.linhas:,}")
+
+    relatorio = monitor.comparar(referencia)
+    print(relatorio.head(args.top).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print(f"\nDeriva alta em {int((relatorio['deriva'] == 'alta').sum())} de {len(relatorio)} combinações (grupo, feature).")
+
+
+if __name__ == "__main__":
+    main()
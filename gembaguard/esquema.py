@@ -0,0 +1,195 @@
+"""
+Adaptador de entrada: colunas de origem -> as sete colunas canônicas.
+
+Exportações de historiadores e de outras fontes chegam com cabeçalhos
+diferentes (ex.: "Air temperature [K]", "TempAr_C") e às vezes em outras
+unidades. Um esquema em JSON declara, por coluna de origem, a coluna
+canônica de destino, a unidade e o dtype:
+
+    {
+      "colunas": {
+        "TempAr_C": {"destino": "temperatura_ar", "unidade": "C", "tipo": "float64"},
+        "Tipo Maquina": {"destino": "tipo", "tipo": "category"}
+      },
+      "descartar_outras": false
+    }
+
+O esquema é compilado uma vez (`AdaptadorEntrada`) em: dtypes e colunas
+para o `read_csv` (o parse já sai no tipo certo e colunas descartadas nem
+são lidas), um rename e uma tabela de conversões lineares (fator,
+deslocamento). Cada bloco lido recebe só o rename (metadados) e uma operação
+vetorizada por coluna convertida, então uma fonte diferente não custa
+passadas extras sobre o DataFrame inteiro. As colunas canônicas são sempre
+aceitas com o próprio nome e na unidade canônica.
+"""
+
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+# Coluna canônica -> unidade em que os modelos foram treinados
+UNIDADES_CANONICAS = {
+    'temperatura_ar': 'K',
+    'temperatura_processo': 'K',
+    'umidade_relativa': '%',
+    'velocidade_rotacional': 'rpm',
+    'torque': 'Nm',
+    'desgaste_da_ferramenta': 'min',
+    'tipo': None,
+}
+
+# (unidade de origem, unidade canônica) -> (fator, deslocamento): canônica = origem * fator + deslocamento
+CONVERSOES = {
+    ('C', 'K'): (1.0, 273.15),
+    ('F', 'K'): (5 / 9, 273.15 - 32 * 5 / 9),
+    ('fracao', '%'): (100.0, 0.0),
+    ('rad/s', 'rpm'): (60 / (2 * math.pi), 0.0),
+    ('Hz', 'rpm'): (60.0, 0.0),
+    ('kNm', 'Nm'): (1000.0, 0.0),
+    ('s', 'min'): (1 / 60, 0.0),
+    ('h', 'min'): (60.0, 0.0),
+}
+
+# Cabeçalhos do dataset AI4I original e os nomes longos das falhas no bootcamp_train.csv
+ESQUEMA_PADRAO = {
+    'colunas': {
+        'UDI': {'destino': 'id'},
+        'Product ID': {'destino': 'id_produto'},
+        'Type': {'destino': 'tipo'},
+        'Air temperature [K]': {'destino': 'temperatura_ar', 'unidade': 'K'},
+        'Process temperature [K]': {'destino': 'temperatura_processo', 'unidade': 'K'},
+        'Rotational speed [rpm]': {'destino': 'velocidade_rotacional', 'unidade': 'rpm'},
+        'Torque [Nm]': {'destino': 'torque', 'unidade': 'Nm'},
+        'Tool wear [min]': {'destino': 'desgaste_da_ferramenta', 'unidade': 'min'},
+        'FDF (Falha Desgaste Ferramenta)': {'destino': 'FDF'},
+        'FDC (Falha Dissipacao Calor)': {'destino': 'FDC'},
+        'FP (Falha Potencia)': {'destino': 'FP'},
+        'FTE (Falha Tensao Excessiva)': {'destino': 'FTE'},
+        'FA (Falha Aleatoria)': {'destino': 'FA'},
+    },
+    'descartar_outras': False,
+}
+
+
+class AdaptadorEntrada:
+    """Esquema de entrada compilado. Use `carregar_esquema` para criar a partir de um arquivo."""
+
+    def __init__(self, esquema):
+        self.descartar_outras = esquema.get('descartar_outras', False)
+        self.origens = {}      # coluna de origem -> destino, na ordem de prioridade
+        self.dtypes = {}       # coluna de origem -> dtype do parse
+        self.conversoes = {}   # coluna de origem -> (fator, deslocamento)
+
+        for origem, regra in esquema.get('colunas', {}).items():
+            destino = regra['destino']
+            self.origens[origem] = destino
+            if regra.get('tipo'):
+                self.dtypes[origem] = regra['tipo']
+            unidade = regra.get('unidade')
+            canonica = UNIDADES_CANONICAS.get(destino)
+            if unidade and canonica and unidade != canonica:
+                if (unidade, canonica) not in CONVERSOES:
+                    raise ValueError(f"Conversão de '{unidade}' para '{canonica}' ({origem} -> {destino}) não suportada")
+                self.conversoes[origem] = CONVERSOES[(unidade, canonica)]
+
+        # O nome canônico é sempre aceito (menor prioridade que as origens declaradas)
+        for destino in list(UNIDADES_CANONICAS) + sorted(set(self.origens.values())):
+            self.origens.setdefault(destino, destino)
+
+        self._planos = {}
+
+    def _plano(self, colunas):
+        """Rename e conversões para um cabeçalho (calculado uma vez por cabeçalho)."""
+        chave = tuple(colunas)
+        if chave not in self._planos:
+            renomear, conversoes, avisos, destinos = {}, [], [], {}
+            for origem, destino in self.origens.items():
+                if origem not in colunas:
+                    continue
+                if destino in destinos:
+                    avisos.append(f"'{origem}' ignorada: '{destino}' já vem de '{destinos[destino]}'")
+                    continue
+                destinos[destino] = origem
+                if origem != destino:
+                    renomear[origem] = destino
+                if origem in self.conversoes:
+                    conversoes.append((destino, *self.conversoes[origem]))
+            # Uma coluna que não foi escolhida não pode ficar com o nome de um destino
+            descartar = [origem for origem in colunas if origem in self.origens and destinos.get(self.origens[origem]) != origem]
+            self._planos[chave] = (renomear, conversoes, descartar, avisos)
+        return self._planos[chave]
+
+    def colunas_lidas(self, coluna):
+        """Filtro de `usecols`: com `descartar_outras`, só as colunas do esquema são lidas."""
+        return not self.descartar_outras or coluna in self.origens
+
+    def aplicar(self, df):
+        """
+        Renomeia e converte um bloco já lido (altera e retorna o próprio `df`).
+        Quando algo é mapeado, a descrição fica em `df.attrs['mapeamento_entrada']`.
+        """
+        mapeamento = self.descrever(df.columns)
+        renomear, conversoes, descartar, _ = self._plano(df.columns)
+        if descartar:
+            df.drop(columns=descartar, inplace=True)
+        if renomear:
+            df.rename(columns=renomear, inplace=True)
+        for destino, fator, deslocamento in conversoes:
+            valores = df[destino].to_numpy()
+            if not np.issubdtype(valores.dtype, np.floating):
+                valores = pd.to_numeric(df[destino], errors='coerce').to_numpy(dtype=np.float64)
+            df[destino] = valores * valores.dtype.type(fator) + valores.dtype.type(deslocamento)
+        if mapeamento:
+            df.attrs['mapeamento_entrada'] = mapeamento
+        return df
+
+    def descrever(self, colunas):
+        """Linhas legíveis do mapeamento aplicado a um cabeçalho (para exibir ao usuário)."""
+        renomear, conversoes, _, avisos = self._plano(colunas)
+        convertidas = {destino for destino, _, _ in conversoes}
+        linhas = []
+        for origem, destino in renomear.items():
+            texto = f"'{origem}' → {destino}"
+            if destino in convertidas:
+                texto += f" (convertida para {UNIDADES_CANONICAS[destino]})"
+            linhas.append(texto)
+        for destino in sorted(convertidas - set(renomear.values())):
+            linhas.append(f"{destino} convertida para {UNIDADES_CANONICAS[destino]}")
+        return linhas + avisos
+
+    def dtypes_leitura(self, dtype_float=None):
+        """
+        Dtypes do `read_csv`. Com `dtype_float` (ex.: np.float32), as colunas
+        de medição (as que têm unidade canônica) e as declaradas como float no
+        esquema já são parseadas nesse tipo.
+        """
+        if dtype_float is None:
+            return self.dtypes
+        dtypes = {origem: dtype_float for origem, destino in self.origens.items() if UNIDADES_CANONICAS.get(destino)}
+        for origem, tipo in self.dtypes.items():
+            dtypes[origem] = dtype_float if str(tipo).startswith('float') else tipo
+        return dtypes
+
+    def ler_csv(self, fonte, tamanho_bloco=None, dtype_float=None, **kwargs):
+        """
+        Lê um CSV já no formato canônico. Com `tamanho_bloco`, retorna um
+        iterador de blocos (cada um adaptado ao ser lido). `dtype_float`: ver
+        `dtypes_leitura`.
+        """
+        leitor = pd.read_csv(
+            fonte, dtype=self.dtypes_leitura(dtype_float) or None,
+            usecols=self.colunas_lidas if self.descartar_outras else None, chunksize=tamanho_bloco, **kwargs
+        )
+        if tamanho_bloco is None:
+            return self.aplicar(leitor)
+        return (self.aplicar(bloco) for bloco in leitor)
+
+
+def carregar_esquema(caminho=None):
+    """Compila o esquema de um arquivo JSON (sem caminho: ESQUEMA_PADRAO)."""
+    if caminho is None:
+        return AdaptadorEntrada(ESQUEMA_PADRAO)
+    with open(caminho, encoding='utf-8') as f:
+        return AdaptadorEntrada(json.load(f))
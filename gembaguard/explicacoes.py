@@ -0,0 +1,172 @@
+"""
+Explicações por linha (atribuição de cada feature à probabilidade prevista).
+
+Todas as contribuições estão em unidades de probabilidade: somadas ao valor
+base, dão a probabilidade positiva prevista, e o formato 'feature (+0.123)'
+significa o mesmo para qualquer modelo.
+
+Para florestas do scikit-learn a atribuição é a de Saabas (pelo caminho de
+decisão), não TreeSHAP: toda vez que a amostra desce de um nó para um
+filho, a variação da probabilidade positiva é creditada à feature usada no
+split. A soma das contribuições com o valor base (média da raiz das
+árvores) é exatamente a probabilidade prevista. Como a contribuição só depende da folha alcançada,
+ela é pré-calculada uma vez por folha; explicar um lote se resume a um
+`apply` (folha de cada árvore) seguido de uma soma de vetores.
+
+Para LightGBM e XGBoost é usado o TreeSHAP nativo das bibliotecas
+(`pred_contrib`/`pred_contribs`), que sai em log-odds (margem). Cada linha
+é convertida para probabilidade por um fator único, (sigmoid(margem) -
+sigmoid(base)) / (margem - base): sinais e ordem das features não mudam e a
+soma passa a ser a variação de probabilidade em relação à base.
+"""
+
+import weakref
+
+import numpy as np
+
+from gembaguard.multilabel import ProbabilidadeTarget
+
+_contribuicoes_por_modelo = weakref.WeakKeyDictionary()
+
+
+def _indice_classe_positiva(classes):
+    positivos = np.flatnonzero(np.asarray(classes) == 1)
+    return positivos[0] if len(positivos) else None
+
+
+def _contribuicoes_por_no(tree, n_features, indice_saida, indice_classe):
+    """Matriz (n_nós x n_features) com a contribuição acumulada da raiz até cada nó."""
+    valores = tree.value[:, indice_saida, :]
+    valores = valores / np.maximum(valores.sum(axis=1, keepdims=True), 1e-12)
+    prob = valores[:, indice_classe]
+
+    acumulado = np.zeros((tree.node_count, n_features), dtype=np.float32)
+    nivel = np.array([0])
+    while len(nivel):
+        nivel = nivel[tree.children_left[nivel] >= 0]
+        for filhos in (tree.children_left[nivel], tree.children_right[nivel]):
+            acumulado[filhos] = acumulado[nivel]
+            acumulado[filhos, tree.feature[nivel]] += prob[filhos] - prob[nivel]
+        nivel = np.concatenate([tree.children_left[nivel], tree.children_right[nivel]])
+    return acumulado, prob[0]
+
+
+def _preparar_floresta(floresta, indice_saida):
+    """Pré-calcula as contribuições por nó de todas as árvores (cacheado por modelo e saída)."""
+    por_saida = _contribuicoes_por_modelo.setdefault(floresta, {})
+    if indice_saida in por_saida:
+        return por_saida[indice_saida]
+
+    classes = floresta.classes_[indice_saida] if isinstance(floresta.classes_, list) else floresta.classes_
+    indice_classe = _indice_classe_positiva(classes)
+    if indice_classe is None:
+        por_saida[indice_saida] = None
+        return None
+
+    estimadores = getattr(floresta, 'estimators_', [floresta])
+    tabelas, bases = [], []
+    for arvore in estimadores:
+        tabela, base = _contribuicoes_por_no(
+            arvore.tree_, floresta.n_features_in_, indice_saida, indice_classe
+        )
+        tabelas.append(tabela / len(estimadores))
+        bases.append(base)
+
+    # Todas as árvores em uma única tabela; offsets convertem (árvore, nó) em linha
+    offsets = np.cumsum([0] + [len(t) for t in tabelas[:-1]])
+    preparado = (np.concatenate(tabelas), offsets, float(np.mean(bases)))
+    por_saida[indice_saida] = preparado
+    return preparado
+
+
+def _contribuicoes_floresta(floresta, X, indice_saida, tamanho_lote):
+    preparado = _preparar_floresta(floresta, indice_saida)
+    if preparado is None:
+        return 0.0, np.zeros(X.shape, dtype=np.float64)
+    tabela, offsets, base = preparado
+
+    contribuicoes = np.empty(X.shape, dtype=np.float64)
+    for inicio in range(0, len(X), tamanho_lote):
+        lote = X[inicio:inicio + tamanho_lote]
+        folhas = floresta.apply(lote).reshape(len(lote), -1) + offsets
+        contribuicoes[inicio:inicio + len(lote)] = tabela[folhas].sum(axis=1)
+    return base, contribuicoes
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _contribuicoes_margem_para_probabilidade(saida):
+    """
+    Converte a saída de `pred_contrib` (contribuições em log-odds + base na
+    última coluna) em (base, contribuições) em unidades de probabilidade.
+    """
+    saida = np.asarray(saida, dtype=np.float64)
+    contribuicoes, base = saida[:, :-1], saida[:, -1]
+    delta_margem = contribuicoes.sum(axis=1)
+    p_base = _sigmoid(base)
+    # Margem quase igual à base: o fator é a derivada da sigmoide na base
+    pequeno = np.abs(delta_margem) < 1e-9
+    fator = np.where(
+        pequeno, p_base * (1 - p_base),
+        (_sigmoid(base + delta_margem) - p_base) / np.where(pequeno, 1.0, delta_margem),
+    )
+    return float(p_base[0]), contribuicoes * fator[:, None]
+
+
+def explicar_predicoes(modelo, X, tamanho_lote=1000):
+    """
+    Retorna (valor_base, contribuicoes) para as linhas de X, com
+    `contribuicoes` no formato (n_linhas, n_features), ambos em unidades de
+    probabilidade (ver o docstring do módulo). Retorna None para
+    modelos sem suporte (ex.: stacking e ClassifierChain).
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if len(X) == 0:
+        return 0.0, np.zeros(X.shape, dtype=np.float64)
+
+    if isinstance(modelo, ProbabilidadeTarget):
+        estimador = modelo.modelo.estimador
+        target = modelo.modelo.targets[modelo.indice]
+        if not hasattr(estimador, 'estimators_') or target not in modelo.modelo.targets_treinados:
+            return None
+        return _contribuicoes_floresta(
+            estimador, X, modelo.modelo.targets_treinados.index(target), tamanho_lote
+        )
+
+    if hasattr(modelo, 'tree_') or (hasattr(modelo, 'estimators_') and hasattr(modelo, 'apply')):
+        return _contribuicoes_floresta(modelo, X, 0, tamanho_lote)
+
+    nome_classe = type(modelo).__name__
+    if nome_classe == 'ModeloBooster':
+        return _contribuicoes_margem_para_probabilidade(modelo.booster.predict(X, pred_contrib=True))
+    if nome_classe == 'LGBMClassifier':
+        return _contribuicoes_margem_para_probabilidade(modelo.predict(X, pred_contrib=True))
+    if nome_classe == 'XGBClassifier':
+        import xgboost as xgb
+        saida = modelo.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+        return _contribuicoes_margem_para_probabilidade(saida)
+
+    return None
+
+
+def principais_contribuicoes(contribuicoes, features, k=3):
+    """
+    Formata as k features com maior contribuição positiva de cada linha
+    como 'feature (+0.123)'. Usa argpartition para não ordenar todas as colunas.
+    """
+    k = min(k, contribuicoes.shape[1])
+    if k == 0 or len(contribuicoes) == 0:
+        return [''] * len(contribuicoes)
+
+    top = np.argpartition(-contribuicoes, k - 1, axis=1)[:, :k]
+    valores_top = np.take_along_axis(contribuicoes, top, axis=1)
+    ordem = np.argsort(-valores_top, axis=1)
+    top = np.take_along_axis(top, ordem, axis=1)
+    valores_top = np.take_along_axis(valores_top, ordem, axis=1)
+
+    return [
+        '; '.join(f"{features[j]} ({v:+.3f})" for j, v in zip(linha, valores) if v > 0)
+        for linha, valores in zip(top, valores_top)
+    ]
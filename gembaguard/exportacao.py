@@ -0,0 +1,115 @@
+"""
+Exportação dos resultados em formatos para análise.
+
+As probabilidades são exportadas como float32 e os alertas como booleanos;
+a formatação ("12.3%", "🚨 ALERTA") fica só na tela do app. A escrita é
+feita em blocos (row groups no Parquet, lotes no CSV), então o resultado
+formatado nunca é montado inteiro em memória como texto.
+
+Formatos: 'parquet', 'csv', 'csv.gz' e 'csv.zst' (compressão via pyarrow).
+"""
+
+import io
+import itertools
+
+import numpy as np
+import pandas as pd
+
+FORMATOS = {
+    # formato: (extensão, mime)
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'csv.zst': ('.csv.zst', 'application/zstd'),
+}
+
+_COMPRESSAO_CSV = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}
+
+
+def montar_resultado(df, df_predictions, limite_alerta=0.5, extras=None):
+    """
+    Junta os dados originais com `prob_<target>` (float32) e `alerta_<target>`
+    (bool). `extras` é um dict opcional de colunas adicionais (ex.: fatores).
+    """
+    colunas = {}
+    for target in df_predictions.columns:
+        probabilidades = df_predictions[target].to_numpy(dtype=np.float32)
+        colunas[f'prob_{target}'] = probabilidades
+        colunas[f'alerta_{target}'] = probabilidades > limite_alerta
+    colunas.update(extras or {})
+    return pd.concat([df, pd.DataFrame(colunas, index=df.index)], axis=1)
+
+
+def mascara_alertas(resultado):
+    """Linhas com alerta em pelo menos um target."""
+    colunas = [col for col in resultado.columns if col.startswith('alerta_')]
+    return resultado[colunas].to_numpy().any(axis=1)
+
+
+def _completar_schema(df, schema):
+    """
+    Colunas só com nulos no primeiro bloco saem com tipo `null`; o tipo é
+    inferido dos valores não nulos do DataFrame inteiro (só dessa coluna).
+    """
+    import pyarrow as pa
+
+    for i, campo in enumerate(schema):
+        if pa.types.is_null(campo.type):
+            valores = df[campo.name].dropna()
+            if len(valores):
+                schema = schema.set(i, campo.with_type(pa.array(valores, from_pandas=True).type))
+    return schema
+
+
+def exportar(df, destino, formato='parquet', tamanho_bloco=100_000):
+    """
+    Escreve `df` em `destino` (caminho ou arquivo binário) em blocos de
+    `tamanho_bloco` linhas.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato '{formato}' não suportado. Use um de: {', '.join(FORMATOS)}")
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    # O schema vem do primeiro bloco com dados: em um recorte vazio, colunas
+    # object (strings no pandas 2) seriam inferidas como `null`
+    primeiro = pa.Table.from_pandas(df.iloc[:tamanho_bloco], preserve_index=False)
+    schema = _completar_schema(df, primeiro.schema)
+    lotes = itertools.chain(
+        [primeiro.cast(schema)] if len(primeiro) else [],
+        (
+            pa.Table.from_pandas(df.iloc[inicio:inicio + tamanho_bloco], schema=schema, preserve_index=False)
+            for inicio in range(tamanho_bloco, len(df), tamanho_bloco)
+        ),
+    )
+
+    if formato == 'parquet':
+        with pq.ParquetWriter(destino, schema, compression='zstd') as escritor:
+            for lote in lotes:
+                escritor.write_table(lote)
+        return destino
+
+    compressao = _COMPRESSAO_CSV[formato]
+    saida = pa.output_stream(destino, compression=compressao) if compressao else pa.output_stream(destino)
+    with saida, pa_csv.CSVWriter(saida, schema) as escritor:
+        for lote in lotes:
+            escritor.write_table(lote)
+    return destino
+
+
+class _BufferAberto(io.BytesIO):
+    """BytesIO que continua legível depois que o escritor do Arrow fecha o stream."""
+
+    def close(self):
+        pass
+
+
+def exportar_bytes(df, formato='parquet', tamanho_bloco=100_000):
+    """Versão em memória de `exportar` (para o download do app). Retorna (bytes, extensão, mime)."""
+    # Escreve direto no BytesIO: o getvalue() devolve o próprio buffer, sem a
+    # segunda cópia que um buffer do Arrow exigiria para virar bytes
+    buffer = _BufferAberto()
+    exportar(df, buffer, formato, tamanho_bloco)
+    extensao, mime = FORMATOS[formato]
+    return buffer.getvalue(), extensao, mime
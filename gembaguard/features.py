@@ -0,0 +1,197 @@
+"""Engenharia de features usada na predição (app, deploy e warm-up)."""
+
+import numpy as np
+
+
+def verificar_colunas_necessarias(df):
+    """Verifica quais colunas básicas estão disponíveis no dataset."""
+    colunas_basicas = [
+        'temperatura_ar', 'temperatura_processo', 'umidade_relativa', 
+        'velocidade_rotacional', 'torque', 'desgaste_da_ferramenta', 'tipo'
+    ]
+    
+    colunas_presentes = []
+    colunas_faltando = []
+    
+    for col in colunas_basicas:
+        if col in df.columns:
+            colunas_presentes.append(col)
+        else:
+            colunas_faltando.append(col)
+    
+    return colunas_presentes, colunas_faltando
+
+def _features_derivadas(df, avisar=print):
+    """
+    Gera (nome, valores) de cada feature derivada, na ordem em que são criadas,
+    lendo apenas as colunas de `df` (sem copiar o DataFrame).
+    """
+    criadas = {}
+
+    def coluna(nome):
+        return criadas[nome] if nome in criadas else df[nome]
+
+    def existe(nome):
+        return nome in criadas or nome in df.columns
+
+    def divisao_segura(numerador, denominador, default=0.001):
+        denominador_safe = np.where(denominador == 0, default, denominador)
+        return numerador / denominador_safe
+
+    def criar(nome, valores):
+        criadas[nome] = valores
+        return nome, valores
+
+    # Features que dependem de múltiplas colunas
+    if existe('torque') and existe('velocidade_rotacional'):
+        yield criar('potencia_estimada', coluna('torque') * coluna('velocidade_rotacional'))
+        yield criar('stress_mecanico', divisao_segura(coluna('torque'), coluna('velocidade_rotacional')) * 1000)
+
+    if existe('temperatura_processo') and existe('temperatura_ar'):
+        yield criar('delta_temperatura', coluna('temperatura_processo') - coluna('temperatura_ar'))
+
+        # Densidade de potência (se potência foi calculada)
+        if existe('potencia_estimada'):
+            yield criar('densidade_potencia', divisao_segura(coluna('potencia_estimada'), coluna('temperatura_ar')))
+
+    if existe('desgaste_da_ferramenta'):
+        yield criar('fadiga_ferramenta', np.power(coluna('desgaste_da_ferramenta') + 1, 1.2))
+
+        if existe('velocidade_rotacional'):
+            yield criar('taxa_desgaste', divisao_segura(coluna('desgaste_da_ferramenta'), coluna('velocidade_rotacional')))
+
+    if existe('delta_temperatura') and existe('umidade_relativa'):
+        yield criar('indice_calor', coluna('delta_temperatura') * (1 + coluna('umidade_relativa') / 100))
+
+    # Z-scores apenas para colunas que existem e se 'tipo' existe
+    if 'tipo' in df.columns:
+        features_base = ['temperatura_ar', 'temperatura_processo', 'umidade_relativa', 
+                       'velocidade_rotacional', 'torque', 'desgaste_da_ferramenta']
+
+        soma_quadrados = None
+        n_zscores = 0
+        for feature in features_base:
+            if feature in df.columns:
+                try:
+                    grupos = df[feature].groupby(df['tipo'])
+                    media_por_tipo = grupos.transform('mean')
+                    std_por_tipo = grupos.transform('std')
+                    std_por_tipo = np.where(std_por_tipo == 0, 1, std_por_tipo)
+                    zscore = (df[feature] - media_por_tipo) / std_por_tipo
+                except Exception as e:
+                    print(f"Erro ao calcular z-score para {feature}: {e}")
+                    continue
+                yield f'{feature}_zscore', zscore
+                quadrado = np.nan_to_num(zscore.to_numpy(dtype=np.float64) ** 2)
+                soma_quadrados = quadrado if soma_quadrados is None else soma_quadrados + quadrado
+                n_zscores += 1
+
+        # Índice de anomalia baseado nos z-scores calculados
+        if n_zscores:
+            yield 'indice_anomalia', np.sqrt(soma_quadrados / n_zscores)
+    else:
+        avisar("⚠️ Coluna 'tipo' não encontrada. Z-scores e índice de anomalia não serão calculados.")
+
+
+def criar_features_avancadas_robusta(df, avisar=print, erro=print):
+    """
+    Versão robusta da criação de features que lida com colunas ausentes.
+    As mensagens para o usuário vão para `avisar`/`erro` (no app, os alertas do Streamlit).
+    """
+    print("--- INICIANDO ENGENHARIA DE FEATURES ROBUSTA ---")
+    df_features = df.copy()
+    
+    # Verificar colunas disponíveis
+    colunas_presentes, colunas_faltando = verificar_colunas_necessarias(df)
+    
+    if colunas_faltando:
+        print(f"⚠️ Colunas não encontradas: {colunas_faltando}")
+        avisar(f"⚠️ Algumas colunas não foram encontradas: {', '.join(colunas_faltando)}")
+
+    try:
+        for nome, valores in _features_derivadas(df, avisar):
+            df_features[nome] = valores
+
+        print(f"✅ Engenharia de features concluída. Total de colunas: {df_features.shape[1]}")
+        print(f"Novas features criadas: {df_features.shape[1] - df.shape[1]}")
+        
+    except Exception as e:
+        print(f"❌ Erro durante a engenharia de features: {e}")
+        erro(f"Erro na engenharia de features: {e}")
+    
+    return df_features
+
+def valor_padrao(feature):
+    """Valor usado quando uma feature do modelo não pôde ser criada."""
+    if 'zscore' in feature:
+        return 0.0  # Z-score neutro
+    elif feature == 'indice_anomalia':
+        return 0.5  # Valor médio de anomalia
+    elif 'potencia' in feature:
+        return 1000.0  # Potência padrão
+    elif 'temperatura' in feature:
+        return 0.0  # Delta padrão
+    elif 'taxa' in feature or 'densidade' in feature:
+        return 1.0  # Razão padrão
+    elif 'fadiga' in feature:
+        return 1.0  # Fadiga mínima
+    elif 'stress' in feature:
+        return 100.0  # Stress padrão
+    elif 'indice_calor' in feature:
+        return 0.0  # Índice neutro
+    return 0.0  # Valor padrão genérico
+
+def preencher_features_faltando(df, features_necessarias, avisar=print):
+    """Preenche features que não puderam ser criadas com valores padrão."""
+    df_completo = df.copy()
+    
+    for feature in features_necessarias:
+        if feature not in df_completo.columns:
+            df_completo[feature] = valor_padrao(feature)
+            avisar(f"⚠️ Feature '{feature}' foi preenchida com valor padrão devido à ausência de dados necessários.")
+    
+    return df_completo
+
+def montar_matriz_features(df, features, avisar=print, erro=print, dtype=np.float64):
+    """
+    Caminho de predição sem cópias do DataFrame: escreve cada feature do
+    modelo direto em uma matriz (linhas x features) pré-alocada. Colunas de
+    `df` são copiadas uma vez para a matriz; as derivadas são calculadas a
+    partir delas e as que faltarem recebem o valor padrão.
+    Com `dtype=np.float32` a matriz já sai em float32 e ordem C, o formato
+    que as árvores do scikit-learn usam, então o predict_proba não faz a
+    cópia de conversão.
+    Retorna (matriz, features preenchidas com valor padrão).
+    """
+    print("--- INICIANDO ENGENHARIA DE FEATURES (MATRIZ) ---")
+    posicoes = {feature: j for j, feature in enumerate(features)}
+    dtype = np.dtype(dtype)
+    X = np.empty((len(df), len(features)), dtype=dtype, order='C' if dtype == np.float32 else 'F')
+    preenchidas = set(features)
+
+    colunas_presentes, colunas_faltando = verificar_colunas_necessarias(df)
+    if colunas_faltando:
+        print(f"⚠️ Colunas não encontradas: {colunas_faltando}")
+        avisar(f"⚠️ Algumas colunas não foram encontradas: {', '.join(colunas_faltando)}")
+
+    for feature in features:
+        if feature in df.columns:
+            X[:, posicoes[feature]] = df[feature].to_numpy(dtype=dtype)
+            preenchidas.discard(feature)
+
+    try:
+        for nome, valores in _features_derivadas(df, avisar):
+            if nome in posicoes:
+                X[:, posicoes[nome]] = valores
+                preenchidas.discard(nome)
+    except Exception as e:
+        print(f"❌ Erro durante a engenharia de features: {e}")
+        erro(f"Erro na engenharia de features: {e}")
+
+    preenchidas = [feature for feature in features if feature in preenchidas]
+    for feature in preenchidas:
+        X[:, posicoes[feature]] = valor_padrao(feature)
+        avisar(f"⚠️ Feature '{feature}' foi preenchida com valor padrão devido à ausência de dados necessários.")
+
+    print(f"✅ Matriz de features pronta: {X.shape[0]:,} linhas x {X.shape[1]} features")
+    return X, preenchidas
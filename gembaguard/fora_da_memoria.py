@@ -0,0 +1,165 @@
+"""
+Leitura fora da memória do dataset preparado para o treino da etapa 3.
+
+Um histórico de um ano de todas as linhas não cabe em um DataFrame. O
+dataset preparado é lido de um ou mais arquivos Parquet, um row group por
+vez, e só as colunas necessárias em cada passada:
+
+- targets: única passada que fica inteira em memória (n x 5 int8), usada
+  para o split estratificado, que devolve apenas índices;
+- features: o `StandardScaler` é ajustado com `partial_fit` bloco a bloco,
+  só com as linhas de treino;
+- LightGBM: `SequenciaParquet` entrega as linhas de treino já normalizadas
+  ao `lgb.Dataset`, que monta os bins a partir de uma amostra e depois
+  empurra os blocos para o formato binário interno. A matriz de treino
+  nunca existe em float64 inteira.
+"""
+
+import glob
+import numbers
+import os
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.preprocessing import StandardScaler
+
+from gembaguard.predicao import escalonar
+
+
+def listar_parquets(entradas):
+    """Aceita arquivos, diretórios (todos os *.parquet) ou padrões glob, em ordem."""
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            arquivos += sorted(glob.glob(os.path.join(entrada, '*.parquet')))
+        else:
+            arquivos += sorted(glob.glob(entrada)) or [entrada]
+    return arquivos
+
+
+class FonteParquet:
+    """Arquivos Parquet vistos como uma única tabela, com índice global de linhas por row group."""
+
+    def __init__(self, caminhos):
+        self.arquivos = [pq.ParquetFile(caminho) for caminho in caminhos]
+        self.blocos = [(i, g) for i, arquivo in enumerate(self.arquivos) for g in range(arquivo.num_row_groups)]
+        tamanhos = [self.arquivos[i].metadata.row_group(g).num_rows for i, g in self.blocos]
+        self.inicios = np.concatenate([[0], np.cumsum(tamanhos, dtype=np.int64)])
+        self.colunas = self.arquivos[0].schema_arrow.names
+
+    def __len__(self):
+        return int(self.inicios[-1])
+
+    def ler_bloco(self, k, colunas):
+        i, g = self.blocos[k]
+        return self.arquivos[i].read_row_group(g, columns=colunas).to_pandas()
+
+    def iterar(self, colunas):
+        """Gera (linha global inicial, bloco) para todos os row groups."""
+        for k in range(len(self.blocos)):
+            yield int(self.inicios[k]), self.ler_bloco(k, colunas)
+
+
+def ler_targets(fonte, targets):
+    """Matriz (n, n_targets) int8 com os rótulos de todas as linhas."""
+    y = np.empty((len(fonte), len(targets)), dtype=np.int8)
+    for inicio, bloco in fonte.iterar(targets):
+        y[inicio:inicio + len(bloco)] = bloco[targets].to_numpy(dtype=np.int8)
+    return y
+
+
+def dividir_por_indice(y, test_size=0.2, random_state=42):
+    """Split multi-label estratificado sobre os rótulos; retorna índices globais ordenados (treino, teste)."""
+    from iterstrat.ml_stratifiers import MultilabelStratifiedShuffleSplit
+
+    msss = MultilabelStratifiedShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+    # O split só usa os rótulos: X é um placeholder de uma coluna
+    idx_treino, idx_teste = next(msss.split(np.zeros((len(y), 1), dtype=np.int8), y))
+    return np.sort(idx_treino), np.sort(idx_teste)
+
+
+def ajustar_scaler(fonte, features, idx_treino, tamanho_amostra=200_000, coluna_grupo='tipo', random_state=42):
+    """
+    Ajusta o StandardScaler com as linhas de treino, bloco a bloco. Na mesma
+    passada guarda uma amostra aleatória das linhas de treino (features sem
+    normalizar + coluna de grupo), usada para definir as bordas do monitor
+    de deriva. Retorna (scaler, amostra).
+    """
+    em_treino = np.zeros(len(fonte), dtype=bool)
+    em_treino[idx_treino] = True
+    taxa = min(1.0, tamanho_amostra / max(len(idx_treino), 1))
+    rng = np.random.default_rng(random_state)
+
+    colunas = features + ([coluna_grupo] if coluna_grupo in fonte.colunas else [])
+    scaler = StandardScaler()
+    amostras = []
+    for inicio, bloco in fonte.iterar(colunas):
+        mascara = em_treino[inicio:inicio + len(bloco)]
+        if not mascara.any():
+            continue
+        treino = bloco[mascara]
+        scaler.partial_fit(treino[features])
+        amostras.append(treino[rng.random(len(treino)) < taxa])
+    amostra = pd.concat(amostras, ignore_index=True) if amostras else pd.DataFrame(columns=colunas)
+    return scaler, amostra
+
+
+def acumular_referencia(fonte, referencia, features, idx_treino):
+    """Acumula todas as linhas de treino (sem normalizar) no monitor de deriva de referência."""
+    em_treino = np.zeros(len(fonte), dtype=bool)
+    em_treino[idx_treino] = True
+    colunas = features + ([referencia.coluna_grupo] if referencia.coluna_grupo in fonte.colunas else [])
+    for inicio, bloco in fonte.iterar(colunas):
+        mascara = em_treino[inicio:inicio + len(bloco)]
+        if mascara.any():
+            referencia.atualizar(bloco[mascara])
+    return referencia
+
+
+class SequenciaParquet(lgb.Sequence):
+    """
+    Linhas `linhas` (índices globais ordenados) de uma FonteParquet,
+    normalizadas com `scaler`, como uma `lgb.Sequence`. O LightGBM lê em
+    ordem, então só o row group corrente fica em memória.
+    """
+
+    def __init__(self, fonte, features, linhas, scaler=None, batch_size=None):
+        self.fonte = fonte
+        self.features = list(features)
+        self.linhas = np.asarray(linhas, dtype=np.int64)
+        self.scaler = scaler
+        self.bloco_da_linha = np.searchsorted(fonte.inicios, self.linhas, side='right') - 1
+        self.batch_size = batch_size or int(np.diff(fonte.inicios).max(initial=1))
+        self._cache = (None, None)
+
+    def __len__(self):
+        return len(self.linhas)
+
+    def _bloco(self, k):
+        if self._cache[0] != k:
+            X = self.fonte.ler_bloco(k, self.features)[self.features].to_numpy(dtype=np.float64, copy=True)
+            if self.scaler is not None:
+                X = escalonar(self.scaler, X)
+            self._cache = (k, X)
+        return self._cache[1]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, numbers.Integral):
+            k = self.bloco_da_linha[idx]
+            return self._bloco(k)[self.linhas[idx] - self.fonte.inicios[k]]
+        if isinstance(idx, slice):
+            inicio, fim, passo = idx.indices(len(self))
+            linhas = self.linhas[inicio:fim:passo]
+            blocos = self.bloco_da_linha[inicio:fim:passo]
+            partes = [
+                self._bloco(k)[linhas[blocos == k] - self.fonte.inicios[k]]
+                for k in pd.unique(blocos)
+            ]
+            return np.vstack(partes) if partes else np.empty((0, len(self.features)))
+        raise TypeError(f"Índice não suportado: {type(idx).__name__}")
+
+    def para_dataframe(self):
+        """Materializa as linhas (ex.: o conjunto de teste, já limitado) como DataFrame indexado pela linha global."""
+        return pd.DataFrame(self[:], columns=self.features, index=pd.Index(self.linhas, name='linha'))
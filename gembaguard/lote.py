@@ -0,0 +1,196 @@
+"""
+Pontuação em lote de vários CSVs (um por linha de produção por turno).
+
+Os arquivos são distribuídos em um pool de processos. Cada worker carrega
+modelos e scaler uma única vez (no initializer) e roda o mesmo caminho do app
+(`montar_matriz_features` -> scaler -> modelos).
+Cada arquivo gera seu próprio arquivo de resultados (CSV, CSV comprimido ou
+Parquet); ao final, um resumo por arquivo, um arquivo único com todos os
+alertas e a fila de manutenção por máquina (os workers devolvem o estado do
+`AgregadorMaquinas` de cada arquivo, combinado aqui). Um arquivo com erro é
+reportado no resumo e não interrompe os demais.
+
+Com uma versão em sombra, cada worker também carrega os artefatos dela e
+os pontua em uma thread enquanto a versão principal processa o arquivo; a
+comparação de cada arquivo volta para o processo principal, que grava o
+log da sombra (ver `gembaguard.sombra`).
+
+As métricas (ver `gembaguard.metricas`) de cada arquivo são observadas no
+worker e devolvidas junto com o resumo; o processo principal as soma ao
+próprio registro.
+"""
+
+import contextlib
+import glob
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gembaguard.deduplicacao import CacheResultados
+from gembaguard.esquema import carregar_esquema
+from gembaguard.exportacao import FORMATOS, exportar, montar_resultado, mascara_alertas
+from gembaguard.maquinas import AgregadorMaquinas
+from gembaguard.metricas import drenar_metricas, incorporar_metricas, registrar_alertas
+from gembaguard.predicao import pontuar_dataframe
+from gembaguard.sombra import ComparadorSombra, anexar_log, carregar_artefatos
+
+_artefatos = {}
+
+
+def listar_arquivos(entrada):
+    """Aceita um diretório (todos os *.csv) ou um padrão glob."""
+    if os.path.isdir(entrada):
+        return sorted(str(p) for p in Path(entrada).glob('*.csv'))
+    return sorted(glob.glob(entrada, recursive=True))
+
+
+def _limitar_threads(modelos):
+    # Com um processo por núcleo, threads internas dos modelos só disputam CPU
+    for modelo in modelos.values():
+        if hasattr(modelo, 'get_params') and 'n_jobs' in modelo.get_params(deep=False):
+            modelo.set_params(n_jobs=1)
+
+
+def inicializar_worker(caminho_modelos, caminho_scaler, caminho_esquema=None, float32=False, sombra=None,
+                       max_cache=0):
+    """
+    Initializer do pool: carrega o bundle e compila o esquema de entrada uma
+    vez por processo. Com `float32`, leitura, features e normalização ficam
+    em float32. `sombra`: diretório com os artefatos de uma versão pontuada
+    em sombra. `max_cache` > 0: cache de resultados (LRU) compartilhado pelos
+    arquivos do worker.
+    """
+    import joblib
+
+    # Com fork, o worker herda as métricas já acumuladas pelo processo principal
+    drenar_metricas()
+    bundle = joblib.load(caminho_modelos)
+    _limitar_threads(bundle['modelos'])
+    dtype = np.float32 if float32 else np.float64
+    _artefatos.update(
+        modelos=bundle['modelos'],
+        features=bundle['features'],
+        scaler=joblib.load(caminho_scaler),
+        esquema=carregar_esquema(caminho_esquema),
+        dtype=dtype,
+        sombra=None,
+        cache=CacheResultados(max_cache) if max_cache > 0 else None,
+    )
+    if sombra is not None:
+        versao_sombra = carregar_artefatos(sombra)
+        _limitar_threads(versao_sombra['modelos'])
+        _artefatos['sombra'] = ComparadorSombra(versao_sombra, dtype=dtype)
+
+
+def pontuar_arquivo(caminho, dir_saida, limite_alerta=0.5, formato='csv', versao_primaria=None):
+    """
+    Pontua um CSV e grava `<nome>_pontuado.<formato>`. Nunca levanta: erros
+    vão no resumo. Retorna (resumo, alertas, agregador, registro da sombra ou
+    None, métricas observadas neste arquivo).
+    """
+    inicio = time.perf_counter()
+    resumo = {'arquivo': caminho, 'linhas': 0, 'segundos': None, 'erro': None, 'pid': os.getpid()}
+    avisos = []
+    agregador = None
+    comparador, futuro_sombra, registro_sombra = _artefatos['sombra'], None, None
+    try:
+        dtype = _artefatos['dtype']
+        df = _artefatos['esquema'].ler_csv(caminho, dtype_float=np.float32 if dtype == np.float32 else None)
+        if comparador is not None:
+            futuro_sombra = comparador.pontuar(df)
+        estatisticas = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            probabilidades = pontuar_dataframe(
+                df, _artefatos['modelos'], _artefatos['scaler'], _artefatos['features'], avisar=avisos.append,
+                dtype=dtype, cache=_artefatos['cache'], estatisticas=estatisticas, registrar_metricas=True
+            )
+            registrar_alertas(probabilidades, limite_alerta)
+
+        resultado = montar_resultado(df, probabilidades, limite_alerta)
+        saida = Path(dir_saida) / f"{Path(caminho).stem}_pontuado{FORMATOS[formato][0]}"
+        exportar(resultado, str(saida), formato)
+
+        em_alerta = probabilidades > limite_alerta
+        alertas = resultado[mascara_alertas(resultado)].copy()
+        alertas.insert(0, 'arquivo', Path(caminho).name)
+        if 'id_produto' in df.columns:
+            agregador = AgregadorMaquinas(probabilidades.columns, limite_alerta)
+            agregador.atualizar(df, probabilidades)
+        resumo.update(
+            linhas=len(df),
+            saida=str(saida),
+            alertas=int(em_alerta.any(axis=1).sum()),
+            avisos=len(avisos),
+            linhas_unicas=estatisticas['unicas'],
+            linhas_cache=estatisticas['do_cache'],
+            **{f'alertas_{target}': int(n) for target, n in em_alerta.sum().items()},
+        )
+        resumo['segundos'] = time.perf_counter() - inicio
+        if futuro_sombra is not None:
+            registro_sombra = comparador.comparar(
+                futuro_sombra, probabilidades, lote=Path(caminho).name, versao_primaria=versao_primaria, esperar=True
+            )
+            resumo['segundos_sombra'] = registro_sombra.get('segundos_sombra')
+    except Exception as e:
+        alertas = None
+        resumo['erro'] = f"{type(e).__name__}: {e}"
+        resumo['segundos'] = time.perf_counter() - inicio
+    return resumo, alertas, agregador, registro_sombra, drenar_metricas()
+
+
+def pontuar_lote(arquivos, caminho_modelos, caminho_scaler, dir_saida, n_jobs=None, limite_alerta=0.5, formato='csv',
+                 caminho_esquema=None, float32=False, sombra=None, caminho_log_sombra=None, versao_primaria=None,
+                 max_cache=0):
+    """
+    Pontua `arquivos` em `n_jobs` processos (padrão: todos os núcleos).
+    Retorna (resumo por arquivo, alertas de todos os arquivos, fila de
+    manutenção por máquina, segundos totais). As métricas dos workers são
+    somadas às deste processo. Com `sombra` (ver
+    `inicializar_worker`), a comparação de cada arquivo é acrescentada a
+    `caminho_log_sombra`. `max_cache`: ver `inicializar_worker`.
+    """
+    Path(dir_saida).mkdir(parents=True, exist_ok=True)
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(arquivos)))
+
+    inicio = time.perf_counter()
+    resumos, alertas, agregadores = [], [], {}
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=inicializar_worker, initargs=(caminho_modelos, caminho_scaler, caminho_esquema, float32, sombra, max_cache)
+    ) as executor:
+        futuros = {
+            executor.submit(pontuar_arquivo, arquivo, dir_saida, limite_alerta, formato, versao_primaria): arquivo
+            for arquivo in arquivos
+        }
+        for futuro in as_completed(futuros):
+            try:
+                resumo, alertas_arquivo, agregador, registro_sombra, metricas = futuro.result()
+            except Exception as e:
+                # Ex.: worker morto (falta de memória); os demais arquivos seguem
+                resumo, alertas_arquivo, agregador, registro_sombra = {'arquivo': futuros[futuro], 'linhas': 0, 'erro': f"{type(e).__name__}: {e}"}, None, None, None
+                metricas = {}
+            incorporar_metricas(metricas)
+            status = f"❌ {resumo['erro']}" if resumo['erro'] else f"{resumo['linhas']:,} linhas, {resumo['alertas']} alertas"
+            print(f"   -> {Path(resumo['arquivo']).name}: {status}")
+            resumos.append(resumo)
+            if alertas_arquivo is not None and len(alertas_arquivo):
+                alertas.append(alertas_arquivo)
+            if agregador is not None:
+                agregadores[resumo['arquivo']] = agregador
+            if registro_sombra is not None and caminho_log_sombra:
+                anexar_log(caminho_log_sombra, registro_sombra)
+    segundos = time.perf_counter() - inicio
+
+    # Combina na ordem dos arquivos: o "último desgaste" vem do arquivo mais recente
+    agregador_lote = None
+    for arquivo in sorted(agregadores):
+        agregador_lote = agregadores[arquivo] if agregador_lote is None else agregador_lote.combinar(agregadores[arquivo])
+    df_fila = agregador_lote.fila() if agregador_lote is not None else pd.DataFrame()
+
+    df_resumo = pd.DataFrame(resumos).sort_values('arquivo', ignore_index=True)
+    df_alertas = pd.concat(alertas, ignore_index=True) if alertas else pd.DataFrame()
+    return df_resumo, df_alertas, df_fila, segundos
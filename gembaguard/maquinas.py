@@ -0,0 +1,148 @@
+"""
+Perfil de risco por máquina (`id_produto`) e fila de manutenção priorizada.
+
+As predições são por leitura, mas a manutenção é planejada por máquina. O
+`AgregadorMaquinas` reduz as leituras pontuadas a um perfil por máquina:
+probabilidade máxima e média de cada tipo de falha, número de leituras em
+alerta e o último `desgaste_da_ferramenta` conhecido.
+
+O estado é um dicionário id -> posição mais um conjunto de arrays que cresce
+por dobra, então o agregador pode ser alimentado lote a lote (streaming) e
+combinado entre processos. Cada lote é reduzido com um group-by vetorizado
+antes de tocar no estado global.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class AgregadorMaquinas:
+    def __init__(self, targets, limite_alerta=0.5, capacidade=1024):
+        self.targets = list(targets)
+        self.limite_alerta = limite_alerta
+        self.posicoes = {}  # id_produto -> linha nos arrays
+        self.ids = []
+        n_targets = len(self.targets)
+        self._maximo = np.zeros((capacidade, n_targets), dtype=np.float32)
+        self._soma = np.zeros((capacidade, n_targets), dtype=np.float64)
+        self._leituras = np.zeros(capacidade, dtype=np.int64)
+        self._alertas = np.zeros(capacidade, dtype=np.int64)
+        self._desgaste = np.full(capacidade, np.nan)
+        self._tipo = np.full(capacidade, None, dtype=object)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _garantir_capacidade(self, n):
+        capacidade = len(self._leituras)
+        if n <= capacidade:
+            return
+        nova = max(n, capacidade * 2)
+        for nome in ('_maximo', '_soma', '_leituras', '_alertas', '_desgaste', '_tipo'):
+            atual = getattr(self, nome)
+            preenchimento = np.nan if nome == '_desgaste' else None if nome == '_tipo' else 0
+            novo = np.full((nova,) + atual.shape[1:], preenchimento, dtype=atual.dtype)
+            novo[:capacidade] = atual
+            setattr(self, nome, novo)
+
+    def _slots(self, ids_unicos):
+        """Posição global de cada id do lote, criando as que ainda não existem."""
+        slots = np.empty(len(ids_unicos), dtype=np.int64)
+        for i, id_maquina in enumerate(ids_unicos):
+            slot = self.posicoes.get(id_maquina)
+            if slot is None:
+                slot = self.posicoes[id_maquina] = len(self.ids)
+                self.ids.append(id_maquina)
+            slots[i] = slot
+        self._garantir_capacidade(len(self.ids))
+        return slots
+
+    def atualizar(self, df, df_predictions):
+        """Acumula um lote: `df` com id_produto (e opcionalmente tipo/desgaste) e as probabilidades."""
+        if len(df) == 0:
+            return
+        codigos, ids_unicos = pd.factorize(df['id_produto'].astype(str), sort=False)
+        n_grupos = len(ids_unicos)
+        probabilidades = df_predictions[self.targets].to_numpy(dtype=np.float32)
+
+        # Redução do lote (group-by por códigos inteiros, sem objetos Python por linha)
+        ordem = np.argsort(codigos, kind='stable')
+        codigos_ordenados = codigos[ordem]
+        inicios = np.flatnonzero(np.r_[True, codigos_ordenados[1:] != codigos_ordenados[:-1]])
+        maximo_lote = np.maximum.reduceat(probabilidades[ordem], inicios, axis=0)
+        soma_lote = np.add.reduceat(probabilidades[ordem].astype(np.float64), inicios, axis=0)
+        leituras_lote = np.bincount(codigos, minlength=n_grupos)
+        em_alerta = (probabilidades > self.limite_alerta).any(axis=1)
+        alertas_lote = np.bincount(codigos, weights=em_alerta, minlength=n_grupos).astype(np.int64)
+
+        slots = self._slots(ids_unicos)
+        self._maximo[slots] = np.maximum(self._maximo[slots], maximo_lote)
+        self._soma[slots] += soma_lote
+        self._leituras[slots] += leituras_lote
+        self._alertas[slots] += alertas_lote
+
+        # Último valor conhecido no lote (ordem das linhas)
+        for coluna, destino in (('desgaste_da_ferramenta', self._desgaste), ('tipo', self._tipo)):
+            if coluna not in df.columns:
+                continue
+            if coluna == 'desgaste_da_ferramenta':
+                valores = pd.to_numeric(df[coluna], errors='coerce').to_numpy(dtype=np.float64)
+            else:
+                valores = df[coluna].astype(object).to_numpy()
+            validos = np.flatnonzero(pd.notna(valores))
+            if len(validos) == 0:
+                continue
+            ultimo = np.full(n_grupos, -1)
+            np.maximum.at(ultimo, codigos[validos], validos)
+            tem_valor = ultimo >= 0
+            destino[slots[tem_valor]] = valores[ultimo[tem_valor]]
+
+    def combinar(self, outro):
+        """Soma o estado de outro agregador (ex.: de outro processo ou arquivo posterior)."""
+        n = len(outro)
+        if n == 0:
+            return self
+        slots = self._slots(outro.ids)
+        self._maximo[slots] = np.maximum(self._maximo[slots], outro._maximo[:n])
+        self._soma[slots] += outro._soma[:n]
+        self._leituras[slots] += outro._leituras[:n]
+        self._alertas[slots] += outro._alertas[:n]
+        for nome in ('_desgaste', '_tipo'):
+            valores = getattr(outro, nome)[:n]
+            conhecidos = pd.notna(valores)
+            getattr(self, nome)[slots[conhecidos]] = valores[conhecidos]
+        return self
+
+    def fila(self, top=None):
+        """
+        Fila de manutenção: uma linha por máquina, ordenada pela maior
+        probabilidade entre os targets, depois por alertas e desgaste.
+        """
+        n = len(self.ids)
+        maximo = self._maximo[:n]
+        media = self._soma[:n] / np.maximum(self._leituras[:n], 1)[:, None]
+
+        fila = pd.DataFrame({
+            'id_produto': self.ids,
+            'tipo': self._tipo[:n],
+            'leituras': self._leituras[:n],
+            'alertas': self._alertas[:n],
+            'risco': maximo.max(axis=1) if self.targets else np.zeros(n),
+            'falha_provavel': np.asarray(self.targets)[maximo.argmax(axis=1)] if n and self.targets else None,
+            'desgaste_atual': self._desgaste[:n],
+        })
+        for j, target in enumerate(self.targets):
+            fila[f'prob_max_{target}'] = maximo[:, j]
+            fila[f'prob_media_{target}'] = media[:, j].astype(np.float32)
+
+        fila = fila.sort_values(['risco', 'alertas', 'desgaste_atual'], ascending=False,
+                                na_position='last', ignore_index=True)
+        fila.insert(0, 'prioridade', np.arange(1, len(fila) + 1))
+        return fila if top is None else fila.head(top)
+
+
+def fila_manutencao(df, df_predictions, limite_alerta=0.5, top=None):
+    """Atalho para um único lote: retorna a fila priorizada por máquina."""
+    agregador = AgregadorMaquinas(df_predictions.columns, limite_alerta)
+    agregador.atualizar(df, df_predictions)
+    return agregador.fila(top)
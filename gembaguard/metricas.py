@@ -0,0 +1,347 @@
+"""
+Métricas operacionais no formato texto do Prometheus.
+
+Contadores e histogramas de vazão, latência e alertas do scoring. Cada
+thread acumula em um dicionário próprio (sem lock no caminho quente); as
+somas entre threads só são feitas na coleta. Os acumuladores de threads que
+já terminaram são consolidados, então a memória não cresce com o número de
+threads criadas pelo Streamlit.
+
+Exposição:
+    iniciar_servidor(9108)         # GET /metrics (app, via GEMBAGUARD_PORTA_METRICAS)
+    salvar_metricas('lote.prom')   # arquivo para o textfile collector (scripts batch)
+
+Processos workers (modo lote) têm registros próprios: `drenar_metricas`
+devolve o que o worker acumulou (e zera), e o processo principal soma com
+`incorporar_metricas` antes de gravar.
+
+Verificação local (sobe o servidor, pontua um lote sintético e faz o scrape):
+    python -m gembaguard.metricas
+"""
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRO = []
+_lock = threading.Lock()
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._local = threading.local()
+        self._acumuladores = []  # (thread, dicionário)
+        self._consolidado = {}
+        REGISTRO.append(self)
+
+    def _acumulador(self):
+        acumulador = getattr(self._local, 'acumulador', None)
+        if acumulador is None:
+            acumulador = self._local.acumulador = {}
+            with _lock:
+                self._acumuladores.append((threading.current_thread(), acumulador))
+        return acumulador
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos[r]) for r in self.rotulos)
+
+    def _formatar_rotulos(self, chave, extra=None):
+        pares = list(zip(self.rotulos, chave)) + ([extra] if extra else [])
+        if not pares:
+            return ''
+        return '{' + ','.join(f'{r}="{_escapar(v)}"' for r, v in pares) + '}'
+
+    def coletar(self):
+        """Soma os acumuladores de todas as threads; consolida os de threads encerradas."""
+        with _lock:
+            vivos = []
+            for thread, acumulador in self._acumuladores:
+                if thread.is_alive():
+                    vivos.append((thread, acumulador))
+                else:
+                    self._somar(self._consolidado, acumulador)
+            self._acumuladores = vivos
+            total = {}
+            self._somar(total, self._consolidado)
+            for _, acumulador in vivos:
+                self._somar(total, dict(acumulador))
+        return total
+
+    def drenar(self):
+        """Retorna o total acumulado e zera a métrica (sem escritas concorrentes de outras threads)."""
+        with _lock:
+            total, self._consolidado = self._consolidado, {}
+            for _, acumulador in self._acumuladores:
+                self._somar(total, dict(acumulador))
+                acumulador.clear()
+        return total
+
+    def incorporar(self, valores):
+        """Soma valores drenados de outro processo."""
+        with _lock:
+            self._somar(self._consolidado, valores)
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        acumulador = self._acumulador()
+        chave = self._chave(rotulos)
+        acumulador[chave] = acumulador.get(chave, 0) + valor
+
+    @staticmethod
+    def _somar(destino, origem):
+        for chave, valor in origem.items():
+            destino[chave] = destino.get(chave, 0) + valor
+
+    def exportar(self):
+        return [f'{self.nome}{self._formatar_rotulos(chave)} {_numero(valor)}'
+                for chave, valor in sorted(self.coletar().items())]
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **rotulos):
+        acumulador = self._acumulador()
+        chave = self._chave(rotulos)
+        estado = acumulador.get(chave)
+        if estado is None:
+            # [contagem por bucket (não cumulativa, último = +Inf), soma, total]
+            estado = acumulador[chave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        estado[0][bisect.bisect_left(self.buckets, valor)] += 1
+        estado[1] += valor
+        estado[2] += 1
+
+    @contextlib.contextmanager
+    def medir(self, **rotulos):
+        """Observa a duração (em segundos) do bloco."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    @staticmethod
+    def _somar(destino, origem):
+        for chave, (contagens, soma, total) in origem.items():
+            if chave not in destino:
+                destino[chave] = [list(contagens), soma, total]
+            else:
+                alvo = destino[chave]
+                alvo[0] = [a + b for a, b in zip(alvo[0], contagens)]
+                alvo[1] += soma
+                alvo[2] += total
+
+    def exportar(self):
+        linhas = []
+        for chave, (contagens, soma, total) in sorted(self.coletar().items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + ('+Inf',), contagens):
+                acumulado += contagem
+                le = limite if limite == '+Inf' else _numero(limite)
+                linhas.append(f'{self.nome}_bucket{self._formatar_rotulos(chave, ("le", le))} {acumulado}')
+            linhas.append(f'{self.nome}_sum{self._formatar_rotulos(chave)} {_numero(soma)}')
+            linhas.append(f'{self.nome}_count{self._formatar_rotulos(chave)} {total}')
+        return linhas
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+# --- MÉTRICAS DO GEMBAGUARD ---
+LINHAS_PONTUADAS = Contador(
+    'gembaguard_linhas_pontuadas_total', 'Linhas pontuadas pelo modelo.'
+)
+LATENCIA_PREDICAO = Histograma(
+    'gembaguard_latencia_predicao_segundos', 'Latência do predict_proba por target (lote inteiro).', ('target',)
+)
+TEMPO_FEATURES = Histograma(
+    'gembaguard_engenharia_features_segundos', 'Tempo de engenharia de features por lote.'
+)
+ALERTAS = Contador(
+    'gembaguard_alertas_total', 'Linhas com probabilidade acima do limite de alerta, por target.', ('target',)
+)
+LINHAS_REPETIDAS = Contador(
+    'gembaguard_linhas_repetidas_total', 'Linhas com leitura repetida no lote (pontuadas uma única vez).'
+)
+LINHAS_CACHE = Contador(
+    'gembaguard_linhas_cache_total', 'Leituras únicas respondidas pelo cache de resultados de lotes anteriores.'
+)
+FEATURES_PADRAO = Contador(
+    'gembaguard_features_padrao_total',
+    'Features do modelo preenchidas com valor padrão por ausência de dados (por lote).'
+)
+FEATURES_ESPERADAS = Contador(
+    'gembaguard_features_esperadas_total',
+    'Features esperadas pelo modelo (por lote); denominador da taxa de features padrão.'
+)
+
+
+def registrar_features_padrao(features, preenchidas):
+    """Conta as features do modelo e quantas o lote não trouxe (preenchidas com o padrão)."""
+    FEATURES_ESPERADAS.inc(len(features))
+    FEATURES_PADRAO.inc(len(preenchidas))
+
+
+def registrar_deduplicacao(estatisticas):
+    """Conta as linhas que não passaram pelos modelos (`estatisticas` de `prever_matriz`)."""
+    LINHAS_REPETIDAS.inc(estatisticas['linhas'] - estatisticas['unicas'])
+    LINHAS_CACHE.inc(estatisticas['do_cache'])
+
+
+def registrar_alertas(df_predictions, limite=0.5):
+    """Conta as linhas pontuadas e os alertas de cada target de um lote."""
+    LINHAS_PONTUADAS.inc(len(df_predictions))
+    for target, quantidade in (df_predictions > limite).sum().items():
+        ALERTAS.inc(int(quantidade), target=target)
+
+
+def drenar_metricas():
+    """Valores acumulados neste processo desde a última drenagem, por nome de métrica (picklável)."""
+    return {metrica.nome: valores for metrica in REGISTRO if (valores := metrica.drenar())}
+
+
+def incorporar_metricas(valores):
+    """Soma ao registro deste processo os valores de `drenar_metricas` de um worker."""
+    por_nome = {metrica.nome: metrica for metrica in REGISTRO}
+    for nome, valores_metrica in valores.items():
+        por_nome[nome].incorporar(valores_metrica)
+
+
+def exportar_prometheus():
+    """Todas as métricas no formato de exposição texto do Prometheus (0.0.4)."""
+    linhas = []
+    for metrica in REGISTRO:
+        linhas.append(f'# HELP {metrica.nome} {metrica.ajuda}')
+        linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+        linhas.extend(metrica.exportar())
+    return '\n'.join(linhas) + '\n'
+
+
+def salvar_metricas(caminho):
+    """Grava as métricas de forma atômica (para o textfile collector do node_exporter)."""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w') as f:
+        f.write(exportar_prometheus())
+    os.replace(temporario, caminho)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        corpo = exportar_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+_servidor = {}
+
+
+def iniciar_servidor(porta, endereco='0.0.0.0'):
+    """Sobe o endpoint /metrics em uma thread daemon (uma vez por processo)."""
+    if porta not in _servidor:
+        servidor = ThreadingHTTPServer((endereco, porta), _Handler)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        _servidor[porta] = servidor
+    return _servidor[porta]
+
+
+def validar_exposicao(texto):
+    """Confere o formato do scrape: cada amostra tem TYPE declarado e valor numérico. Retorna os erros."""
+    erros = []
+    tipos = {}
+    for numero, linha in enumerate(texto.splitlines(), 1):
+        if linha.startswith('# TYPE '):
+            _, _, nome, tipo = linha.split(' ', 3)
+            tipos[nome] = tipo
+            continue
+        if not linha or linha.startswith('#'):
+            continue
+        amostra, _, valor = linha.rpartition(' ')
+        nome = amostra.split('{')[0]
+        base = nome
+        for sufixo in ('_bucket', '_sum', '_count'):
+            if nome.endswith(sufixo) and nome[:-len(sufixo)] in tipos:
+                base = nome[:-len(sufixo)]
+        if base not in tipos:
+            erros.append(f"linha {numero}: '{nome}' sem # TYPE")
+        try:
+            float(valor)
+        except ValueError:
+            erros.append(f"linha {numero}: valor inválido '{valor}'")
+    return erros
+
+
+def main():
+    import argparse
+    import sys
+    import urllib.request
+
+    parser = argparse.ArgumentParser(description="Scrape de verificação do endpoint de métricas.")
+    parser.add_argument('--url', help="Endpoint a verificar (padrão: sobe um servidor local com um lote sintético).")
+    parser.add_argument('--porta', type=int, default=9108)
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        import numpy as np
+        import pandas as pd
+        from gembaguard.aquecimento import gerar_lote_sintetico
+        from gembaguard.features import montar_matriz_features
+
+        silencioso = lambda *a, **k: None
+        lote = gerar_lote_sintetico(1000)
+        with TEMPO_FEATURES.medir():
+            features = list(lote.columns.drop('tipo')) + ['potencia_estimada', 'feature_ausente']
+            _, preenchidas = montar_matriz_features(lote, features, avisar=silencioso, erro=silencioso)
+        registrar_features_padrao(features, preenchidas)
+        probabilidades = pd.DataFrame(np.random.default_rng(0).random((len(lote), 2)), columns=['FDF', 'FA'])
+        for target in probabilidades:
+            LATENCIA_PREDICAO.observar(0.004, target=target)
+        registrar_alertas(probabilidades)
+
+        iniciar_servidor(args.porta, '127.0.0.1')
+        url = f'http://127.0.0.1:{args.porta}/metrics'
+
+    with urllib.request.urlopen(url, timeout=5) as resposta:
+        texto = resposta.read().decode('utf-8')
+    print(texto)
+    erros = validar_exposicao(texto)
+    for erro in erros:
+        print(f"❌ {erro}")
+    if erros:
+        sys.exit(1)
+    print(f"✅ Scrape de '{url}' válido.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Modelo multi-label único para todos os targets de falha."""
+
+import numpy as np
+
+
+class ModeloMultiLabel:
+    """
+    Envolve um estimador que aprende todos os targets de uma vez (floresta
+    multi-saída ou ClassifierChain) e devolve a matriz (n, n_targets) de
+    probabilidades positivas em uma única chamada.
+    """
+
+    def __init__(self, estimador, targets, targets_treinados=None):
+        self.estimador = estimador
+        self.targets = list(targets)
+        # Targets sem as duas classes no treino ficam fora do estimador e têm probabilidade 0
+        self.targets_treinados = list(targets_treinados) if targets_treinados is not None else list(targets)
+
+    def predict_proba_multilabel(self, X):
+        X = np.asarray(X)
+        probas = self.estimador.predict_proba(X)
+        if isinstance(probas, np.ndarray):
+            # ClassifierChain já devolve (n, n_targets_treinados)
+            colunas = probas
+        else:
+            # Floresta multi-saída: uma matriz (n, n_classes) por target
+            colunas = np.column_stack([
+                proba[:, np.flatnonzero(classes == 1)[0]] if (classes == 1).any() else np.zeros(len(X))
+                for classes, proba in zip(self.estimador.classes_, probas)
+            ])
+
+        resultado = np.zeros((len(X), len(self.targets)))
+        for j, target in enumerate(self.targets_treinados):
+            resultado[:, self.targets.index(target)] = colunas[:, j]
+        return resultado
+
+    def modelos_por_target(self):
+        """Visões por target para manter o formato {'target': modelo} do artefato."""
+        return {target: ProbabilidadeTarget(self, i) for i, target in enumerate(self.targets)}
+
+
+class ProbabilidadeTarget:
+    """Visão de um único target de um ModeloMultiLabel."""
+
+    def __init__(self, modelo, indice):
+        self.modelo = modelo
+        self.indice = indice
+        self.classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        p = self.modelo.predict_proba_multilabel(X)[:, self.indice]
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
@@ -0,0 +1,155 @@
+"""Predição de probabilidades compartilhada entre o app e os scripts."""
+
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+from gembaguard.deduplicacao import chaves_leituras, chaves_linhas, indice_unicos
+from gembaguard.features import montar_matriz_features
+from gembaguard.metricas import LATENCIA_PREDICAO, TEMPO_FEATURES, registrar_deduplicacao, registrar_features_padrao
+from gembaguard.multilabel import ProbabilidadeTarget
+
+
+def prever_probabilidade_target(modelo, X, cache=None):
+    """
+    Retorna a probabilidade positiva de um target. Quando vários targets
+    compartilham o mesmo ModeloMultiLabel, passe o mesmo dicionário `cache`
+    em todas as chamadas para que o modelo seja avaliado uma única vez.
+    """
+    if isinstance(modelo, ProbabilidadeTarget):
+        if cache is None:
+            return modelo.predict_proba(X)[:, 1]
+        chave = id(modelo.modelo)
+        if chave not in cache:
+            cache[chave] = modelo.modelo.predict_proba_multilabel(X)
+        return cache[chave][:, modelo.indice]
+    if hasattr(modelo, 'predict_proba'):
+        proba = modelo.predict_proba(X)
+        if proba.shape[1] == 1:
+            # Target sem casos positivos no treino: o modelo só conhece uma classe
+            return proba[:, 0] if modelo.classes_[0] == 1 else np.zeros(len(proba))
+        return proba[:, 1]
+    return modelo.predict(X)
+
+
+def preencher_nulos(X):
+    """Substitui NaN pela média da coluna, no próprio array. Retorna True se havia nulos."""
+    colunas_nulas = np.flatnonzero(np.isnan(X).any(axis=0))
+    for j in colunas_nulas:
+        coluna = X[:, j]
+        coluna[np.isnan(coluna)] = np.nanmean(coluna)
+    return len(colunas_nulas) > 0
+
+
+def escalonar(scaler, X, tamanho_bloco=65_536):
+    """
+    Normaliza `X` no próprio buffer quando o scaler é um StandardScaler
+    (mesma conta do `transform`); outros scalers usam `transform`.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    if not isinstance(scaler, StandardScaler):
+        return scaler.transform(X)
+    if X.shape[1] != scaler.n_features_in_:
+        raise ValueError(f"X tem {X.shape[1]} features, mas o scaler espera {scaler.n_features_in_}")
+    if X.dtype == np.float32:
+        # Em float32, subtrair e dividir no buffer arredondaria duas vezes; a
+        # conta é feita em float64 por blocos de linhas e arredondada uma vez
+        media = scaler.mean_ if scaler.with_mean else 0.0
+        escala = scaler.scale_ if scaler.with_std else 1.0
+        for inicio in range(0, len(X), tamanho_bloco):
+            X[inicio:inicio + tamanho_bloco] = (X[inicio:inicio + tamanho_bloco] - media) / escala
+        return X
+    if scaler.with_mean:
+        X -= scaler.mean_
+    if scaler.with_std:
+        X /= scaler.scale_
+    return X
+
+
+def prever_matriz(X_scaled, modelos, features, chaves=None, cache=None, estatisticas=None, prever=None):
+    """
+    Pontua uma matriz já normalizada e retorna as probabilidades (linhas x
+    targets, na ordem de `modelos`).
+
+    Com `chaves` (hash da leitura de cada linha, ver `chaves_leituras`), só a
+    primeira linha de cada leitura passa pelos modelos e o resultado é
+    espalhado pelo índice inverso. Com `cache` (`CacheResultados`), linhas
+    já pontuadas em lotes anteriores também não passam. `estatisticas`
+    (dict) recebe linhas, unicas e do_cache. `prever(target, modelo, X,
+    cache_multilabel)` substitui `prever_probabilidade_target` (ex.: para
+    medir cada target); se retornar None (o target falhou), a coluna fica
+    com zeros e nenhuma linha do lote vai para o cache.
+    """
+    inverso = None
+    X_unicas = X_scaled
+    if chaves is not None:
+        posicoes, inverso = indice_unicos(chaves)
+        if len(posicoes) < len(X_scaled):
+            X_unicas = X_scaled[posicoes]
+        else:
+            inverso = None
+
+    P = np.empty((len(X_unicas), len(modelos)))
+    pendentes = slice(None)
+    if cache is not None:
+        chaves_cache = chaves_linhas(X_unicas)
+        encontrados, valores = cache.buscar(chaves_cache)
+        if valores is not None:
+            P[encontrados] = valores
+            pendentes = np.flatnonzero(~encontrados)
+
+    X_pontuar = X_unicas[pendentes]
+    if len(X_pontuar):
+        X_pontuar = pd.DataFrame(X_pontuar, columns=features, copy=False)
+        cache_multilabel = {}
+        falhou = False
+        for j, (target, modelo) in enumerate(modelos.items()):
+            if prever is None:
+                P[pendentes, j] = prever_probabilidade_target(modelo, X_pontuar, cache_multilabel)
+                continue
+            probabilidades = prever(target, modelo, X_pontuar, cache_multilabel)
+            if probabilidades is None:
+                falhou = True
+                probabilidades = 0.0
+            P[pendentes, j] = probabilidades
+        if cache is not None and not falhou:
+            cache.guardar(chaves_cache[pendentes], P[pendentes])
+
+    if estatisticas is not None:
+        estatisticas.update(linhas=len(X_scaled), unicas=len(X_unicas), do_cache=len(X_unicas) - len(X_pontuar))
+    return P if inverso is None else P[inverso]
+
+
+def pontuar_dataframe(df, modelos, scaler, features, avisar=print, dtype=np.float64, deduplicar=True, cache=None,
+                      estatisticas=None, registrar_metricas=False):
+    """
+    Executa o caminho completo de predição (features -> preenchimento ->
+    normalização -> modelos) e retorna um DataFrame de probabilidades por target.
+    `dtype` é o tipo da matriz de features (np.float32 no modo float32).
+    Com `deduplicar`, leituras repetidas no lote são pontuadas uma vez;
+    `cache` e `estatisticas`: ver `prever_matriz`. Com `registrar_metricas`,
+    tempo de features, latência por target, features padrão e deduplicação
+    vão para as métricas do processo (linhas e alertas ficam com quem
+    define o limite de alerta).
+    """
+    with TEMPO_FEATURES.medir() if registrar_metricas else contextlib.nullcontext():
+        X, preenchidas = montar_matriz_features(df, features, avisar=avisar, erro=avisar, dtype=dtype)
+    preencher_nulos(X)
+    chaves = chaves_leituras(df, features) if deduplicar else None
+
+    prever = None
+    if registrar_metricas:
+        registrar_features_padrao(features, preenchidas)
+        estatisticas = {} if estatisticas is None else estatisticas
+
+        def prever(target, modelo, X_pontuar, cache_multilabel):
+            with LATENCIA_PREDICAO.medir(target=target):
+                return prever_probabilidade_target(modelo, X_pontuar, cache_multilabel)
+
+    P = prever_matriz(escalonar(scaler, X), modelos, features, chaves=chaves, cache=cache, estatisticas=estatisticas,
+                      prever=prever)
+    if registrar_metricas:
+        registrar_deduplicacao(estatisticas)
+    return pd.DataFrame(P, columns=list(modelos), index=df.index)
@@ -0,0 +1,144 @@
+"""
+Rastreamento leve das etapas do pipeline (spans).
+
+Cada span mede o tempo monotônico de um trecho, o número de linhas
+processadas e a variação de memória (RSS), e é emitido como uma linha JSON
+no stderr. Os spans da execução atual também ficam disponíveis para o
+"Modo Debug" do app:
+
+    with span('escalonamento', linhas=len(df)):
+        ...
+
+    @rastrear('carregar_artefatos')
+    def load_artifacts(): ...
+
+Desativado (padrão), `span()` devolve um objeto nulo compartilhado e o custo
+é de uma chamada de função. Ative para o processo todo com `ativar()` ou a
+variável de ambiente GEMBAGUARD_RASTREAMENTO=1, ou apenas para a thread
+atual com `iniciar_coleta()` (cada sessão do Streamlit roda em uma thread).
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+_estado = {'ativo': os.environ.get('GEMBAGUARD_RASTREAMENTO', '0') == '1', 'emitir_json': True}
+_local = threading.local()
+
+
+def ativar(ativo=True, emitir_json=True):
+    _estado['ativo'] = ativo
+    _estado['emitir_json'] = emitir_json
+
+
+def esta_ativo():
+    return _ativo()
+
+
+def _ativo():
+    return _estado['ativo'] or getattr(_local, 'ativo', False)
+
+
+def iniciar_coleta():
+    """Ativa o rastreamento na thread atual e começa uma nova lista de spans."""
+    _local.ativo = True
+    _local.spans = []
+    return _local.spans
+
+
+def encerrar_coleta():
+    _local.ativo = False
+    _local.spans = None
+
+
+def spans_coletados():
+    return list(getattr(_local, 'spans', None) or [])
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _SpanNulo:
+    """Span usado quando o rastreamento está desativado: não mede nada."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def definir(self, **atributos):
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+class Span:
+    def __init__(self, nome, atributos):
+        self.nome = nome
+        self.atributos = atributos
+
+    def definir(self, **atributos):
+        """Adiciona atributos descobertos durante o trecho (ex.: linhas após um filtro)."""
+        self.atributos.update(atributos)
+
+    def __enter__(self):
+        self._rss_inicio = _rss_mb()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_erro, erro, traceback):
+        duracao_ms = (time.perf_counter() - self._inicio) * 1000
+        rss_fim = _rss_mb()
+        registro = {
+            'span': self.nome,
+            'inicio': time.time() - duracao_ms / 1000,
+            'duracao_ms': round(duracao_ms, 3),
+            'rss_mb': None if rss_fim is None else round(rss_fim, 1),
+            'delta_rss_mb': None if rss_fim is None or self._rss_inicio is None
+                            else round(rss_fim - self._rss_inicio, 1),
+            **self.atributos,
+        }
+        linhas = self.atributos.get('linhas')
+        if linhas and duracao_ms > 0:
+            registro['linhas_por_s'] = round(linhas / duracao_ms * 1000, 1)
+        if tipo_erro is not None:
+            registro['erro'] = f"{tipo_erro.__name__}: {erro}"
+
+        if _estado['emitir_json']:
+            print(json.dumps(registro, ensure_ascii=False, default=str), file=sys.stderr)
+        spans = getattr(_local, 'spans', None)
+        if spans is not None:
+            spans.append(registro)
+        return False
+
+
+def span(nome, **atributos):
+    """Context manager que mede um trecho; atributos extras (ex.: linhas, target) vão para o log."""
+    if not _ativo():
+        return _SPAN_NULO
+    return Span(nome, atributos)
+
+
+def rastrear(nome=None):
+    """Decorator equivalente a envolver a função inteira em `span(nome)`."""
+    def decorador(funcao):
+        nome_span = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not _ativo():
+                return funcao(*args, **kwargs)
+            with Span(nome_span, {}):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
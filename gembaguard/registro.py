@@ -0,0 +1,417 @@
+"""
+Registro local de versões de modelo e troca a quente no serviço.
+
+Cada versão é um diretório imutável com os artefatos da etapa 3 e um
+manifesto:
+
+    registro/
+      versoes/
+        20261019-142530-3fa2c1/
+          3_modelos_treinados.pkl
+          3_standard_scaler.pkl
+          3_referencia_deriva.pkl      (opcional)
+          manifesto.json               (checksums, métricas, features, targets, bibliotecas)
+      ATUAL                            (nome da versão servida)
+      historico.jsonl                  (promoções e reversões)
+
+Registrar copia os artefatos para um diretório temporário dentro do
+registro e o renomeia no final, então uma versão nunca aparece pela metade.
+Promover e reverter apenas reescrevem `ATUAL` (arquivo temporário +
+`os.replace`, atômico). Os checksums são conferidos antes de qualquer
+promoção ou carga.
+
+`ServicoModelos` mantém a versão servida em memória e observa `ATUAL` em
+uma thread: uma versão nova é carregada, conferida e aquecida em segundo
+plano e só então substitui a referência servida. O caminho de predição
+nunca espera uma carga a frio. A versão anterior continua em memória, então
+reverter é uma troca de referência.
+
+    python -m gembaguard.registro registro/ registrar --modelos notebooks/3_modelos_treinados.pkl \\
+        --scaler notebooks/3_standard_scaler.pkl --referencia notebooks/3_referencia_deriva.pkl
+    python -m gembaguard.registro registro/ listar
+    python -m gembaguard.registro registro/ promover 20261019-142530-3fa2c1
+    python -m gembaguard.registro registro/ reverter
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+ARQUIVO_MODELOS = '3_modelos_treinados.pkl'
+ARQUIVO_SCALER = '3_standard_scaler.pkl'
+ARQUIVO_REFERENCIA = '3_referencia_deriva.pkl'
+ARQUIVO_MANIFESTO = 'manifesto.json'
+
+
+def sha256_arquivo(caminho, tamanho_bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _escrever_atomico(caminho, conteudo):
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+
+def _versoes_bibliotecas():
+    import numpy
+    import sklearn
+
+    versoes = {'python': sys.version.split()[0], 'numpy': numpy.__version__, 'pandas': pd.__version__,
+               'scikit-learn': sklearn.__version__}
+    try:
+        import lightgbm
+        versoes['lightgbm'] = lightgbm.__version__
+    except ImportError:
+        pass
+    return versoes
+
+
+class RegistroModelos:
+    """Registro de versões em um diretório local (ver o docstring do módulo)."""
+
+    def __init__(self, raiz):
+        self.raiz = Path(raiz)
+        self.dir_versoes = self.raiz / 'versoes'
+        self.arquivo_atual = self.raiz / 'ATUAL'
+        self.arquivo_historico = self.raiz / 'historico.jsonl'
+
+    def caminho(self, versao, arquivo=ARQUIVO_MODELOS):
+        return self.dir_versoes / versao / arquivo
+
+    def manifesto(self, versao):
+        with open(self.caminho(versao, ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+            return json.load(f)
+
+    def versoes(self):
+        """Versões registradas, da mais antiga para a mais nova."""
+        if not self.dir_versoes.exists():
+            return []
+        manifestos = [p / ARQUIVO_MANIFESTO for p in self.dir_versoes.iterdir() if (p / ARQUIVO_MANIFESTO).exists()]
+        return [m.parent.name for m in sorted(manifestos, key=lambda m: m.stat().st_mtime)]
+
+    def registrar(self, caminho_modelos, caminho_scaler, caminho_referencia=None, metricas=None, notas=None,
+                  versao=None, bundle=None):
+        """
+        Copia os artefatos para uma nova versão e grava o manifesto. `bundle`
+        (o dicionário da etapa 3) evita recarregar o pickle para ler features
+        e targets. Retorna o nome da versão.
+        """
+        if bundle is None:
+            import joblib
+            bundle = joblib.load(caminho_modelos)
+
+        arquivos = {ARQUIVO_MODELOS: caminho_modelos, ARQUIVO_SCALER: caminho_scaler}
+        if caminho_referencia and Path(caminho_referencia).exists():
+            arquivos[ARQUIVO_REFERENCIA] = caminho_referencia
+
+        self.dir_versoes.mkdir(parents=True, exist_ok=True)
+        temporario = Path(tempfile.mkdtemp(prefix='.registrando-', dir=self.dir_versoes))
+        temporario.chmod(0o755)  # mkdtemp cria com 0700; o serviço pode rodar com outro usuário
+        try:
+            checksums = {}
+            for nome, origem in arquivos.items():
+                shutil.copyfile(origem, temporario / nome)
+                checksums[nome] = {'sha256': sha256_arquivo(temporario / nome), 'bytes': (temporario / nome).stat().st_size}
+
+            if versao is None:
+                versao = f"{datetime.now():%Y%m%d-%H%M%S}-{checksums[ARQUIVO_MODELOS]['sha256'][:6]}"
+            manifesto = {
+                'versao': versao,
+                'criado_em': datetime.now(timezone.utc).isoformat(),
+                'arquivos': checksums,
+                'features': list(bundle['features']),
+                'targets': list(bundle['targets']),
+                'modelos': {target: type(modelo).__name__ for target, modelo in bundle['modelos'].items()},
+                'modo': bundle.get('modo'),
+                # Mesmo formato do JSON da etapa 4 (f1_macro, por_target...)
+                'metricas': metricas or {},
+                'notas': notas,
+                'bibliotecas': _versoes_bibliotecas(),
+            }
+            with open(temporario / ARQUIVO_MANIFESTO, 'w', encoding='utf-8') as f:
+                json.dump(manifesto, f, indent=2, ensure_ascii=False)
+            os.rename(temporario, self.dir_versoes / versao)
+        except BaseException:
+            shutil.rmtree(temporario, ignore_errors=True)
+            raise
+        return versao
+
+    def verificar(self, versao):
+        """Confere os checksums do manifesto. Retorna a lista de problemas (vazia se a versão está íntegra)."""
+        try:
+            manifesto = self.manifesto(versao)
+        except FileNotFoundError:
+            return [f"versão '{versao}' não encontrada"]
+        problemas = []
+        for nome, esperado in manifesto['arquivos'].items():
+            caminho = self.caminho(versao, nome)
+            if not caminho.exists():
+                problemas.append(f"{nome} ausente")
+            elif sha256_arquivo(caminho) != esperado['sha256']:
+                problemas.append(f"{nome} com checksum diferente do manifesto")
+        return problemas
+
+    def versao_atual(self):
+        try:
+            return self.arquivo_atual.read_text(encoding='utf-8').strip() or None
+        except FileNotFoundError:
+            return None
+
+    def historico(self):
+        if not self.arquivo_historico.exists():
+            return []
+        with open(self.arquivo_historico, encoding='utf-8') as f:
+            return [json.loads(linha) for linha in f if linha.strip()]
+
+    def promover(self, versao, motivo='promocao'):
+        """Aponta `ATUAL` para `versao` (depois de conferir os checksums)."""
+        problemas = self.verificar(versao)
+        if problemas:
+            raise ValueError(f"Versão '{versao}' não pode ser promovida: {'; '.join(problemas)}")
+        anterior = self.versao_atual()
+        _escrever_atomico(self.arquivo_atual, versao + '\n')
+        with open(self.arquivo_historico, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'versao': versao, 'anterior': anterior, 'motivo': motivo,
+                                'em': datetime.now(timezone.utc).isoformat()}) + '\n')
+        return anterior
+
+    def pilha_versoes(self):
+        """
+        Versões servidas, da mais antiga para a atual, reconstruídas do
+        histórico: uma promoção empilha a versão e uma reversão desempilha a
+        atual. Reversões seguidas voltam cada vez mais (v3 -> v2 -> v1) em vez
+        de alternar entre as duas últimas.
+        """
+        pilha = []
+        for entrada in self.historico():
+            if not pilha and entrada.get('anterior'):
+                pilha.append(entrada['anterior'])
+            if entrada.get('motivo') == 'reversao' and pilha:
+                pilha.pop()
+            if not pilha or pilha[-1] != entrada['versao']:
+                pilha.append(entrada['versao'])
+        return pilha
+
+    def versao_anterior(self):
+        """Versão para a qual `reverter` volta (a de baixo da atual na pilha de promoções)."""
+        pilha = self.pilha_versoes()
+        return pilha[-2] if len(pilha) > 1 else None
+
+    def reverter(self):
+        """
+        Volta `ATUAL` para a versão promovida antes da atual e a tira da pilha
+        (ver `pilha_versoes`). Retorna a versão restaurada.
+        """
+        anterior = self.versao_anterior()
+        if anterior is None:
+            raise ValueError("Não há versão anterior no histórico para reverter")
+        self.promover(anterior, motivo='reversao')
+        return anterior
+
+    def carregar(self, versao=None, verificar=True):
+        """
+        Carrega os artefatos de uma versão (padrão: a atual). Retorna um
+        dicionário com versao, modelos, scaler, features, targets, referencia
+        (ou None) e manifesto.
+        """
+        import joblib
+
+        versao = versao or self.versao_atual()
+        if versao is None:
+            raise FileNotFoundError(f"Nenhuma versão promovida em '{self.raiz}'")
+        if verificar:
+            problemas = self.verificar(versao)
+            if problemas:
+                raise ValueError(f"Versão '{versao}' inválida: {'; '.join(problemas)}")
+        bundle = joblib.load(self.caminho(versao, ARQUIVO_MODELOS))
+        caminho_referencia = self.caminho(versao, ARQUIVO_REFERENCIA)
+        return {
+            'versao': versao,
+            'modelos': bundle['modelos'],
+            'features': bundle['features'],
+            'targets': bundle['targets'],
+            'scaler': joblib.load(self.caminho(versao, ARQUIVO_SCALER)),
+            'referencia': joblib.load(caminho_referencia) if caminho_referencia.exists() else None,
+            'manifesto': self.manifesto(versao),
+        }
+
+    def listar(self):
+        """DataFrame com uma linha por versão (a servida marcada em 'atual')."""
+        atual = self.versao_atual()
+        linhas = []
+        for versao in self.versoes():
+            manifesto = self.manifesto(versao)
+            metricas = manifesto.get('metricas') or {}
+            linhas.append({
+                'versao': versao,
+                'atual': versao == atual,
+                'criado_em': manifesto['criado_em'],
+                'modo': manifesto.get('modo'),
+                'mb': sum(a['bytes'] for a in manifesto['arquivos'].values()) / 1024 ** 2,
+                'f1_macro': metricas.get('f1_macro'),
+                **{f'f1_{target}': linha.get('f1') for target, linha in metricas.get('por_target', {}).items()},
+            })
+        return pd.DataFrame(linhas)
+
+
+class ServicoModelos:
+    """
+    Versão servida de um `RegistroModelos`, com troca a quente. `atual()`
+    retorna o dicionário da versão servida (o mesmo de
+    `RegistroModelos.carregar`, mais um `monitor` de deriva acumulado por
+    versão); quem atende uma requisição deve pegar a referência uma vez e
+    usá-la até o fim. A troca é uma atribuição, então uma requisição nunca
+    mistura modelos de duas versões.
+    """
+
+    def __init__(self, registro, intervalo=10.0, aquecer=None, avisar=print):
+        self.registro = registro
+        self.intervalo = intervalo
+        self.avisar = avisar
+        # Aquecimento de uma versão nova antes da troca (padrão: um lote sintético pelo caminho de predição)
+        self.aquecer = aquecer or _aquecer_versao
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self._anterior = None
+        self._atual = self._preparar(registro.carregar())
+
+    def _preparar(self, carregado):
+        carregado['monitor'] = carregado['referencia'].novo_monitor() if carregado['referencia'] is not None else None
+        return carregado
+
+    def atual(self):
+        return self._atual
+
+    def trocar_para(self, versao):
+        """Carrega, confere e aquece `versao` e então troca a versão servida. Retorna True se trocou."""
+        with self._lock:
+            if versao == self._atual['versao']:
+                return False
+            if self._anterior is not None and self._anterior['versao'] == versao:
+                novo = self._anterior
+            else:
+                inicio = time.perf_counter()
+                novo = self._preparar(self.registro.carregar(versao))
+                self.aquecer(novo)
+                self.avisar(f"🔄 Versão '{versao}' carregada e aquecida em {time.perf_counter() - inicio:.1f}s")
+            self._anterior, self._atual = self._atual, novo
+            self.avisar(f"✅ Servindo a versão '{versao}' (anterior: '{self._anterior['versao']}')")
+            return True
+
+    def reverter(self):
+        """Volta para a versão anterior (troca imediata se ela ainda está em memória) e atualiza `ATUAL`."""
+        versao = self.registro.reverter()
+        self.trocar_para(versao)
+        return versao
+
+    def verificar_atualizacao(self):
+        """Troca de versão se `ATUAL` mudou. Erros de carga mantêm a versão servida."""
+        versao = self.registro.versao_atual()
+        if versao is None or versao == self._atual['versao']:
+            return False
+        try:
+            return self.trocar_para(versao)
+        except Exception as e:
+            self.avisar(f"⚠️ Versão '{versao}' não carregada, mantendo '{self._atual['versao']}': {e}")
+            return False
+
+    def iniciar(self):
+        """Observa `ATUAL` a cada `intervalo` segundos em uma thread daemon."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._observar, name='registro-modelos', daemon=True)
+            self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _observar(self):
+        while not self._parar.wait(self.intervalo):
+            self.verificar_atualizacao()
+
+
+def _aquecer_versao(carregado, n_linhas=256):
+    """Passa um lote sintético pela versão (sem mexer no arquivo de prontidão da réplica)."""
+    from gembaguard.aquecimento import gerar_lote_sintetico
+    from gembaguard.predicao import pontuar_dataframe
+
+    lote = gerar_lote_sintetico(n_linhas)
+    for _ in range(2):
+        pontuar_dataframe(lote, carregado['modelos'], carregado['scaler'], carregado['features'],
+                          avisar=lambda *args, **kwargs: None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registro local de versões de modelo do GembaGuard.")
+    parser.add_argument('raiz', help="Diretório do registro.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    registrar = comandos.add_parser('registrar', help="Registra os artefatos da etapa 3 como uma nova versão.")
+    registrar.add_argument('--modelos', default=ARQUIVO_MODELOS)
+    registrar.add_argument('--scaler', default=ARQUIVO_SCALER)
+    registrar.add_argument('--referencia', default=ARQUIVO_REFERENCIA)
+    registrar.add_argument('--metricas', help="JSON de métricas (ex.: a saída de '4_avaliacao.py --json').")
+    registrar.add_argument('--notas')
+    registrar.add_argument('--versao', help="Nome da versão (padrão: data-hora e início do checksum dos modelos).")
+    registrar.add_argument('--promover', action='store_true', help="Promove a versão registrada.")
+
+    comandos.add_parser('listar', help="Lista as versões registradas.")
+    promover = comandos.add_parser('promover', help="Passa a servir uma versão.")
+    promover.add_argument('versao')
+    comandos.add_parser('reverter', help="Volta para a versão promovida antes da atual (repetido, continua voltando).")
+    verificar = comandos.add_parser('verificar', help="Confere os checksums de uma versão (padrão: a atual).")
+    verificar.add_argument('versao', nargs='?')
+    args = parser.parse_args()
+
+    registro = RegistroModelos(args.raiz)
+    if args.comando == 'registrar':
+        metricas = None
+        if args.metricas:
+            with open(args.metricas, encoding='utf-8') as f:
+                metricas = json.load(f)
+        versao = registro.registrar(args.modelos, args.scaler, args.referencia, metricas, args.notas, args.versao)
+        print(f"✅ Versão '{versao}' registrada em '{registro.dir_versoes / versao}'")
+        if args.promover:
+            registro.promover(versao)
+            print(f"✅ Versão '{versao}' promovida")
+    elif args.comando == 'listar':
+        versoes = registro.listar()
+        print(versoes.to_string(index=False, float_format=lambda x: f"{x:.3f}") if len(versoes) else "Nenhuma versão registrada.")
+    elif args.comando == 'promover':
+        anterior = registro.promover(args.versao)
+        print(f"✅ Servindo '{args.versao}' (anterior: '{anterior}')")
+    elif args.comando == 'reverter':
+        print(f"✅ Revertido para '{registro.reverter()}'")
+    elif args.comando == 'verificar':
+        versao = args.versao or registro.versao_atual()
+        problemas = registro.verificar(versao) if versao else ["nenhuma versão promovida"]
+        if problemas:
+            print(f"❌ {versao}: {'; '.join(problemas)}")
+            sys.exit(1)
+        print(f"✅ '{versao}' íntegra")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Carga e warm-up da réplica na inicialização do processo.
+
+O Streamlit só executa `app.py` quando a primeira sessão se conecta: com a
+carga e o warm-up dentro do app, o primeiro usuário pagava esse custo e uma
+réplica nova só ficava pronta (ver `gembaguard.aquecimento`) depois de
+receber tráfego. Aqui a carga dos modelos (artefatos ou, com
+GEMBAGUARD_REGISTRO, a versão promovida do registro), o warm-up e o
+endpoint /metrics acontecem uma vez por processo. O ponto de entrada faz
+isso antes de subir o Streamlit no mesmo processo, e o app reaproveita os
+objetos já carregados:
+
+    python -m gembaguard.replica
+    python -m gembaguard.replica --server.port 8502 --server.headless true
+
+Os argumentos são repassados ao `streamlit run`. A porta também vira o id
+da réplica no arquivo de prontidão, exceto se GEMBAGUARD_REPLICA já estiver
+definido.
+"""
+
+import argparse
+import os
+import sys
+import threading
+from pathlib import Path
+
+from gembaguard.aquecimento import aquecer_modelo
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+_lock = threading.Lock()
+_carregados = {}
+
+
+def preparar_replica(models, scaler, features):
+    """Warm-up do modelo carregado e endpoint /metrics (GEMBAGUARD_PORTA_METRICAS)."""
+    estado = aquecer_modelo(models, scaler, features)
+    if estado['pronto']:
+        print(f"✅ Modelo aquecido. Latência fria: {estado['latencia_fria_ms']:.0f} ms, "
+              f"quente: {estado['latencia_quente_ms']:.0f} ms")
+    else:
+        print(f"⚠️ Falha no warm-up do modelo: {estado['erro']}")
+
+    porta_metricas = os.environ.get('GEMBAGUARD_PORTA_METRICAS')
+    if porta_metricas:
+        from gembaguard.metricas import iniciar_servidor
+        try:
+            iniciar_servidor(int(porta_metricas))
+            print(f"📈 Métricas expostas em http://0.0.0.0:{porta_metricas}/metrics")
+        except OSError as e:
+            print(f"⚠️ Não foi possível expor as métricas na porta {porta_metricas}: {e}")
+
+
+def _uma_vez(chave, carregar):
+    """Executa `carregar` uma vez por processo e `chave`; chamadas concorrentes esperam a primeira."""
+    with _lock:
+        if chave not in _carregados:
+            _carregados[chave] = carregar()
+        return _carregados[chave]
+
+
+def carregar_artefatos(dir_artefatos):
+    """(modelos, scaler, features, targets) de `dir_artefatos`, aquecidos. Erros de carga sobem ao chamador."""
+    def carregar():
+        import joblib
+
+        bundle = joblib.load(os.path.join(dir_artefatos, "3_modelos_treinados.pkl"))
+        scaler = joblib.load(os.path.join(dir_artefatos, "3_standard_scaler.pkl"))
+        preparar_replica(bundle['modelos'], scaler, bundle['features'])
+        return bundle['modelos'], scaler, bundle['features'], bundle['targets']
+
+    return _uma_vez(('artefatos', os.path.realpath(dir_artefatos)), carregar)
+
+
+def carregar_servico(caminho_registro, intervalo=10.0):
+    """`ServicoModelos` da versão promovida do registro, aquecido e observando o registro."""
+    def carregar():
+        from gembaguard.registro import RegistroModelos, ServicoModelos
+
+        servico = ServicoModelos(RegistroModelos(caminho_registro), intervalo=intervalo)
+        versao = servico.atual()
+        print(f"📦 Versão '{versao['versao']}' carregada do registro '{caminho_registro}'")
+        preparar_replica(versao['modelos'], versao['scaler'], versao['features'])
+        return servico.iniciar()
+
+    return _uma_vez(('registro', os.path.realpath(caminho_registro)), carregar)
+
+
+def _porta(argumentos):
+    """Valor de --server.port nos argumentos do Streamlit (ou STREAMLIT_SERVER_PORT, padrão 8501)."""
+    for i, argumento in enumerate(argumentos):
+        if argumento.startswith('--server.port='):
+            return argumento.split('=', 1)[1]
+        if argumento == '--server.port' and i + 1 < len(argumentos):
+            return argumentos[i + 1]
+    return os.environ.get('STREAMLIT_SERVER_PORT', '8501')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Carrega e aquece os modelos e então sobe o app Streamlit no mesmo processo."
+    )
+    parser.add_argument('--app', type=Path, default=RAIZ / 'app.py', help="Script do app (padrão: app.py da raiz).")
+    args, argumentos_streamlit = parser.parse_known_args()
+
+    os.environ.setdefault('GEMBAGUARD_REPLICA', _porta(argumentos_streamlit))
+    if os.environ.get('GEMBAGUARD_REGISTRO'):
+        carregar_servico(os.environ['GEMBAGUARD_REGISTRO'], float(os.environ.get('GEMBAGUARD_REGISTRO_INTERVALO', '10')))
+    else:
+        try:
+            carregar_artefatos(str(args.app.resolve().parent))
+        except FileNotFoundError as e:
+            # O app mostra o erro na tela; a réplica sobe sem ficar pronta
+            print(f"⚠️ Artefatos do modelo não encontrados ({e}); a réplica não ficará pronta.")
+
+    from streamlit.web import cli
+
+    sys.argv = ['streamlit', 'run', str(args.app), *argumentos_streamlit]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Pontuação em sombra: uma segunda versão de modelo pontua o mesmo tráfego.
+
+Antes de promover um retreino, a versão candidata roda ao lado da servida
+sobre os mesmos lotes. `ComparadorSombra` pontua a sombra em um pool de
+threads próprio enquanto a versão principal segue o caminho normal; a
+resposta ao usuário nunca espera a sombra. Quando as duas terminam, cada
+lote vira uma linha de um log JSONL compacto, só com contagens por target:
+
+    {"em": ..., "lote": "turno_a.csv", "versao_primaria": ..., "versao_sombra": ...,
+     "linhas": 10000, "segundos_sombra": 0.4, "linhas_divergentes": 3,
+     "targets": {"FDF": {"alertas_primaria": 12, "alertas_sombra": 14, "so_primaria": 1,
+                         "so_sombra": 3, "soma_delta": ..., "soma_delta_abs": ...,
+                         "delta_abs_max": ..., "hist_delta_abs": [...], "exemplos": [...]}}}
+
+As somas e o histograma de |delta| são combináveis, então `resumir_log`
+agrega um dia inteiro sem guardar probabilidades por linha. `exemplos` são
+as posições (no lote) das primeiras linhas cujo alerta mudou.
+
+    python -m gembaguard.sombra registro/sombra.jsonl
+    python -m gembaguard.sombra registro/sombra.jsonl --max-divergencia 0.001
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gembaguard.predicao import pontuar_dataframe
+
+# Bordas do histograma de |probabilidade sombra - probabilidade primária|
+BORDAS_DELTA = np.array([0.0, 1e-3, 1e-2, 0.05, 0.1, 0.25, 0.5, 1.0])
+
+
+def comparar_probabilidades(primaria, sombra, limite_alerta=0.5, max_exemplos=20):
+    """
+    Contagens de concordância entre duas tabelas de probabilidades (linhas x
+    targets) do mesmo lote. Retorna (contagens por target, linhas com algum
+    alerta diferente, targets presentes em só uma das versões).
+    """
+    comuns = [target for target in primaria.columns if target in sombra.columns]
+    sem_par = sorted(set(primaria.columns).symmetric_difference(sombra.columns))
+    p = primaria[comuns].to_numpy(dtype=np.float64)
+    s = sombra[comuns].to_numpy(dtype=np.float64)
+    alerta_p, alerta_s = p > limite_alerta, s > limite_alerta
+    divergente = alerta_p != alerta_s
+    delta = s - p
+    delta_abs = np.abs(delta)
+
+    por_target = {}
+    for j, target in enumerate(comuns):
+        histograma, _ = np.histogram(delta_abs[:, j], bins=BORDAS_DELTA)
+        por_target[target] = {
+            'alertas_primaria': int(np.count_nonzero(alerta_p[:, j])),
+            'alertas_sombra': int(np.count_nonzero(alerta_s[:, j])),
+            'so_primaria': int(np.count_nonzero(alerta_p[:, j] & ~alerta_s[:, j])),
+            'so_sombra': int(np.count_nonzero(alerta_s[:, j] & ~alerta_p[:, j])),
+            'soma_delta': float(delta[:, j].sum()),
+            'soma_delta_abs': float(delta_abs[:, j].sum()),
+            'delta_abs_max': float(delta_abs[:, j].max()) if len(delta_abs) else 0.0,
+            'hist_delta_abs': histograma.tolist(),
+            'exemplos': np.flatnonzero(divergente[:, j])[:max_exemplos].tolist(),
+        }
+    return por_target, int(np.count_nonzero(divergente.any(axis=1))), sem_par
+
+
+def anexar_log(caminho, registro, _lock=threading.Lock()):
+    """Acrescenta um registro de comparação ao log JSONL."""
+    with _lock, open(caminho, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+
+def ler_log(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def _registros(registros):
+    """Aceita a lista de registros ou o caminho do log."""
+    if isinstance(registros, (str, bytes)) or hasattr(registros, '__fspath__'):
+        return ler_log(registros)
+    return registros
+
+
+def carregar_artefatos(dir_artefatos, versao=None):
+    """
+    Artefatos da etapa 3 de um diretório (ex.: uma versão do registro) no
+    formato de `RegistroModelos.carregar`. `versao` padrão: o nome do diretório.
+    """
+    import joblib
+
+    dir_artefatos = Path(dir_artefatos)
+    bundle = joblib.load(dir_artefatos / '3_modelos_treinados.pkl')
+    return {
+        'versao': versao or dir_artefatos.resolve().name,
+        'modelos': bundle['modelos'],
+        'features': bundle['features'],
+        'targets': bundle['targets'],
+        'scaler': joblib.load(dir_artefatos / '3_standard_scaler.pkl'),
+    }
+
+
+class ComparadorSombra:
+    """
+    Pontua a versão `sombra` (dicionário com modelos, scaler, features e
+    versao, como o de `RegistroModelos.carregar`) em `n_workers` threads e
+    compara com as probabilidades da versão principal.
+
+        futuro = comparador.pontuar(df)              # antes da versão principal
+        probabilidades = pontuar_dataframe(df, ...)  # caminho normal
+        comparador.comparar(futuro, probabilidades, lote='turno_a.csv')
+
+    `comparar` não bloqueia: o registro é montado e gravado em `caminho_log`
+    quando a sombra termina. Com `esperar=True`, espera e retorna o registro.
+    Um erro na sombra vira um registro com `erro` e nunca chega ao chamador.
+    """
+
+    def __init__(self, sombra, caminho_log=None, limite_alerta=0.5, n_workers=1, dtype=np.float64,
+                 versao_primaria=None):
+        self.sombra = sombra
+        self.caminho_log = caminho_log
+        self.limite_alerta = limite_alerta
+        self.dtype = dtype
+        self.versao_primaria = versao_primaria
+        self._executor = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='sombra')
+
+    def _pontuar(self, df):
+        inicio = time.perf_counter()
+        probabilidades = pontuar_dataframe(
+            df, self.sombra['modelos'], self.sombra['scaler'], self.sombra['features'],
+            avisar=lambda *args, **kwargs: None, dtype=self.dtype
+        )
+        return probabilidades, time.perf_counter() - inicio
+
+    def pontuar(self, df):
+        """Agenda a pontuação da sombra. `df` não pode ser alterado até a sombra terminar."""
+        return self._executor.submit(self._pontuar, df)
+
+    def _registro(self, futuro, primaria, lote, versao_primaria):
+        registro = {
+            'em': datetime.now(timezone.utc).isoformat(),
+            'lote': lote,
+            'versao_primaria': versao_primaria or self.versao_primaria,
+            'versao_sombra': self.sombra.get('versao'),
+            'linhas': len(primaria),
+            'limite_alerta': self.limite_alerta,
+        }
+        try:
+            sombra, segundos = futuro.result()
+            por_target, divergentes, sem_par = comparar_probabilidades(primaria, sombra, self.limite_alerta)
+            registro.update(segundos_sombra=round(segundos, 4), linhas_divergentes=divergentes, targets=por_target)
+            if sem_par:
+                registro['sem_par'] = sem_par
+        except Exception as e:
+            registro['erro'] = f"{type(e).__name__}: {e}"
+        if self.caminho_log:
+            anexar_log(self.caminho_log, registro)
+        return registro
+
+    def comparar(self, futuro, primaria, lote=None, versao_primaria=None, esperar=False):
+        """Compara a sombra de `futuro` com `primaria` e grava o registro (ver o docstring da classe)."""
+        if esperar:
+            return self._registro(futuro, primaria, lote, versao_primaria)
+        futuro.add_done_callback(lambda f: self._registro(f, primaria, lote, versao_primaria))
+        return None
+
+    def fechar(self):
+        """Espera as comparações pendentes e encerra o pool."""
+        self._executor.shutdown(wait=True)
+
+
+def resumir_log(registros):
+    """
+    Agrega os registros de comparação (lista ou caminho do log) por par de
+    versões e target. A concordância é a fração de linhas com a mesma
+    decisão de alerta; `vies` é a média de sombra - primária.
+    """
+    registros = _registros(registros)
+
+    linhas = []
+    for registro in registros:
+        for target, c in (registro.get('targets') or {}).items():
+            linhas.append({
+                'versao_primaria': registro['versao_primaria'], 'versao_sombra': registro['versao_sombra'],
+                'target': target, 'lotes': 1, 'linhas': registro['linhas'],
+                **{k: v for k, v in c.items() if k not in ('hist_delta_abs', 'exemplos')},
+                **{f'hist_{i}': n for i, n in enumerate(c['hist_delta_abs'])},
+            })
+    if not linhas:
+        return pd.DataFrame()
+
+    chaves = ['versao_primaria', 'versao_sombra', 'target']
+    df = pd.DataFrame(linhas)
+    agregacoes = {coluna: 'sum' for coluna in df.columns if coluna not in chaves}
+    agregacoes['delta_abs_max'] = 'max'
+    soma = df.groupby(chaves, sort=False, dropna=False).agg(agregacoes).reset_index()
+
+    n = soma['linhas'].replace(0, np.nan)
+    colunas_hist = [f'hist_{i}' for i in range(len(BORDAS_DELTA) - 1)]
+    acima = [c for c, borda in zip(colunas_hist, BORDAS_DELTA[:-1]) if borda >= 0.05]
+    resumo = soma[chaves + ['lotes', 'linhas']].copy()
+    resumo['concordancia'] = 1 - (soma['so_primaria'] + soma['so_sombra']) / n
+    resumo['alertas_primaria'] = soma['alertas_primaria']
+    resumo['alertas_sombra'] = soma['alertas_sombra']
+    resumo['so_primaria'] = soma['so_primaria']
+    resumo['so_sombra'] = soma['so_sombra']
+    resumo['delta_medio'] = soma['soma_delta_abs'] / n
+    resumo['vies'] = soma['soma_delta'] / n
+    resumo['delta_max'] = soma['delta_abs_max']
+    resumo['frac_delta_acima_0.05'] = soma[acima].sum(axis=1) / n
+    return resumo
+
+
+def imprimir_resumo(registros):
+    """Imprime o resumo de `resumir_log` e os lotes com erro. Retorna o resumo."""
+    registros = _registros(registros)
+    resumo = resumir_log(registros)
+    erros = [r for r in registros if r.get('erro')]
+    linhas = sum(r['linhas'] for r in registros if not r.get('erro'))
+    divergentes = sum(r.get('linhas_divergentes', 0) for r in registros)
+    print(f"--- SOMBRA: {len(registros)} lote(s), {linhas:,} linhas comparadas, "
+          f"{divergentes:,} com algum alerta diferente ---")
+    if len(resumo):
+        print(resumo.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+    for registro in erros[:10]:
+        print(f"⚠️ Lote '{registro.get('lote')}': sombra falhou ({registro['erro']})")
+    sem_par = sorted({t for r in registros for t in r.get('sem_par', [])})
+    if sem_par:
+        print(f"⚠️ Targets presentes em só uma das versões (não comparados): {', '.join(sem_par)}")
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumo do log de pontuação em sombra.")
+    parser.add_argument('log', help="Log JSONL gravado pela pontuação em sombra.")
+    parser.add_argument('--max-divergencia', type=float,
+                        help="Sai com código 1 se a fração de alertas trocados de algum target passar deste valor.")
+    parser.add_argument('--csv', help="Grava o resumo por target neste CSV.")
+    args = parser.parse_args()
+
+    resumo = imprimir_resumo(args.log)
+    if args.csv and len(resumo):
+        resumo.to_csv(args.csv, index=False)
+        print(f"Resumo salvo em '{args.csv}'")
+    if args.max_divergencia is not None and len(resumo):
+        acima = resumo[1 - resumo['concordancia'] > args.max_divergencia]
+        if len(acima):
+            print(f"\n❌ Divergência de alertas acima de {args.max_divergencia} em: {', '.join(acima['target'])}")
+            sys.exit(1)
+        print(f"\n✅ Divergência de alertas dentro de {args.max_divergencia} em todos os targets.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Modelo de stacking treinado na etapa 3 e carregado pelo app e pela etapa 5."""
+
+import numpy as np
+
+
+class ModeloStacking:
+    """
+    Combina base learners já treinados com um meta-learner aplicado sobre
+    as probabilidades de cada um. Expõe a mesma interface dos modelos
+    especializados (predict_proba/predict), então o app não precisa saber
+    que o target foi treinado com stacking.
+    """
+
+    def __init__(self, base_learners, meta_learner):
+        self.base_learners = base_learners
+        self.meta_learner = meta_learner
+        self.classes_ = np.array([0, 1])
+
+    def meta_features(self, X):
+        """Empilha a probabilidade positiva de cada base learner em colunas."""
+        X = np.asarray(X)
+        return np.column_stack([
+            modelo.predict_proba(X)[:, 1] for modelo in self.base_learners.values()
+        ])
+
+    def predict_proba(self, X):
+        return self.meta_learner.predict_proba(self.meta_features(X))
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
@@ -4,10 +4,13 @@ import pandas as pd
 from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
-from ydata_profiling import ProfileReport
 import os
+import sys
 import seaborn as sns
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gembaguard.esquema import carregar_esquema
+
 def carregar_dados():
     """Carrega o dataset e retorna um DataFrame."""
     print("--- INICIANDO ETAPA 1: ENTENDIMENTO DOS DADOS ---")
@@ -31,19 +34,8 @@ def converter_colunas_falhas(df):
     
     falhas_esperadas = ['FDF', 'FDC', 'FP', 'FTE', 'FA']
     
-    mapeamento_nomes = {
-        'FDF (Falha Desgaste Ferramenta)': 'FDF',
-        'FDC (Falha Dissipacao Calor)': 'FDC',
-        'FP (Falha Potencia)': 'FP',
-        'FTE (Falha Tensao Excessiva)': 'FTE',
-        'FA (Falha Aleatoria)': 'FA',
-        'falha_maquina': 'falha_maquina'
-    }
-    
-    colunas_para_renomear = {
-        col: mapeamento_nomes[col] for col in df.columns if col in mapeamento_nomes
-    }
-    df.rename(columns=colunas_para_renomear, inplace=True)
+    # Os nomes longos das falhas estão no esquema de entrada padrão (o mesmo do app)
+    carregar_esquema().aplicar(df)
     
     print("   -> Colunas de falha renomeadas para nomes curtos.")
     
@@ -189,6 +181,9 @@ def main():
         print(f"DataFrame inicial salvo em '{caminho_saida}'")
         print("\n--- ETAPA 1 CONCLUÍDA! PRÓXIMO PASSO: '2_preparacao.py' ---")
 
+        # ydata_profiling é pesado de importar; só é carregado quando o relatório é gerado
+        from ydata_profiling import ProfileReport
+
         profile = ProfileReport(
             df_analisado,
             title='EDA Report - Sistema de Manutenção Preditiva',
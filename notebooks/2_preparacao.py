@@ -3,12 +3,17 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import argparse
 import warnings
 import os
 import matplotlib.pyplot as plt
 import seaborn as sns
+import sys
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gembaguard.rastreamento import span
+
 def carregar_dados_etapa_anterior(caminho):
     """Carrega o DataFrame da etapa anterior."""
     print("--- INICIANDO ETAPA 2: PREPARAÇÃO DOS DADOS ---")
@@ -149,21 +154,38 @@ def visualizar_matriz_correlacao_final(df):
     plt.close()
     print("Matriz de correlação final salva em '2_matriz_correlacao_final.png'")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Etapa 2: limpeza e criação de features.")
+    parser.add_argument('--parquet', action='store_true',
+                        help="Salva também '2_df_preparado.parquet' (em row groups), lido pelo modo --fora-da-memoria da etapa 3.")
+    parser.add_argument('--linhas-por-bloco', type=int, default=100_000,
+                        help="Linhas por row group do Parquet.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     script_dir = os.path.dirname(os.path.abspath(__file__))
     caminho_entrada = os.path.join(script_dir, "1_df_analise_inicial.pkl")
     caminho_saida = os.path.join(script_dir, "2_df_preparado.pkl")
     
     df = carregar_dados_etapa_anterior(caminho_entrada)
     if df is not None:
-        df_limpo = limpar_dados(df)
-        df_final = criar_features_avancadas(df_limpo)
+        with span('limpar_dados', linhas=len(df)):
+            df_limpo = limpar_dados(df)
+        with span('criar_features_avancadas', linhas=len(df_limpo)):
+            df_final = criar_features_avancadas(df_limpo)
         
         visualizar_features_criadas(df, df_final)
         visualizar_matriz_correlacao_final(df_final)
 
-        df_final.to_pickle(caminho_saida)
+        with span('exportacao_pickle', linhas=len(df_final)):
+            df_final.to_pickle(caminho_saida)
         print(f"\n DataFrame preparado salvo em '{caminho_saida}'")
+        if args.parquet:
+            caminho_parquet = os.path.join(script_dir, "2_df_preparado.parquet")
+            with span('exportacao_parquet', linhas=len(df_final)):
+                df_final.to_parquet(caminho_parquet, index=False, row_group_size=args.linhas_por_bloco)
+            print(f" DataFrame preparado salvo em '{caminho_parquet}' (blocos de {args.linhas_por_bloco:,} linhas)")
         print("\n--- ETAPA 2 CONCLUÍDA! PRÓXIMO PASSO: '3_modelagem.py' ---")
 
 if __name__ == "__main__":
@@ -4,21 +4,34 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+import argparse
+import importlib.util
+import sys
+import tempfile
+import time
 import warnings
 import joblib
 import os
-import xgboost as xgb
-import lightgbm as lgb
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import f1_score, precision_score
-from imblearn.combine import SMOTETomek
-from iterstrat.ml_stratifiers import MultilabelStratifiedShuffleSplit
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split, RandomizedSearchCV
-from sklearn.tree import DecisionTreeClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.multioutput import ClassifierChain
+from sklearn.model_selection import RandomizedSearchCV, train_test_split
 from sklearn.base import clone
+from joblib import Parallel, delayed
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gembaguard.stacking import ModeloStacking
+from gembaguard.multilabel import ModeloMultiLabel
+from gembaguard.predicao import prever_probabilidade_target
+from gembaguard.deriva import MonitorDeriva
+from gembaguard.booster import ModeloBooster
+from gembaguard.compressao import FlorestaQuantizada, curva_arvores, escolher_n_arvores, podar_floresta
+from gembaguard.avaliacao import avaliar_multilabel, resultado_para_json
+from gembaguard.registro import RegistroModelos
+
 
 np.random.seed(42)
 pd.options.mode.chained_assignment = None
@@ -65,6 +78,8 @@ def preparar_dados_para_modelagem(df):
     """
     Prepara os dados, dividindo, normalizando e separando targets e features.
     """
+    from iterstrat.ml_stratifiers import MultilabelStratifiedShuffleSplit
+
     print("\n--- PREPARAÇÃO DOS DADOS PARA MODELAGEM ---")
 
     targets = ['FDF', 'FDC', 'FP', 'FTE', 'FA']
@@ -86,8 +101,8 @@ def preparar_dados_para_modelagem(df):
 
     return X_train_scaled, X_test_scaled, y_train, y_test, features, targets
 
-def otimizar_randomized_search(model_base, param_distributions, X, y):
-    """Otimiza hiperparâmetros usando RandomizedSearchCV."""
+def otimizar_randomized_search(model_base, param_distributions, X, y, **parametros_fit):
+    """Otimiza hiperparâmetros usando RandomizedSearchCV. `parametros_fit` vai para o fit de cada candidato."""
     print(f"   -> Iniciando otimização com RandomizedSearchCV...")
     random_search = RandomizedSearchCV(
         estimator=model_base,
@@ -100,13 +115,156 @@ def otimizar_randomized_search(model_base, param_distributions, X, y):
         error_score=0
     )
     
-    random_search.fit(X, y)
+    random_search.fit(X, y, **parametros_fit)
     print("   -> Otimização concluída.")
     print("   -> Melhores parâmetros:", random_search.best_params_)
     
     return random_search.best_estimator_, random_search.best_params_
 
-def treinar_modelo_especializado(X, y, target_name):
+ESTRATEGIAS_BALANCEAMENTO = ('smote_tomek', 'subamostragem', 'peso')
+
+# Early stopping: teto de árvores e rodadas sem melhora na validação antes de parar
+RODADAS_MAXIMAS = 1000
+PACIENCIA_EARLY_STOPPING = 50
+
+def separar_validacao(X, y_target, test_size=0.2):
+    """Separa um fold de validação estratificado (antes de qualquer reamostragem)."""
+    return train_test_split(X, y_target, test_size=test_size, stratify=y_target, random_state=42)
+
+def parametros_early_stopping(X_validacao, y_validacao):
+    """
+    Parâmetros de fit do LGBMClassifier para parar quando a logloss na
+    validação não melhora. A validação é pesada como 'balanced', o mesmo
+    balanceamento do treino (class_weight, SMOTE ou scale_pos_weight):
+    sem o peso, a logloss para cedo demais e as probabilidades não chegam
+    ao threshold de alerta.
+    """
+    import lightgbm as lgb
+
+    return {
+        'eval_set': [(X_validacao, y_validacao)],
+        'eval_class_weight': ['balanced'],
+        'eval_metric': 'binary_logloss',
+        'callbacks': [lgb.early_stopping(PACIENCIA_EARLY_STOPPING, first_metric_only=True, verbose=False)],
+    }
+
+def rodadas_boosting(modelos):
+    """Número de rodadas de boosting de cada modelo LightGBM/XGBoost (para o artefato)."""
+    rodadas = {}
+    for target, modelo in modelos.items():
+        nome_classe = type(modelo).__name__
+        if nome_classe in ('LGBMClassifier', 'XGBClassifier'):
+            rodadas[target] = int(modelo.get_params()['n_estimators'])
+        elif nome_classe == 'ModeloBooster':
+            rodadas[target] = int(modelo.booster.current_iteration())
+    return rodadas
+
+def registrar_versao(args, script_dir, bundle):
+    """
+    Registra os artefatos salvos como uma nova versão no registro de modelos
+    (`--registrar`), com as métricas do conjunto de teste no limiar 0.5, e a
+    promove com `--promover`.
+    """
+    print("\n--- REGISTRANDO VERSÃO NO REGISTRO DE MODELOS ---")
+    targets = [t for t in bundle['targets'] if t in bundle['modelos']]
+    cache_multilabel = {}
+    y_proba = pd.DataFrame({
+        target: prever_probabilidade_target(bundle['modelos'][target], bundle['X_test'], cache_multilabel)
+        for target in targets
+    }, index=bundle['X_test'].index)
+    metricas = resultado_para_json(avaliar_multilabel(bundle['y_test'], y_proba, targets, limiares=0.5))
+
+    registro = RegistroModelos(args.registrar)
+    versao = registro.registrar(
+        os.path.join(script_dir, "3_modelos_treinados.pkl"),
+        os.path.join(script_dir, "3_standard_scaler.pkl"),
+        os.path.join(script_dir, "3_referencia_deriva.pkl"),
+        metricas=metricas, notas=f"modo={bundle['modo']}", bundle=bundle,
+    )
+    print(f"✅ Versão '{versao}' registrada em '{args.registrar}' (F1 macro no teste: {metricas['f1_macro']:.4f})")
+    if args.promover:
+        anterior = registro.promover(versao)
+        print(f"✅ Versão '{versao}' promovida (anterior: '{anterior}')")
+    return versao
+
+def treinar_lightgbm_balanceado(X, y_target, estrategia='smote_tomek', early_stopping=True):
+    """
+    Otimiza um LightGBM para um target desbalanceado. 'smote_tomek' aumenta
+    o treino com amostras sintéticas; 'subamostragem' treina um ensemble de
+    subconjuntos balanceados (todos os positivos + a mesma quantidade de
+    negativos sorteados, estilo EasyEnsemble); 'peso' treina nos dados
+    originais com scale_pos_weight. Retorna (modelo, melhores parâmetros,
+    linhas vistas por ajuste).
+
+    Com `early_stopping` (smote_tomek e peso), o número de árvores sai do
+    grid: cada candidato treina até RODADAS_MAXIMAS e para quando a
+    validação estratificada deixa de melhorar. O modelo final é retreinado
+    com exatamente as rodadas escolhidas (salvas em best_params['n_estimators']).
+    """
+    # LightGBM e imblearn só são importados quando este ramo é usado
+    import lightgbm as lgb
+
+    param_distributions = {
+        'n_estimators': [100, 200, 300],
+        'learning_rate': [0.01, 0.05, 0.1],
+        'num_leaves': [20, 31, 50],
+        'max_depth': [5, 10, 15],
+    }
+
+    if estrategia == 'subamostragem':
+        from imblearn.ensemble import BalancedBaggingClassifier
+
+        # Cada membro vê só 2x os positivos; o paralelismo fica com a busca.
+        # Os membros são treinados pelo imblearn, então aqui o grid de árvores é mantido.
+        model_base = BalancedBaggingClassifier(
+            estimator=lgb.LGBMClassifier(random_state=42, n_jobs=1, verbose=-1),
+            n_estimators=10, bootstrap=False, sampling_strategy='auto', replacement=False,
+            random_state=42, n_jobs=1,
+        )
+        param_distributions = {f'estimator__{nome}': valores for nome, valores in param_distributions.items()}
+        linhas_por_ajuste = 2 * int(np.sum(y_target))
+        print(f"   -> Ensemble de 10 subconjuntos balanceados de {linhas_por_ajuste} linhas (de {len(y_target)}).")
+        model, best_params = otimizar_randomized_search(model_base, param_distributions, X, y_target)
+        return model, best_params, linhas_por_ajuste
+
+    if estrategia not in ESTRATEGIAS_BALANCEAMENTO:
+        raise ValueError(f"Estratégia de balanceamento '{estrategia}' desconhecida. Use uma de: {ESTRATEGIAS_BALANCEAMENTO}")
+
+    parametros_fit = {}
+    if early_stopping:
+        X, X_validacao, y_target, y_validacao = separar_validacao(X, y_target)
+        parametros_fit = parametros_early_stopping(X_validacao, y_validacao)
+        param_distributions.pop('n_estimators')
+        print(f"   -> Early stopping: validação estratificada de {len(y_validacao)} linhas, "
+              f"até {RODADAS_MAXIMAS} rodadas (paciência {PACIENCIA_EARLY_STOPPING}).")
+
+    casos_positivos = int(np.sum(y_target))
+    if estrategia == 'smote_tomek':
+        from imblearn.combine import SMOTETomek
+
+        model_base = lgb.LGBMClassifier(random_state=42, n_jobs=-1, class_weight='balanced', verbose=-1)
+        smote_tomek = SMOTETomek(random_state=42)
+        X_ajuste, y_ajuste = smote_tomek.fit_resample(X, y_target)
+        print(f"   -> Dados balanceados para otimização. Antes: {len(y_target)}, Depois: {len(y_ajuste)}")
+    else:
+        model_base = lgb.LGBMClassifier(random_state=42, n_jobs=-1, verbose=-1,
+                                        scale_pos_weight=(len(y_target) - casos_positivos) / casos_positivos)
+        X_ajuste, y_ajuste = X, y_target
+
+    if early_stopping:
+        model_base.set_params(n_estimators=RODADAS_MAXIMAS)
+    model, best_params = otimizar_randomized_search(clone(model_base), param_distributions, X_ajuste, y_ajuste,
+                                                    **parametros_fit)
+
+    if early_stopping:
+        # Sem as árvores treinadas depois do melhor ponto: modelo menor e predição mais rápida
+        rodadas = max(int(model.best_iteration_ or RODADAS_MAXIMAS), 1)
+        model = clone(model).set_params(n_estimators=rodadas).fit(X_ajuste, y_ajuste)
+        best_params = dict(best_params, n_estimators=rodadas)
+        print(f"   -> Rodadas escolhidas pelo early stopping: {rodadas}")
+    return model, best_params, len(y_ajuste)
+
+def treinar_modelo_especializado(X, y, target_name, balanceamento='smote_tomek', early_stopping=True):
     """
     Escolhe e treina o melhor modelo para um único target de falha.
     """
@@ -132,18 +290,8 @@ def treinar_modelo_especializado(X, y, target_name):
             }
             model, best_params = otimizar_randomized_search(model_base, param_distributions, X, y_target)
         else: 
-            model_base = lgb.LGBMClassifier(random_state=42, n_jobs=-1, class_weight='balanced')
-            param_distributions = {
-                'n_estimators': [100, 200, 300],
-                'learning_rate': [0.01, 0.05, 0.1],
-                'num_leaves': [20, 31, 50],
-                'max_depth': [5, 10, 15],
-            }
-           
-            smote_tomek = SMOTETomek(random_state=42)
-            X_res, y_res = smote_tomek.fit_resample(X, y_target)
-            print(f"   -> Dados balanceados para otimização. Antes: {len(y_target)}, Depois: {len(y_res)}")
-            model, best_params = otimizar_randomized_search(clone(model_base), param_distributions, X_res, y_res)
+            print(f"   -> Balanceamento: {balanceamento}")
+            model, best_params, _ = treinar_lightgbm_balanceado(X, y_target, balanceamento, early_stopping)
     else:
         print("   -> Poucos casos positivos. Usando Random Forest sem otimização.")
         model = RandomForestClassifier(n_estimators=150, max_depth=10, 
@@ -162,6 +310,438 @@ def treinar_modelo_especializado(X, y, target_name):
     return model
 
 
+def criar_base_learners(ratio_positivo):
+    """
+    Cria os base learners do stacking. Cada um roda com n_jobs=1 porque o
+    paralelismo fica a cargo do pool de processos que treina os folds.
+    """
+    import lightgbm as lgb
+    import xgboost as xgb
+
+    peso_positivo = (1 - ratio_positivo) / max(ratio_positivo, 1e-6)
+    return {
+        'random_forest': RandomForestClassifier(n_estimators=200, max_depth=15, min_samples_leaf=2,
+                                                class_weight='balanced', random_state=42, n_jobs=1),
+        'lightgbm': lgb.LGBMClassifier(n_estimators=200, learning_rate=0.05, num_leaves=31,
+                                       class_weight='balanced', random_state=42, n_jobs=1, verbose=-1),
+        'xgboost': xgb.XGBClassifier(n_estimators=200, learning_rate=0.05, max_depth=6,
+                                     scale_pos_weight=peso_positivo, random_state=42, n_jobs=1,
+                                     eval_metric='logloss'),
+    }
+
+def _treinar_base_learner(nome, estimador, X, y, idx_treino, idx_validacao):
+    """
+    Treina um base learner. Com idx_validacao devolve apenas as predições
+    out-of-fold; sem ele (treino completo) devolve o modelo ajustado.
+    """
+    inicio = time.perf_counter()
+    modelo = clone(estimador).fit(X[idx_treino], y[idx_treino])
+    tempo = time.perf_counter() - inicio
+    if idx_validacao is None:
+        return nome, None, modelo, tempo
+    return nome, idx_validacao, modelo.predict_proba(X[idx_validacao])[:, 1], tempo
+
+def gerar_folds_stacking(y, n_splits=5):
+    """Gera os folds out-of-fold com a mesma estratificação multi-label do split treino/teste."""
+    from iterstrat.ml_stratifiers import MultilabelStratifiedKFold
+
+    mskf = MultilabelStratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    return list(mskf.split(np.zeros(len(y)), y.to_numpy()))
+
+def medir_latencia(modelo, X, repeticoes=3):
+    """Retorna a menor latência (em ms) de um predict_proba sobre X."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        modelo.predict_proba(X)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos) * 1000
+
+def treinar_modelo_stacking(X, y, target_name, folds, X_test=None, n_jobs=-1, balanceamento='smote_tomek',
+                            early_stopping=True):
+    """
+    Treina um stacking (RandomForest + LightGBM + XGBoost -> regressão
+    logística) para um único target. Folds e base learners são treinados
+    em paralelo em um pool de processos. Com `X_test`, o relatório inclui a
+    latência de cada componente e a do modelo especializado (o do modo
+    padrão, com `balanceamento` e `early_stopping`) treinado para o mesmo target.
+    """
+    print(f"\n--- TREINANDO STACKING PARA '{target_name}' ---")
+
+    y_target = y[target_name].to_numpy()
+    casos_positivos = y_target.sum()
+    if casos_positivos <= 5:
+        print("   -> Poucos casos positivos para gerar predições out-of-fold. Usando modelo especializado.")
+        return treinar_modelo_especializado(X, y, target_name, balanceamento, early_stopping), None
+
+    X_array = np.ascontiguousarray(X.to_numpy())
+    base_learners = criar_base_learners(casos_positivos / len(y_target))
+    todos_indices = np.arange(len(y_target))
+
+    tarefas = []
+    for nome, estimador in base_learners.items():
+        for idx_treino, idx_validacao in folds:
+            tarefas.append(delayed(_treinar_base_learner)(nome, estimador, X_array, y_target, idx_treino, idx_validacao))
+        tarefas.append(delayed(_treinar_base_learner)(nome, estimador, X_array, y_target, todos_indices, None))
+
+    print(f"   -> Treinando {len(tarefas)} tarefas ({len(base_learners)} learners x {len(folds)} folds + treino completo)...")
+    inicio = time.perf_counter()
+    resultados = Parallel(n_jobs=n_jobs)(tarefas)
+    tempo_paralelo = time.perf_counter() - inicio
+
+    nomes = list(base_learners)
+    oof = np.zeros((len(y_target), len(nomes)))
+    modelos_finais = {}
+    relatorio = {nome: {'tempo_folds_s': 0.0, 'tempo_treino_completo_s': 0.0} for nome in nomes}
+    for nome, idx_validacao, saida, tempo in resultados:
+        if idx_validacao is None:
+            modelos_finais[nome] = saida
+            relatorio[nome]['tempo_treino_completo_s'] = tempo
+        else:
+            oof[idx_validacao, nomes.index(nome)] = saida
+            relatorio[nome]['tempo_folds_s'] += tempo
+
+    inicio = time.perf_counter()
+    meta_learner = LogisticRegression(class_weight='balanced', max_iter=1000)
+    meta_learner.fit(oof, y_target)
+    tempo_meta = time.perf_counter() - inicio
+    relatorio['meta_learner'] = {'tempo_folds_s': 0.0, 'tempo_treino_completo_s': tempo_meta}
+
+    model = ModeloStacking({nome: modelos_finais[nome] for nome in nomes}, meta_learner)
+
+    for nome in nomes:
+        relatorio[nome]['f1_oof'] = f1_score(y_target, (oof[:, nomes.index(nome)] > 0.5).astype(int), zero_division=0)
+    relatorio['stacking'] = {
+        'tempo_treino_completo_s': tempo_paralelo + tempo_meta,
+        'f1_oof': f1_score(y_target, (meta_learner.predict_proba(oof)[:, 1] > 0.5).astype(int), zero_division=0),
+    }
+
+    if X_test is not None:
+        X_test_array = np.ascontiguousarray(X_test.to_numpy())
+        for nome in nomes:
+            relatorio[nome]['latencia_ms'] = medir_latencia(modelos_finais[nome], X_test_array)
+        relatorio['stacking']['latencia_ms'] = medir_latencia(model, X_test_array)
+
+        # Referência: o modelo único otimizado que o modo padrão serviria para este target
+        inicio = time.perf_counter()
+        especializado = treinar_modelo_especializado(X, y, target_name, balanceamento, early_stopping)
+        tempo_especializado = time.perf_counter() - inicio
+        if especializado is not None:
+            relatorio['modelo_especializado'] = {
+                'tempo_treino_completo_s': tempo_especializado,
+                'latencia_ms': medir_latencia(especializado, X_test_array),
+            }
+
+    relatorio = pd.DataFrame(relatorio).T
+    relatorio.index.name = 'componente'
+    print(f"   -> Treinamento concluído em {tempo_paralelo:.1f}s (paralelo).")
+    print("\n   -> Tempo de treino, F1 out-of-fold e latência por componente (e do modelo especializado):")
+    print(relatorio.round(4).to_string())
+
+    return model, relatorio
+
+
+def treinar_modelo_multilabel(X, y, targets, estrategia='multi_saida'):
+    """
+    Treina um único modelo para todos os targets, aproveitando a correlação
+    entre as falhas. 'multi_saida' usa uma Random Forest multi-saída (uma
+    única floresta, uma travessia por linha); 'cadeia' usa um ClassifierChain
+    em que cada target recebe as predições dos anteriores como feature.
+    """
+    print(f"\n--- TREINANDO MODELO MULTI-LABEL ({estrategia}) PARA {targets} ---")
+
+    floresta = RandomForestClassifier(n_estimators=200, max_depth=15, min_samples_leaf=2,
+                                      random_state=42, n_jobs=-1, class_weight='balanced')
+    if estrategia == 'cadeia':
+        estimador = ClassifierChain(floresta, random_state=42)
+    else:
+        estimador = floresta
+
+    targets_treinaveis = [t for t in targets if y[t].nunique() > 1]
+    if len(targets_treinaveis) < len(targets):
+        print(f"   -> Targets sem casos positivos no treino (probabilidade fixa em 0): "
+              f"{[t for t in targets if t not in targets_treinaveis]}")
+
+    estimador.fit(X.to_numpy(), y[targets_treinaveis].to_numpy())
+    model = ModeloMultiLabel(estimador, targets, targets_treinaveis)
+    print("   -> Treinamento concluído.")
+
+    if hasattr(estimador, 'feature_importances_'):
+        importances = pd.DataFrame({'feature': X.columns, 'importance': estimador.feature_importances_})
+        importances = importances.sort_values('importance', ascending=False).head(5)
+        print("\n   -> Top 5 Features Mais Importantes (compartilhadas entre os targets):")
+        print(importances.to_string(index=False))
+
+    return model
+
+def comparar_balanceamento(X_train, y_train, X_test, y_test, targets, early_stopping=True):
+    """
+    Treina o LightGBM de cada target com cada estratégia de balanceamento e
+    compara o tempo da busca de hiperparâmetros, as linhas vistas por ajuste,
+    as rodadas de boosting e o F1 (threshold 0.5) no conjunto de teste.
+    """
+    print("\n--- COMPARANDO ESTRATÉGIAS DE BALANCEAMENTO (LIGHTGBM) ---")
+    linhas = []
+    for target in targets:
+        if y_train[target].sum() <= 5:
+            print(f"\n   -> '{target}': poucos casos positivos, comparação ignorada.")
+            continue
+        for estrategia in ESTRATEGIAS_BALANCEAMENTO:
+            print(f"\n   -> '{target}' com '{estrategia}':")
+            inicio = time.perf_counter()
+            modelo, best_params, linhas_por_ajuste = treinar_lightgbm_balanceado(X_train, y_train[target], estrategia,
+                                                                                 early_stopping)
+            tempo = time.perf_counter() - inicio
+            y_pred = (prever_probabilidade_target(modelo, X_test.to_numpy()) > 0.5).astype(int)
+            linhas.append({
+                'target': target,
+                'estrategia': estrategia,
+                'tempo_treino_s': tempo,
+                'linhas_por_ajuste': linhas_por_ajuste,
+                'rodadas': best_params.get('n_estimators', best_params.get('estimator__n_estimators')),
+                'f1_teste': f1_score(y_test[target], y_pred, zero_division=0),
+                'precisao_teste': precision_score(y_test[target], y_pred, zero_division=0),
+            })
+
+    relatorio = pd.DataFrame(linhas).set_index(['target', 'estrategia'])
+    print("\n   -> Tempo de treino e F1 por estratégia:")
+    print(relatorio.round(4).to_string())
+    return relatorio
+
+def tamanho_serializado_mb(objeto):
+    """Tamanho em MB do objeto serializado com joblib, como seria salvo no artefato."""
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'modelo.pkl')
+        joblib.dump(objeto, caminho)
+        return os.path.getsize(caminho) / 1024 ** 2
+
+def medir_modelo(modelo, X):
+    """Tamanho em disco, tempo de carga e latência (por linha em lote e de uma linha isolada)."""
+    X_array = np.ascontiguousarray(X)
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'modelo.pkl')
+        joblib.dump(modelo, caminho)
+        tamanho = os.path.getsize(caminho) / 1024 ** 2
+        tempos = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            joblib.load(caminho)
+            tempos.append(time.perf_counter() - inicio)
+    return {
+        'tamanho_mb': tamanho,
+        'carga_ms': min(tempos) * 1000,
+        'latencia_us_por_linha': medir_latencia(modelo, X_array) * 1000 / max(len(X_array), 1),
+        'latencia_ms_1_linha': medir_latencia(modelo, X_array[:1]),
+    }
+
+def comprimir_florestas(modelos, X_train, y_train, X_test, y_test, tolerancia=0.01, quantizar=False):
+    """
+    Poda as Random Forests para o menor prefixo de árvores cujo F1 e AUC
+    ficam a no máximo `tolerancia` da floresta completa e, opcionalmente,
+    quantiza as árvores para float32. O número de árvores é escolhido em uma
+    validação estratificada separada do treino (`separar_validacao`): uma
+    cópia da floresta é retreinada sem essas linhas e a curva é medida nelas.
+    O holdout só entra no relatório antes/depois. Retorna (modelos,
+    relatório antes/depois, curvas F1/AUC da validação por número de árvores).
+    """
+    from sklearn.metrics import roc_auc_score
+
+    def probabilidade_positiva(floresta):
+        if 1 not in floresta.classes_:
+            return np.zeros(len(X_test))
+        return floresta.predict_proba(X_test.to_numpy())[:, list(floresta.classes_).index(1)]
+
+    print(f"\n--- COMPRIMINDO FLORESTAS (TOLERÂNCIA {tolerancia}, QUANTIZAÇÃO {'SIM' if quantizar else 'NÃO'}) ---")
+    modelos = dict(modelos)
+    linhas, curvas = [], {}
+    for target, modelo in modelos.items():
+        if not isinstance(modelo, RandomForestClassifier) or isinstance(modelo, FlorestaQuantizada):
+            continue
+        if y_train[target].sum() < 2:
+            print(f"   -> '{target}': positivos insuficientes para a validação; floresta mantida.")
+            continue
+        X_ajuste, X_validacao, y_ajuste, y_validacao = separar_validacao(X_train, y_train[target])
+        referencia = clone(modelo).fit(X_ajuste, y_ajuste)
+        curva = curvas[target] = curva_arvores(referencia, X_validacao, y_validacao.to_numpy())
+        n_arvores = escolher_n_arvores(curva, tolerancia)
+        comprimido = podar_floresta(modelo, n_arvores)
+        if quantizar:
+            comprimido = FlorestaQuantizada.de_floresta(comprimido)
+
+        y_target = y_test[target].to_numpy()
+        tem_duas_classes = 0 < y_target.sum() < len(y_target)
+        linha = {'target': target, 'arvores_antes': len(modelo.estimators_), 'arvores_depois': n_arvores,
+                 'linhas_validacao': len(y_validacao)}
+        for momento, m in (('antes', modelo), ('depois', comprimido)):
+            proba = probabilidade_positiva(m)
+            linha[f'f1_{momento}'] = f1_score(y_target, (proba > 0.5).astype(int), zero_division=0)
+            linha[f'auc_{momento}'] = roc_auc_score(y_target, proba) if tem_duas_classes else np.nan
+            linha.update({f'{nome}_{momento}': valor for nome, valor in medir_modelo(m, X_test).items()})
+        linhas.append(linha)
+        modelos[target] = comprimido
+        print(f"   -> '{target}': {linha['arvores_antes']} -> {n_arvores} árvores, "
+              f"{linha['tamanho_mb_antes']:.1f} -> {linha['tamanho_mb_depois']:.1f} MB, "
+              f"F1 {linha['f1_antes']:.4f} -> {linha['f1_depois']:.4f}")
+
+    if not linhas:
+        print("   -> Nenhuma Random Forest para comprimir.")
+        return modelos, pd.DataFrame(), pd.DataFrame()
+    relatorio = pd.DataFrame(linhas).set_index('target')
+    print("\n   -> Antes/depois (tamanho, carga, latência por linha em lote e de uma linha):")
+    print(relatorio.round(4).T.to_string())
+    return modelos, relatorio, pd.concat(curvas, names=['target']).reset_index(level=0)
+
+def carregar_avaliar_metrica_multilabel():
+    """Importa avaliar_metrica_multilabel da etapa 4 (o nome do arquivo começa com dígito)."""
+    caminho = Path(__file__).resolve().parent / '4_avaliacao.py'
+    spec = importlib.util.spec_from_file_location('avaliacao', caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo.avaliar_metrica_multilabel
+
+def comparar_configuracoes(configuracoes, X_test, y_test, targets):
+    """
+    Compara configurações de modelos ({nome: (modelos, tempo_treino_s)}) em
+    tempo de treino, tamanho em disco, latência de predição dos 5 targets
+    e F1 macro no conjunto de teste.
+    """
+    print("\n--- COMPARANDO MULTI-LABEL COM MODELOS POR TARGET ---")
+    avaliar_metrica_multilabel = carregar_avaliar_metrica_multilabel()
+    X_test_array = np.ascontiguousarray(X_test.to_numpy())
+
+    linhas = []
+    for nome, (modelos, tempo_treino) in configuracoes.items():
+        tempos = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            cache_multilabel = {}
+            y_proba = {t: prever_probabilidade_target(modelos[t], X_test_array, cache_multilabel) for t in targets}
+            tempos.append(time.perf_counter() - inicio)
+
+        y_pred = pd.DataFrame({t: (y_proba[t] > 0.5).astype(int) for t in targets}, index=y_test.index)
+        print(f"\n   -> Configuração '{nome}':")
+        metricas = avaliar_metrica_multilabel(y_test[targets], y_pred, targets)
+        linhas.append({
+            'configuracao': nome,
+            'tempo_treino_s': tempo_treino,
+            'tamanho_mb': tamanho_serializado_mb(modelos),
+            'latencia_predicao_ms': min(tempos) * 1000,
+            'f1_macro': metricas['f1_macro'],
+        })
+
+    comparativo = pd.DataFrame(linhas).set_index('configuracao')
+    print("\n   -> Comparativo:")
+    print(comparativo.round(4).to_string())
+    return comparativo
+
+
+def treinar_fora_da_memoria(args, script_dir):
+    """
+    Treina um LightGBM por target sem carregar o histórico inteiro: o
+    dataset preparado é lido do Parquet bloco a bloco (ver
+    gembaguard.fora_da_memoria). Salva os mesmos artefatos dos outros modos.
+    """
+    import lightgbm as lgb
+    from gembaguard.fora_da_memoria import (FonteParquet, SequenciaParquet, acumular_referencia, ajustar_scaler,
+                                            dividir_por_indice, ler_targets, listar_parquets)
+
+    print("--- INICIANDO ETAPA 3: MODELAGEM FORA DA MEMÓRIA ---")
+    arquivos = listar_parquets(args.entrada or [os.path.join(script_dir, "2_df_preparado.parquet")])
+    arquivos_faltando = [a for a in arquivos if not os.path.exists(a)]
+    if not arquivos or arquivos_faltando:
+        print(f"Erro: arquivo(s) Parquet não encontrado(s): {arquivos_faltando or args.entrada}")
+        print("Execute a Etapa 2 com '--parquet' primeiro.")
+        return
+
+    fonte = FonteParquet(arquivos)
+    targets = ['FDF', 'FDC', 'FP', 'FTE', 'FA']
+    features = [col for col in fonte.colunas if col not in targets + ['id', 'id_produto', 'falha_maquina', 'tipo']]
+    print(f"{len(fonte):,} linhas em {len(fonte.blocos)} blocos ({len(arquivos)} arquivo(s)), {len(features)} features.")
+
+    print("\n--- SPLIT ESTRATIFICADO (SÓ OS TARGETS EM MEMÓRIA) ---")
+    y = ler_targets(fonte, targets)
+    idx_treino, idx_teste = dividir_por_indice(y)
+    print(f"   -> Treino: {len(idx_treino):,} linhas | Teste: {len(idx_teste):,} linhas")
+
+    print("\n--- AJUSTANDO O SCALER BLOCO A BLOCO ---")
+    scaler, amostra = ajustar_scaler(fonte, features, idx_treino)
+    caminho_scaler = os.path.join(script_dir, "3_standard_scaler.pkl")
+    joblib.dump(scaler, caminho_scaler)
+    print(f"   -> Scaler ajustado com {len(idx_treino):,} linhas de treino e salvo em '{caminho_scaler}'")
+
+    # Bordas da deriva pelos quantis de uma amostra do treino; contagens com todas as linhas de treino
+    referencia_deriva = MonitorDeriva.criar_referencia(amostra, features).novo_monitor()
+    acumular_referencia(fonte, referencia_deriva, features, idx_treino)
+    caminho_referencia = os.path.join(script_dir, "3_referencia_deriva.pkl")
+    joblib.dump(referencia_deriva, caminho_referencia)
+    print(f"Referência de deriva salva em '{caminho_referencia}'")
+
+    print("\n--- CONSTRUINDO O DATASET BINÁRIO DO LIGHTGBM ---")
+    inicio = time.perf_counter()
+    y_treino = y[idx_treino]
+    parametros_dataset = {'max_bin': 255, 'bin_construct_sample_cnt': args.amostra_bins, 'verbose': -1}
+    dataset = lgb.Dataset(
+        SequenciaParquet(fonte, features, idx_treino, scaler, args.tamanho_bloco),
+        label=y_treino[:, 0], feature_name=features, params=parametros_dataset, free_raw_data=True,
+    ).construct()
+    print(f"   -> Dataset construído em {time.perf_counter() - inicio:.1f}s.")
+    if args.salvar_dataset:
+        caminho_dataset = os.path.join(script_dir, "3_dataset_treino.bin")
+        dataset.save_binary(caminho_dataset)
+        print(f"   -> Dataset binário salvo em '{caminho_dataset}'")
+
+    modelos_especializados = {}
+    for j, target in enumerate(targets):
+        print(f"\n--- TREINANDO LIGHTGBM PARA '{target}' ---")
+        casos_positivos = int(y_treino[:, j].sum())
+        if casos_positivos == 0:
+            print("   -> Nenhum caso positivo no treino. Target ignorado.")
+            continue
+        print(f"   -> Desbalanceamento: {casos_positivos / len(y_treino):.2%}")
+        dataset.set_label(y_treino[:, j])
+        # Raiz da razão negativos/positivos: o peso integral faz FDF e FA dispararem
+        # alertas em massa no teste, sem ganho de F1 nos demais targets
+        parametros = dict(
+            parametros_dataset, objective='binary', learning_rate=0.05, num_leaves=31, max_depth=10,
+            scale_pos_weight=np.sqrt((len(y_treino) - casos_positivos) / casos_positivos),
+            num_threads=args.n_jobs if args.n_jobs > 0 else 0, seed=42,
+        )
+        inicio = time.perf_counter()
+        modelo = ModeloBooster(lgb.train(parametros, dataset, num_boost_round=args.n_rodadas))
+        modelos_especializados[target] = modelo
+        print(f"   -> Treinamento concluído em {time.perf_counter() - inicio:.1f}s.")
+        importances = pd.DataFrame({'feature': features, 'importance': modelo.feature_importances_})
+        importances = importances.sort_values('importance', ascending=False).head(5)
+        print("\n   -> Top 5 Features Mais Importantes:")
+        print(importances.to_string(index=False))
+
+    # Conjunto de teste para a etapa 4: uma amostra limitada, lida só nas linhas necessárias
+    if len(idx_teste) > args.max_linhas_teste:
+        rng = np.random.default_rng(42)
+        idx_teste = np.sort(rng.choice(idx_teste, args.max_linhas_teste, replace=False))
+    X_test = SequenciaParquet(fonte, features, idx_teste, scaler, args.tamanho_bloco).para_dataframe()
+    y_test = pd.DataFrame(y[idx_teste], columns=targets, index=X_test.index)
+
+    print("\n--- SALVANDO ARTEFATOS DE MODELAGEM ---")
+    caminho_saida = os.path.join(script_dir, "3_modelos_treinados.pkl")
+    dados_treinamento = {
+        'modelos': modelos_especializados,
+        'X_test': X_test,
+        'y_test': y_test,
+        'features': features,
+        'targets': targets,
+        'modo': 'fora_da_memoria',
+        'rodadas_boosting': rodadas_boosting(modelos_especializados),
+    }
+    joblib.dump(dados_treinamento, caminho_saida)
+    print(f" Modelos e dados de teste ({len(X_test):,} linhas) salvos em '{caminho_saida}'")
+
+    if args.registrar:
+        registrar_versao(args, script_dir, dados_treinamento)
+
+    print("\n--- ETAPA 3 CONCLUÍDA! PRÓXIMO PASSO: '4_avaliacao.py' ---")
+
+
 def visualizar_importancia_features(importances, target_name):
     """
     Gera um gráfico de barras da importância das features.
@@ -178,8 +758,59 @@ def visualizar_importancia_features(importances, target_name):
         print(f"Gráfico de importância salvo em '3_importancia_features_{target_name}.png'")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Etapa 3: treinamento dos modelos de falha.")
+    parser.add_argument('--modo', choices=['especializado', 'stacking', 'multilabel'], default='especializado',
+                        help="'especializado' treina um modelo por target; 'stacking' treina RF + LightGBM + XGBoost com meta-learner; "
+                             "'multilabel' treina um único modelo para todos os targets.")
+    parser.add_argument('--estrategia-multilabel', choices=['multi_saida', 'cadeia'], default='multi_saida',
+                        help="Floresta multi-saída ou ClassifierChain no modo multilabel.")
+    parser.add_argument('--comparar', action='store_true',
+                        help="No modo multilabel, treina também os modelos por target e salva o comparativo em '3_comparativo_multilabel.csv'.")
+    parser.add_argument('--balanceamento', choices=ESTRATEGIAS_BALANCEAMENTO, default='smote_tomek',
+                        help="Tratamento do desbalanceamento nos targets treinados com LightGBM: 'smote_tomek' (amostras sintéticas), "
+                             "'subamostragem' (ensemble de subconjuntos balanceados) ou 'peso' (scale_pos_weight).")
+    parser.add_argument('--comparar-balanceamento', action='store_true',
+                        help="Treina o LightGBM de cada target com as três estratégias e salva tempo e F1 em '3_relatorio_balanceamento.csv'.")
+    parser.add_argument('--sem-early-stopping', action='store_true',
+                        help="Volta ao grid fixo de n_estimators no LightGBM, sem o fold de validação e o early stopping.")
+    parser.add_argument('--comprimir', action='store_true',
+                        help="Poda as Random Forests para o menor número de árvores dentro da tolerância de F1/AUC em uma "
+                             "validação separada do treino (o teste não entra na escolha) e salva o antes/depois no "
+                             "teste em '3_relatorio_compressao.csv'.")
+    parser.add_argument('--tolerancia-compressao', type=float, default=0.01,
+                        help="Perda máxima de F1 e de AUC na validação aceita na poda.")
+    parser.add_argument('--quantizar', action='store_true',
+                        help="Com --comprimir, serializa as árvores em float32/int32.")
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help="Processos usados para treinar folds e base learners no modo stacking (threads do LightGBM fora da memória).")
+    parser.add_argument('--fora-da-memoria', action='store_true',
+                        help="Treina um LightGBM por target lendo o dataset preparado em Parquet bloco a bloco, "
+                             "sem carregá-lo inteiro em memória.")
+    parser.add_argument('--entrada', nargs='+',
+                        help="Arquivos, diretórios ou globs Parquet para --fora-da-memoria (padrão: '2_df_preparado.parquet').")
+    parser.add_argument('--tamanho-bloco', type=int, default=None,
+                        help="Linhas entregues ao LightGBM por lote (padrão: o tamanho do row group).")
+    parser.add_argument('--amostra-bins', type=int, default=200_000,
+                        help="Linhas amostradas pelo LightGBM para definir os bins das features.")
+    parser.add_argument('--n-rodadas', type=int, default=300,
+                        help="Número de árvores de cada LightGBM no modo fora da memória.")
+    parser.add_argument('--max-linhas-teste', type=int, default=500_000,
+                        help="Máximo de linhas de teste salvas no artefato para a etapa 4.")
+    parser.add_argument('--salvar-dataset', action='store_true',
+                        help="Salva também o dataset binário do LightGBM em '3_dataset_treino.bin'.")
+    parser.add_argument('--registrar', metavar='DIR',
+                        help="Registra os artefatos como uma nova versão no registro de modelos em DIR.")
+    parser.add_argument('--promover', action='store_true',
+                        help="Com --registrar, promove a nova versão (o app troca para ela a quente).")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     script_dir = os.path.dirname(os.path.abspath(__file__))
+    if args.fora_da_memoria:
+        treinar_fora_da_memoria(args, script_dir)
+        return
     caminho_entrada = os.path.join(script_dir, "2_df_preparado.pkl")
     caminho_saida = os.path.join(script_dir, "3_modelos_treinados.pkl")
     
@@ -190,12 +821,76 @@ def main():
     df_numerico = df.copy()
     
     X_train, X_test, y_train, y_test, features, targets = preparar_dados_para_modelagem(df_numerico)
+
+    # Referência para o monitor de deriva: distribuição de treino (antes da normalização) por tipo
+    referencia_deriva = MonitorDeriva.criar_referencia(df_numerico.loc[X_train.index], features)
+    caminho_referencia = os.path.join(script_dir, "3_referencia_deriva.pkl")
+    joblib.dump(referencia_deriva, caminho_referencia)
+    print(f"Referência de deriva salva em '{caminho_referencia}'")
     
     modelos_especializados = {}
-    for target in targets:
-        modelo = treinar_modelo_especializado(X_train, y_train, target)
-        if modelo:
-            modelos_especializados[target] = modelo
+    relatorios_stacking = {}
+    if args.modo == 'stacking':
+        folds = gerar_folds_stacking(y_train)
+        for target in targets:
+            modelo, relatorio = treinar_modelo_stacking(X_train, y_train, target, folds, X_test, n_jobs=args.n_jobs,
+                                                        balanceamento=args.balanceamento,
+                                                        early_stopping=not args.sem_early_stopping)
+            if modelo:
+                modelos_especializados[target] = modelo
+            if relatorio is not None:
+                relatorios_stacking[target] = relatorio
+    elif args.modo == 'multilabel':
+        inicio = time.perf_counter()
+        modelo_multilabel = treinar_modelo_multilabel(X_train, y_train, targets, args.estrategia_multilabel)
+        tempo_multilabel = time.perf_counter() - inicio
+        modelos_especializados = modelo_multilabel.modelos_por_target()
+
+        if args.comparar:
+            modelos_por_target = {}
+            inicio = time.perf_counter()
+            for target in targets:
+                modelo = treinar_modelo_especializado(X_train, y_train, target, args.balanceamento,
+                                                      not args.sem_early_stopping)
+                if modelo:
+                    modelos_por_target[target] = modelo
+            tempo_por_target = time.perf_counter() - inicio
+
+            comparativo = comparar_configuracoes({
+                'por_target': (modelos_por_target, tempo_por_target),
+                f'multilabel_{args.estrategia_multilabel}': (modelos_especializados, tempo_multilabel),
+            }, X_test, y_test, targets)
+            caminho_comparativo = os.path.join(script_dir, "3_comparativo_multilabel.csv")
+            comparativo.to_csv(caminho_comparativo)
+            print(f"\nComparativo salvo em '{caminho_comparativo}'")
+    else:
+        for target in targets:
+            modelo = treinar_modelo_especializado(X_train, y_train, target, args.balanceamento,
+                                                  not args.sem_early_stopping)
+            if modelo:
+                modelos_especializados[target] = modelo
+
+    if args.comparar_balanceamento:
+        relatorio_balanceamento = comparar_balanceamento(X_train, y_train, X_test, y_test, targets,
+                                                         not args.sem_early_stopping)
+        caminho_balanceamento = os.path.join(script_dir, "3_relatorio_balanceamento.csv")
+        relatorio_balanceamento.to_csv(caminho_balanceamento)
+        print(f"\nRelatório de balanceamento salvo em '{caminho_balanceamento}'")
+
+    if args.comprimir:
+        modelos_especializados, relatorio_compressao, curvas_arvores = comprimir_florestas(
+            modelos_especializados, X_train, y_train, X_test, y_test, args.tolerancia_compressao, args.quantizar
+        )
+        if not relatorio_compressao.empty:
+            caminho_compressao = os.path.join(script_dir, "3_relatorio_compressao.csv")
+            relatorio_compressao.to_csv(caminho_compressao)
+            curvas_arvores.to_csv(os.path.join(script_dir, "3_curva_arvores.csv"), index=False)
+            print(f"\nRelatório de compressão salvo em '{caminho_compressao}' (curvas em '3_curva_arvores.csv')")
+
+    if relatorios_stacking:
+        caminho_relatorio = os.path.join(script_dir, "3_relatorio_stacking.csv")
+        pd.concat(relatorios_stacking, names=['target']).to_csv(caminho_relatorio)
+        print(f"\nRelatório de tempos do stacking salvo em '{caminho_relatorio}'")
         
     print("\n--- SALVANDO ARTEFATOS DE MODELAGEM ---")
     dados_treinamento = {
@@ -203,11 +898,16 @@ def main():
         'X_test': X_test,
         'y_test': y_test,
         'features': features,
-        'targets': targets
+        'targets': targets,
+        'modo': args.modo,
+        'rodadas_boosting': rodadas_boosting(modelos_especializados),
     }
     
     joblib.dump(dados_treinamento, caminho_saida)
     print(f" Modelos e dados de teste salvos em '{caminho_saida}'")
+
+    if args.registrar:
+        registrar_versao(args, script_dir, dados_treinamento)
     
     print("\n--- ETAPA 3 CONCLUÍDA! PRÓXIMO PASSO: '4_avaliacao.py' ---")
 
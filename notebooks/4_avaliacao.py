@@ -1,224 +1,198 @@
 #!/usr/bin/env python3
 #!/usr/bin/env python3
 
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.metrics import (
-    classification_report, confusion_matrix, f1_score, precision_score, 
-    recall_score, hamming_loss
-)
 from pathlib import Path
 import joblib
 import os
+import sys
 import warnings
-from sklearn.metrics import roc_curve, precision_recall_curve, auc
 warnings.filterwarnings('ignore')
 
-# Configurar visualizações
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+# Permite desserializar modelos que dependem do pacote gembaguard (ex.: stacking)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gembaguard.predicao import prever_probabilidade_target, pontuar_dataframe
+from gembaguard.esquema import carregar_esquema
+from gembaguard.avaliacao import (
+    avaliar_multilabel, intervalos_bootstrap, salvar_json, plotar_matrizes_confusao, plotar_metricas_por_falha
+)
 
-def carregar_modelos_e_dados(caminho_modelos, caminho_scaler):
-    """Carrega modelos e scaler da etapa anterior."""
+def carregar_modelos_e_dados(caminho_modelos, caminho_scaler, caminho_dados=None):
+    """
+    Carrega modelos e scaler da etapa anterior e o conjunto de avaliação:
+    um CSV rotulado (`caminho_dados` ou 'novos_dados_teste.csv') ou o X_test
+    do bundle, que já está normalizado.
+    """
     print("--- INICIANDO ETAPA 4: AVALIAÇÃO ---")
     
     script_dir = os.path.dirname(os.path.abspath(__file__))
     caminho_modelos_completo = os.path.join(script_dir, caminho_modelos)
     caminho_scaler_completo = os.path.join(script_dir, caminho_scaler)
-    caminho_novos_dados = os.path.join(script_dir, "novos_dados_teste.csv")
+    caminho_novos_dados = caminho_dados or os.path.join(script_dir, "novos_dados_teste.csv")
 
     if not Path(caminho_modelos_completo).exists() or not Path(caminho_scaler_completo).exists():
         print(f"Erro: Arquivo '{caminho_modelos_completo}' ou '{caminho_scaler_completo}' não encontrado.")
         print("Certifique-se de executar a Etapa 3 primeiro.")
-        return None, None, None, None, None
+        return None, None, None, None, None, None, None
         
     dados_treinamento = joblib.load(caminho_modelos_completo)
     scaler = joblib.load(caminho_scaler_completo)
     
     modelos = dados_treinamento['modelos']
     targets = dados_treinamento['targets']
+    features = dados_treinamento['features']
     
     if Path(caminho_novos_dados).exists():
-        print("Carregando novos dados para avaliação...")
-        df_novos_dados = pd.read_csv(caminho_novos_dados)
+        print(f"Carregando '{caminho_novos_dados}' para avaliação...")
+        df_novos_dados = carregar_esquema().ler_csv(caminho_novos_dados)
 
         falhas_presentes = [t for t in targets if t in df_novos_dados.columns]
-        if falhas_presentes:
-            for falha in falhas_presentes:
-                if df_novos_dados[falha].dtype in ['object', 'bool']:
-                    df_novos_dados[falha] = df_novos_dados[falha].astype(int)
+        if not falhas_presentes:
+            print(f"Erro: '{caminho_novos_dados}' não tem rótulos ({', '.join(targets)}) para avaliar.")
+            return None, None, None, None, None, None, None
+        for falha in falhas_presentes:
+            if df_novos_dados[falha].dtype in ['object', 'bool']:
+                df_novos_dados[falha] = df_novos_dados[falha].astype(int)
 
         X_test = df_novos_dados.drop(columns=falhas_presentes, errors='ignore')
         y_test = df_novos_dados[falhas_presentes]
+        ja_normalizado = False
+    elif caminho_dados:
+        print(f"Erro: Arquivo '{caminho_dados}' não encontrado.")
+        return None, None, None, None, None, None, None
     else:
         print("Arquivo 'novos_dados_teste.csv' não encontrado. Usando dados originais de teste.")
         X_test = dados_treinamento['X_test']
         y_test = dados_treinamento['y_test']
+        ja_normalizado = True
 
     print(f"Modelos e dados carregados com sucesso.")
-    return X_test, y_test, modelos, targets, scaler
+    return X_test, y_test, modelos, targets, scaler, features, ja_normalizado
 
-def gerar_predicoes_com_probabilidade(X_test, modelos, scaler):
-    """Gera predições de probabilidade para cada modelo especializado."""
+def gerar_predicoes_com_probabilidade(X_test, modelos, scaler, features, ja_normalizado):
+    """
+    Gera predições de probabilidade para cada modelo especializado. O X_test
+    do bundle já sai normalizado da etapa 3; um CSV novo passa pelo caminho
+    completo de predição (features -> preenchimento -> normalização).
+    """
     print("\n--- GERANDO PREDIÇÕES DE PROBABILIDADE ---")
-    
-    X_test_scaled = pd.DataFrame(scaler.transform(X_test), columns=X_test.columns, index=X_test.index)
-    y_proba = pd.DataFrame(index=X_test.index)
-    
-    for target, modelo in modelos.items():
-        if hasattr(modelo, 'predict_proba'):
-            y_proba[target] = modelo.predict_proba(X_test_scaled)[:, 1]
-        else:
-            y_proba[target] = modelo.predict(X_test_scaled)
-        print(f"   -> Probabilidades para '{target}' geradas.")
-        
+
+    if not ja_normalizado:
+        y_proba = pontuar_dataframe(X_test, modelos, scaler, features)
+    else:
+        y_proba = pd.DataFrame(index=X_test.index)
+        cache_multilabel = {}
+        for target, modelo in modelos.items():
+            y_proba[target] = prever_probabilidade_target(modelo, X_test, cache_multilabel)
+            print(f"   -> Probabilidades para '{target}' geradas.")
+
     print(f"Predições de probabilidade geradas para todos os targets.")
     return y_proba
 
-def otimizar_thresholds(y_test, y_proba, targets):
-    """Otimiza o threshold para cada target para maximizar o F1-Score."""
-    print("\n--- OTIMIZANDO THRESHOLDS ---")
-    thresholds_otimizados = {}
-    
-    for target in targets:
-        y_true = y_test[target]
-        y_prob = y_proba[target]
-        
-        # Gerar a série de thresholds apenas se houverem duas classes
-        if len(y_true.unique()) > 1:
-            thresholds = np.arange(0.01, 0.99, 0.01)
-            f1_scores = [f1_score(y_true, (y_prob > t).astype(int), zero_division=0) for t in thresholds]
-            
-            melhor_f1_score = max(f1_scores)
-            melhor_threshold = thresholds[np.argmax(f1_scores)]
-            
-            thresholds_otimizados[target] = melhor_threshold
-            print(f"   -> '{target}': Melhor Threshold = {melhor_threshold:.2f} (F1-Score: {melhor_f1_score:.4f})")
-        else:
-            thresholds_otimizados[target] = 0.5 # Default
+def avaliar_metrica_multilabel(y_test, y_proba, targets):
+    """
+    Otimiza o threshold de cada target (maior F1 na grade 0.01..0.98) e
+    calcula as métricas por target e globais em uma passada vetorizada.
+    """
+    print("\n--- OTIMIZANDO THRESHOLDS E AVALIANDO MÉTRICAS MULTI-LABEL ---")
+    resultado = avaliar_multilabel(y_test, y_proba, targets)
+    por_target = resultado['por_target']
+
+    for target, linha in por_target.iterrows():
+        if np.isnan(linha['roc_auc']):
             print(f"   -> '{target}': Apenas uma classe encontrada, usando threshold padrão de 0.5.")
-    
-    return thresholds_otimizados
+        else:
+            print(f"   -> '{target}': Melhor Threshold = {linha['limiar']:.2f} (F1-Score: {linha['f1']:.4f})")
 
-def gerar_predicoes_binarias(y_proba, thresholds_otimizados):
-    """Converte probabilidades em predições binárias usando os thresholds otimizados."""
-    print("\n--- GERANDO PREDIÇÕES BINÁRIAS COM THRESHOLDS OTIMIZADOS ---")
-    y_pred = pd.DataFrame(index=y_proba.index)
-    
-    for target, threshold in thresholds_otimizados.items():
-        y_pred[target] = (y_proba[target] > threshold).astype(int)
-    
-    print("Predições binárias geradas.")
-    return y_pred
+    print("\n📋 Métricas por Tipo de Falha:")
+    print(por_target[['limiar', 'suporte', 'precisao', 'recall', 'f1', 'pr_auc', 'roc_auc']].to_string(float_format=lambda x: f"{x:.4f}"))
 
-def avaliar_metrica_multilabel(y_test, y_pred, targets):
-    """Calcula e exibe métricas de avaliação multi-label."""
-    print("\n--- AVALIANDO MÉTRICAS MULTI-LABEL ---")
-    
-    print("\n📋 Relatório de Classificação Detalhado:")
-    print(classification_report(y_test, y_pred, target_names=targets, zero_division=0))
-    
-    f1_macro = f1_score(y_test, y_pred, average='macro', zero_division=0)
-    f1_micro = f1_score(y_test, y_pred, average='micro', zero_division=0)
-    hamming = hamming_loss(y_test, y_pred)
-    
-    print("Métricas Globais:")
-    print(f"   -> F1-Score (Macro): {f1_macro:.4f}")
-    print(f"   -> F1-Score (Micro): {f1_micro:.4f}")
-    print(f"   -> Hamming Loss: {hamming:.4f}")
-    
-    return {
-        'f1_macro': f1_macro,
-        'f1_micro': f1_micro,
-        'hamming_loss': hamming
-    }
-
-def analisar_matriz_confusao(y_test, y_pred, targets, script_dir):
-    """Gera e salva matrizes de confusão para cada target."""
-    print("\n--- ANALISANDO MATRIZES DE CONFUSÃO ---")
-    n_targets = len(targets)
-    cols = min(3, n_targets)
-    rows = (n_targets + cols - 1) // cols
-    
-    fig, axes = plt.subplots(rows, cols, figsize=(15, 5 * rows))
-    if n_targets > 0:
-        axes = axes.ravel() if n_targets > 1 else [axes]
-    
-        for i, target in enumerate(targets):
-            y_true_target = y_test[target]
-            y_pred_target = y_pred[target]
-            
-            if len(y_true_target.unique()) > 1:
-                cm = confusion_matrix(y_true_target, y_pred_target)
-                sns.heatmap(cm, annot=True, fmt='d', cmap='Blues', 
-                            xticklabels=['Não', 'Sim'], yticklabels=['Não', 'Sim'], ax=axes[i])
-                axes[i].set_title(f'Matriz de Confusão - {target}')
-                axes[i].set_xlabel('Predito')
-                axes[i].set_ylabel('Real')
-            else:
-                axes[i].set_title(f'Matriz de Confusão - {target}')
-                axes[i].text(0.5, 0.5, 'Dados sem falha', ha='center', va='center')
-                axes[i].set_xticks([])
-                axes[i].set_yticks([])
-
-    plt.tight_layout()
-    caminho_imagem = os.path.join(script_dir, '4_matrizes_confusao.png')
-    plt.savefig(caminho_imagem)
-    print(f"✅ Matrizes de confusão salvas em '{caminho_imagem}'")
-    plt.close(fig) 
-
-
-def visualizar_metricas_por_falha(metricas, targets, script_dir):
+    print("\nMétricas Globais:")
+    print(f"   -> F1-Score (Macro): {resultado['f1_macro']:.4f}")
+    print(f"   -> F1-Score (Micro): {resultado['f1_micro']:.4f}")
+    print(f"   -> Hamming Loss: {resultado['hamming_loss']:.4f}")
+    return resultado
+
+def calcular_intervalos_confianca(y_test, y_proba, resultado, n_amostras, confianca):
     """
-    Gera um gráfico de barras comparando as métricas por tipo de falha.
+    Intervalos bootstrap de precisão, recall e F1 (nos thresholds escolhidos)
+    e do threshold otimizado de cada target. Com poucos positivos (FP, FA) o
+    intervalo mostra quanto do F1 pontual é ruído. Guardados em
+    resultado['intervalos'].
     """
-    print("\n--- VISUALIZANDO MÉTRICAS POR FALHA ---")
-    
-    metricas_df = pd.DataFrame(columns=['Falha', 'Métrica', 'Valor'])
-    for target in targets:
-        precision = precision_score(y_test[target], y_pred[target], zero_division=0)
-        recall = recall_score(y_test[target], y_pred[target], zero_division=0)
-        f1 = f1_score(y_test[target], y_pred[target], zero_division=0)
-        
-        metricas_df.loc[len(metricas_df)] = [target, 'Precision', precision]
-        metricas_df.loc[len(metricas_df)] = [target, 'Recall', recall]
-        metricas_df.loc[len(metricas_df)] = [target, 'F1-Score', f1]
-    
-    fig, ax = plt.subplots(figsize=(12, 8))
-    sns.barplot(x='Falha', y='Valor', hue='Métrica', data=metricas_df, ax=ax)
-    
-    ax.set_title('Comparativo de Métricas por Tipo de Falha')
-    ax.set_xlabel('Tipo de Falha')
-    ax.set_ylabel('Valor da Métrica')
-    ax.set_ylim(0, 1.05)
-    plt.tight_layout()
-    plt.savefig('4_metricas_por_falha.png')
-    plt.close(fig)
-    print("Gráfico de métricas por falha salvo em '4_metricas_por_falha.png'")
+    print(f"\n--- INTERVALOS DE CONFIANÇA ({confianca:.0%}, {n_amostras} REAMOSTRAGENS BOOTSTRAP) ---")
+    targets = list(resultado['por_target'].index)
+    intervalos = intervalos_bootstrap(
+        y_test, y_proba, targets, resultado['por_target']['limiar'].to_dict(), n_amostras=n_amostras, confianca=confianca
+    )
+    resultado['intervalos'] = intervalos
+
+    tabela = intervalos.assign(
+        intervalo=[f"{e:.3f} [{i:.3f}, {s:.3f}]" for e, i, s in intervalos[['estimativa', 'ic_inferior', 'ic_superior']].to_numpy()]
+    ).pivot(index='target', columns='metrica', values='intervalo')
+    print(tabela.loc[targets, ['precisao', 'recall', 'f1', 'limiar_otimo']].to_string())
+    return intervalos
+
+def gerar_graficos(resultado, script_dir):
+    """Matrizes de confusão e comparativo de métricas por falha (a partir das contagens já calculadas)."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    print("\n--- GERANDO GRÁFICOS ---")
+    plt.style.use('seaborn-v0_8')
+    sns.set_palette("husl")
+    caminho_matrizes = os.path.join(script_dir, '4_matrizes_confusao.png')
+    plotar_matrizes_confusao(resultado, caminho_matrizes)
+    print(f"✅ Matrizes de confusão salvas em '{caminho_matrizes}'")
+
+    caminho_metricas = os.path.join(script_dir, '4_metricas_por_falha.png')
+    plotar_metricas_por_falha(resultado, caminho_metricas)
+    print(f"✅ Gráfico de métricas por falha salvo em '{caminho_metricas}'")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Etapa 4: avaliação dos modelos treinados.")
+    parser.add_argument('--dados', help="CSV rotulado para avaliar (padrão: 'novos_dados_teste.csv', se existir, ou o X_test da etapa 3).")
+    parser.add_argument('--json', help="Grava as métricas (globais e por target) em JSON, ex.: para um gate de CI.")
+    parser.add_argument('--f1-minimo', type=float,
+                        help="Sai com código 1 se o F1 macro ficar abaixo deste valor.")
+    parser.add_argument('--sem-graficos', action='store_true', help="Não gera as figuras (só as métricas).")
+    parser.add_argument('--bootstrap', type=int, default=1000,
+                        help="Reamostragens bootstrap para os intervalos de confiança (0 desliga).")
+    parser.add_argument('--confianca', type=float, default=0.95, help="Nível dos intervalos de confiança.")
+    args = parser.parse_args()
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
     caminho_modelos = "3_modelos_treinados.pkl"
     caminho_scaler = "3_standard_scaler.pkl"
 
-    X_test, y_test, modelos, targets, scaler = carregar_modelos_e_dados(caminho_modelos, caminho_scaler)
+    X_test, y_test, modelos, targets, scaler, features, ja_normalizado = carregar_modelos_e_dados(
+        caminho_modelos, caminho_scaler, args.dados
+    )
     if X_test is None or y_test is None:
         return
 
-    y_proba = gerar_predicoes_com_probabilidade(X_test, modelos, scaler)
-    
-    thresholds_otimizados = otimizar_thresholds(y_test, y_proba, targets)
-    
-    y_pred = gerar_predicoes_binarias(y_proba, thresholds_otimizados)
-    
-    metricas = avaliar_metrica_multilabel(y_test, y_pred, targets)
-    
-    analisar_matriz_confusao(y_test, y_pred, targets, script_dir)
-    
+    y_proba = gerar_predicoes_com_probabilidade(X_test, modelos, scaler, features, ja_normalizado)
+
+    targets_avaliados = [t for t in targets if t in y_test.columns]
+    resultado = avaliar_metrica_multilabel(y_test, y_proba, targets_avaliados)
+    if args.bootstrap > 0:
+        calcular_intervalos_confianca(y_test, y_proba, resultado, args.bootstrap, args.confianca)
+
+    if args.json:
+        salvar_json(resultado, args.json)
+        print(f"\n✅ Métricas salvas em '{args.json}'")
+
+    if not args.sem_graficos:
+        gerar_graficos(resultado, script_dir)
+
+    if args.f1_minimo is not None and resultado['f1_macro'] < args.f1_minimo:
+        print(f"\n❌ F1 macro {resultado['f1_macro']:.4f} abaixo do mínimo {args.f1_minimo:.4f}.")
+        sys.exit(1)
+
     print("\n--- ETAPA 4 CONCLUÍDA! PRÓXIMO PASSO: '5_deploy.py' ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
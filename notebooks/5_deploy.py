@@ -1,28 +1,57 @@
 #!/usr/bin/env python3
 
+import argparse
 import pandas as pd
 import numpy as np
 import joblib
 from pathlib import Path
 import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
-def carregar_artefatos_deploy():
+# Permite desserializar modelos que dependem do pacote gembaguard (ex.: stacking)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from gembaguard.predicao import prever_probabilidade_target
+from gembaguard.rastreamento import span
+from gembaguard.metricas import LATENCIA_PREDICAO, registrar_alertas, salvar_metricas
+from gembaguard.lote import listar_arquivos, pontuar_lote
+from gembaguard.exportacao import FORMATOS, exportar
+from gembaguard.registro import RegistroModelos
+from gembaguard.sombra import imprimir_resumo
+
+def resolver_dir_artefatos(caminho_registro=None, versao=None):
+    """
+    Diretório dos artefatos: ao lado do script ou, com um registro de
+    modelos, o da versão pedida (padrão: a promovida), com os checksums
+    conferidos. Retorna None se a versão não puder ser usada.
+    """
+    if not caminho_registro:
+        return os.path.dirname(os.path.abspath(__file__))
+    registro = RegistroModelos(caminho_registro)
+    versao = versao or registro.versao_atual()
+    problemas = registro.verificar(versao) if versao else ["nenhuma versão promovida"]
+    if problemas:
+        print(f"Erro: versão '{versao}' do registro '{caminho_registro}' inválida: {'; '.join(problemas)}")
+        return None
+    print(f"Usando a versão '{versao}' do registro '{caminho_registro}'.")
+    return str(registro.dir_versoes / versao)
+
+def carregar_artefatos_deploy(dir_artefatos):
     """Carrega modelos e scaler necessários para o deploy."""
     print("--- INICIANDO ETAPA 5: DEPLOY E PREDIÇÃO ---")
     
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    caminho_modelos = os.path.join(script_dir, "3_modelos_treinados.pkl")
-    caminho_scaler = os.path.join(script_dir, "3_standard_scaler.pkl")
+    caminho_modelos = os.path.join(dir_artefatos, "3_modelos_treinados.pkl")
+    caminho_scaler = os.path.join(dir_artefatos, "3_standard_scaler.pkl")
 
     if not Path(caminho_modelos).exists() or not Path(caminho_scaler).exists():
         print("Erro: Arquivos de modelo não encontrados.")
         print("Certifique-se de executar as Etapas 1, 2 e 3 em ordem.")
-        return None, None
+        return None, None, None, None
     
-    modelos_e_dados = joblib.load(caminho_modelos)
-    scaler = joblib.load(caminho_scaler)
+    with span('carregar_artefatos'):
+        modelos_e_dados = joblib.load(caminho_modelos)
+        scaler = joblib.load(caminho_scaler)
     
     modelos = modelos_e_dados['modelos']
     targets = modelos_e_dados['targets']
@@ -71,17 +100,16 @@ def prever_falhas(modelos, scaler, novos_dados):
     """Faz a predição usando os modelos treinados."""
     print("\n--- FAZENDO PREDIÇÕES ---")
     
-    novos_dados_scaled = pd.DataFrame(scaler.transform(novos_dados), columns=novos_dados.columns)
+    with span('escalonamento', linhas=len(novos_dados)):
+        novos_dados_scaled = pd.DataFrame(scaler.transform(novos_dados), columns=novos_dados.columns)
     
     predicoes = {}
     
+    cache_multilabel = {}
     for target, modelo in modelos.items():
-        if hasattr(modelo, 'predict_proba'):
-            proba = modelo.predict_proba(novos_dados_scaled)[:, 1][0]
-        else:
-            proba = modelo.predict(novos_dados_scaled)[0]
-        
-        predicoes[target] = proba
+        with span('predict_proba', target=target, linhas=len(novos_dados_scaled)), LATENCIA_PREDICAO.medir(target=target):
+            predicoes[target] = prever_probabilidade_target(modelo, novos_dados_scaled, cache_multilabel)[0]
+    registrar_alertas(pd.DataFrame([predicoes]))
         
     print("Predições de probabilidade geradas.")
     return predicoes
@@ -108,13 +136,142 @@ def interpretar_predicoes(predicoes, targets):
     else:
         print("\n O sistema está operando normalmente. Nenhuma falha detectada.")
 
+def executar_lote(entrada, dir_saida, n_jobs, formato='csv', caminho_esquema=None, float32=False, dir_artefatos=None,
+                  dir_sombra=None, log_sombra=None, max_cache=0):
+    """
+    Pontua todos os CSVs de um diretório/glob em paralelo e grava os resumos.
+    Com `dir_sombra`, os artefatos desse diretório pontuam os mesmos arquivos
+    em sombra e a comparação vai para `log_sombra` (padrão: sombra.jsonl na saída).
+    `max_cache` > 0 liga o cache de resultados de cada processo.
+    """
+    print("--- INICIANDO ETAPA 5: PONTUAÇÃO EM LOTE ---")
+    dir_artefatos = dir_artefatos or os.path.dirname(os.path.abspath(__file__))
+    caminho_modelos = os.path.join(dir_artefatos, "3_modelos_treinados.pkl")
+    caminho_scaler = os.path.join(dir_artefatos, "3_standard_scaler.pkl")
+
+    arquivos = listar_arquivos(entrada)
+    if not arquivos:
+        print(f"Nenhum CSV encontrado em '{entrada}'.")
+        return None
+    if not Path(caminho_modelos).exists() or not Path(caminho_scaler).exists():
+        print("Erro: Arquivos de modelo não encontrados.")
+        print("Certifique-se de executar as Etapas 1, 2 e 3 em ordem.")
+        return None
+
+    if dir_sombra:
+        if not all(Path(dir_sombra, nome).exists() for nome in ("3_modelos_treinados.pkl", "3_standard_scaler.pkl")):
+            print(f"Erro: Arquivos de modelo da versão em sombra não encontrados em '{dir_sombra}'.")
+            return None
+        log_sombra = log_sombra or os.path.join(dir_saida, "sombra.jsonl")
+        print(f"Versão em sombra: '{Path(dir_sombra).resolve().name}' (comparações em '{log_sombra}')")
+
+    print(f"{len(arquivos)} arquivo(s) encontrados. Processando com {n_jobs or os.cpu_count()} processo(s)...")
+    df_resumo, df_alertas, df_fila, segundos = pontuar_lote(
+        arquivos, caminho_modelos, caminho_scaler, dir_saida, n_jobs, formato=formato, caminho_esquema=caminho_esquema,
+        float32=float32, sombra=dir_sombra, caminho_log_sombra=log_sombra, versao_primaria=Path(dir_artefatos).resolve().name,
+        max_cache=max_cache
+    )
+
+    df_resumo.to_csv(os.path.join(dir_saida, "resumo_lote.csv"), index=False)
+    exportar(df_alertas, os.path.join(dir_saida, f"alertas_consolidados{FORMATOS[formato][0]}"), formato)
+    if len(df_fila):
+        exportar(df_fila, os.path.join(dir_saida, f"fila_manutencao{FORMATOS[formato][0]}"), formato)
+
+    falhas = df_resumo['erro'].notna().sum()
+    linhas = df_resumo['linhas'].sum()
+    print(f"\n{len(arquivos) - falhas} arquivo(s) pontuados, {falhas} com erro. "
+          f"{linhas:,} linhas em {segundos:.1f} s ({linhas / segundos:,.0f} linhas/s).")
+    if 'linhas_unicas' in df_resumo.columns and linhas:
+        unicas = int(df_resumo['linhas_unicas'].sum())
+        do_cache = int(df_resumo['linhas_cache'].sum())
+        print(f"Leituras únicas: {unicas:,} ({unicas / linhas:.1%} das linhas); "
+              f"{unicas - do_cache:,} passaram pelos modelos ({do_cache:,} vieram do cache).")
+    print(f"Resultados, 'resumo_lote.csv' e os alertas consolidados ({len(df_alertas)}) salvos em '{dir_saida}'")
+    if len(df_fila):
+        print(f"Fila de manutenção com {len(df_fila):,} máquinas salva em 'fila_manutencao{FORMATOS[formato][0]}'")
+    if dir_sombra and Path(log_sombra).exists():
+        print()
+        imprimir_resumo(log_sombra)
+    return segundos
+
+def medir_escalonamento(entrada, dir_saida, caminho_esquema=None, float32=False, dir_artefatos=None):
+    """Repete o lote com 1, 2, 4... até todos os núcleos e compara a vazão."""
+    n_max = os.cpu_count() or 1
+    niveis = sorted({min(2 ** i, n_max) for i in range(n_max.bit_length() + 1)})
+    linhas = sum(len(pd.read_csv(arquivo, usecols=[0])) for arquivo in listar_arquivos(entrada))
+
+    resultados = []
+    for n_jobs in niveis:
+        print(f"\n=== {n_jobs} processo(s) ===")
+        segundos = executar_lote(
+            entrada, os.path.join(dir_saida, f"escalonamento_{n_jobs}"), n_jobs, caminho_esquema=caminho_esquema,
+            float32=float32, dir_artefatos=dir_artefatos
+        )
+        if segundos is None:
+            return
+        resultados.append({'processos': n_jobs, 'segundos': segundos, 'linhas_por_s': linhas / segundos})
+
+    df_escalonamento = pd.DataFrame(resultados)
+    df_escalonamento['speedup'] = df_escalonamento['segundos'].iloc[0] / df_escalonamento['segundos']
+    print("\n--- ESCALONAMENTO ---")
+    print(df_escalonamento.to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+    df_escalonamento.to_csv(os.path.join(dir_saida, "escalonamento_lote.csv"), index=False)
+
 def main():
-    modelos, scaler, features, targets = carregar_artefatos_deploy()
+    parser = argparse.ArgumentParser(description="Etapa 5: predição com os modelos treinados.")
+    parser.add_argument('--metricas', help="Grava as métricas da execução no formato Prometheus (textfile collector).")
+    parser.add_argument('--lote', help="Diretório ou glob de CSVs para pontuar em paralelo (ex.: 'turnos/*.csv').")
+    parser.add_argument('--saida', default='5_resultados_lote', help="Diretório de saída do modo lote.")
+    parser.add_argument('--n-jobs', type=int, help="Processos do modo lote (padrão: todos os núcleos).")
+    parser.add_argument('--formato', choices=list(FORMATOS), default='csv',
+                        help="Formato dos resultados do modo lote (probabilidades float32 e alertas booleanos).")
+    parser.add_argument('--esquema', help="Esquema de entrada (JSON) com aliases de colunas e unidades dos CSVs do lote.")
+    parser.add_argument('--escalonamento', action='store_true',
+                        help="No modo lote, mede a vazão de 1 até N processos.")
+    parser.add_argument('--float32', action='store_true',
+                        help="No modo lote, lê, monta as features e normaliza em float32 (metade da memória).")
+    parser.add_argument('--registro', help="Registro de modelos (diretório): usa a versão promovida em vez dos artefatos ao lado do script.")
+    parser.add_argument('--versao', help="Com --registro, pontua com esta versão em vez da promovida.")
+    parser.add_argument('--sombra',
+                        help="No modo lote, pontua os mesmos arquivos em sombra com esta versão do registro "
+                             "(com --registro) ou com os artefatos deste diretório e compara com a principal.")
+    parser.add_argument('--cache-resultados', type=int, default=0,
+                        help="No modo lote, guarda até N leituras já pontuadas por processo (cache LRU entre arquivos, "
+                             "chave: a linha de features exata). Dentro de cada arquivo, leituras iguais até 6 casas "
+                             "decimais são pontuadas uma vez e recebem a mesma probabilidade.")
+    parser.add_argument('--log-sombra', help="Log JSONL das comparações em sombra (padrão: sombra.jsonl na saída).")
+    args = parser.parse_args()
+
+    dir_artefatos = resolver_dir_artefatos(args.registro, args.versao)
+    if dir_artefatos is None:
+        return
+    dir_sombra = None
+    if args.sombra:
+        dir_sombra = resolver_dir_artefatos(args.registro, args.sombra) if args.registro else args.sombra
+        if dir_sombra is None:
+            return
+
+    if args.lote:
+        if args.escalonamento:
+            medir_escalonamento(args.lote, args.saida, args.esquema, args.float32, dir_artefatos)
+        else:
+            executar_lote(args.lote, args.saida, args.n_jobs, args.formato, args.esquema, args.float32, dir_artefatos,
+                          dir_sombra, args.log_sombra, args.cache_resultados)
+        if args.metricas:
+            salvar_metricas(args.metricas)
+            print(f"Métricas salvas em '{args.metricas}'")
+        return
+
+    modelos, scaler, features, targets = carregar_artefatos_deploy(dir_artefatos)
     
     if modelos is not None:
         novos_dados = simular_novos_dados(features)
         predicoes = prever_falhas(modelos, scaler, novos_dados)
         interpretar_predicoes(predicoes, targets)
+
+        if args.metricas:
+            salvar_metricas(args.metricas)
+            print(f"Métricas salvas em '{args.metricas}'")
         
     print("\n--- ETAPA 5 CONCLUÍDA! FIM DO PROJETO. ---")
 